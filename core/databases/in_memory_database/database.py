@@ -1,22 +1,31 @@
 import os.path
-from typing import Type, List
+from typing import Dict, Type, List
 
 from core.databases.utils.binary_io import AdvancedBinaryIO
-from core.databases.in_memory_database.table import Table, Column
+from core.databases.in_memory_database.table import Table, Column, FORMAT_VERSION
+
+# Starts files followed by the format version, files without it hold version 0 tables
+# A table count starting with these bytes would exceed four billion, so old files are never mistaken for new ones
+FILE_MAGIC = b'\xffIMD'
 
 
 class Database:
-    def __init__(self, tree_type: Type, path: str):
+    def __init__(self, tree_type: Type, path: str, encode_keys: bool = False):
         self._tables = {}
         self._tree_type = tree_type
         self._path = path
+        # Store unique keys of all tables as byte strings, see Columns
+        self._encode_keys = encode_keys
+        # A database that failed to load is never synced, so the file it failed on is kept as it is
+        self._loaded = False
 
         self._load()
+        self._loaded = True
 
     def make_table(self, table_name: str, columns: List[Column]) -> Table:
         if self.table_exists(table_name):
             raise RuntimeError(f'Table with name {table_name} already exists')
-        self._tables[table_name] = Table(self._tree_type, columns)
+        self._tables[table_name] = Table(self._tree_type, columns, self._encode_keys)
         return self._tables[table_name]
 
     def table_exists(self, table_name: str) -> bool:
@@ -32,22 +41,39 @@ class Database:
             raise RuntimeError(f'Table with name {table_name} does not exist')
         return self._tables[table_name]
 
+    def stats(self) -> Dict:
+        """
+        Returns the stats of every table by name, see Table.stats
+        Use AdaptiveTree.wrap(tree_type) as the tree type to let every table pick its own tree type
+        """
+        return {name: table.stats() for name, table in self._tables.items()}
+
     def _load(self):
         if os.path.exists(self._path):
             with open(self._path, 'rb') as file:
                 binary_io = AdvancedBinaryIO(file)
+                version = 0
+                if file.read(len(FILE_MAGIC)) == FILE_MAGIC:
+                    version = binary_io.read_int()
+                    if version > FORMAT_VERSION:
+                        raise RuntimeError(f'Unsupported database format version {version}')
+                else:
+                    file.seek(0)
                 table_count = binary_io.read_int()
                 for _ in range(table_count):
                     table_name = binary_io.read_string()
-                    self._tables[table_name] = Table.load(binary_io, self._tree_type)
+                    self._tables[table_name] = Table.load(binary_io, self._tree_type, self._encode_keys, version)
 
     def sync(self):
         with open(self._path, 'wb') as file:
             binary_io = AdvancedBinaryIO(file)
+            file.write(FILE_MAGIC)
+            binary_io.write_int(FORMAT_VERSION)
             binary_io.write_int(len(self._tables))
             for name, table in self._tables.items():
                 binary_io.write_string(name)
                 table.write(binary_io)
 
     def __del__(self):
-        self.sync()
+        if getattr(self, '_loaded', False):
+            self.sync()
@@ -1,71 +1,275 @@
-from typing import Type, List
+from itertools import islice
+from operator import itemgetter
+from typing import Dict, Type, List, Optional, Tuple, Sequence
 
 from core.databases.utils.binary_io import AdvancedBinaryIO
 from core.databases.utils.columns import Column, Columns
-from core.databases.utils.predicate_compiler import compile_predicate
+from core.databases.utils.frame import Frame, compile_matcher
+from core.databases.utils.plan_cache import PlanCache
+from core.databases.utils.predicate_compiler import compile_tokens
+from core.databases.utils.tokenizer import Tokenizer, ParameterToken, bind_parameters
 from core.trees.abstract_tree import AbstractTree
+from core.trees.avl_tree import AVLTree
+from core.trees.b_tree import BTree
+from core.trees.builtin_tree import BuiltinTree
+from core.trees.persistent_avl_tree import PersistentAVLTree
+from core.trees.radix_tree import RadixTree
+from core.trees.red_black_tree import RedBlackTree
+from core.trees.skip_list import SkipList
+from core.trees.splay_tree import SplayTree
+from core.trees.striped_b_tree import StripedBTree
+from core.trees.two_three_tree import TwoThreeTree
+
+# Version of the table record written by write, records of version 0 end after the rows, without indexes
+FORMAT_VERSION = 1
+# Tree types of indexes that write saves by name, an index of any other type is loaded with the tree type
+# of the table, so loading never resolves a name from the file to code outside this list
+INDEX_TREE_TYPES = {tree_type.__name__: tree_type for tree_type in
+                    (AVLTree, BTree, BuiltinTree, PersistentAVLTree, RadixTree, RedBlackTree, SkipList,
+                     SplayTree, StripedBTree, TwoThreeTree)}
+
+
+def _type_name(tree_type: Optional[Type]) -> str:
+    """Returns the name write saves for an index tree type, empty for the tree type of the table and unknown types"""
+    if tree_type is None or INDEX_TREE_TYPES.get(tree_type.__name__) is not tree_type:
+        return ''
+    return tree_type.__name__
 
 
 class Table:
-    def __init__(self, tree_type: Type, columns: List[Column]):
-        self._columns = Columns(columns)
+    def __init__(self, tree_type: Type, columns: List[Column], encode_keys: bool = False):
+        self._columns = Columns(columns, encode_keys)
+        self._tree_type = tree_type
         self._tree: AbstractTree = tree_type()
+        # Column name -> (position of the column in rows, tree keyed by (column value, row key))
+        self._indexes: Dict[str, Tuple[int, AbstractTree]] = {}
+        # Column name -> tree type given to create_index, indexes of the table tree type are not listed
+        self._index_types: Dict[str, Type] = {}
+        self._plans = PlanCache(self._columns)
 
     def insert(self, *values):
-        self._tree.insert(*self._columns.make_key_value_pair(list(values)))
+        key, value = self._columns.make_key_value_pair(list(values))
+        if self._indexes:
+            missing = object()
+            previous = self._tree.get_or_default(key, missing)
+            if previous is not missing:
+                self._unindex(key, previous)
+            for position, index in self._indexes.values():
+                index.insert((values[position], key), None)
+        self._tree.insert(key, value)
+
+    def create_index(self, column: str, tree_type: Optional[Type] = None):
+        """
+        Creates a secondary index on the column, a tree of (column value, row key) pairs kept up to date
+        by insert and delete and saved with its tree type by write
+        Frames with equality on the column or with bounds on it are then answered from the index
+        unless they restrict the leading unique columns, which the table tree answers directly
+        :param column: name of the column
+        :param tree_type: type of the index tree, the tree type of the table by default
+        """
+        if column in self._indexes:
+            raise RuntimeError(f'Index on column {column} already exists')
+        names = [item.name for item in self._columns.columns]
+        if column not in names:
+            raise RuntimeError(f'Column {column} does not exist')
+        self._build_index(names.index(column), column, tree_type or self._tree_type, iter(self._tree) if len(self._tree) else ())
+        if tree_type is not None:
+            self._index_types[column] = tree_type
+
+    def _build_index(self, position: int, column: str, tree_type: Type, pairs):
+        entries = sorted((self._columns.make_values(key, value, [])[position], key) for key, value in pairs)
+        self._indexes[column] = position, tree_type.bulk_load((entry, None) for entry in entries)
+
+    def _unindex(self, key, value):
+        """Deletes the index entries of a row"""
+        values = self._columns.make_values(key, value, [])
+        for position, index in self._indexes.values():
+            index.delete((values[position], key))
+
+    def __len__(self):
+        return len(self._tree)
+
+    def stats(self) -> Dict:
+        """
+        Returns the report of the tree if it keeps one, e.g. the estimates and migrations of an AdaptiveTree,
+        and the hits, misses and size of the plan cache under 'plan_cache'
+        """
+        report = getattr(self._tree, 'report', None)
+        stats = report() if report is not None else {}
+        stats['plan_cache'] = self._plans.report()
+        return stats
+
+    def prepare(self, predicate: str) -> 'PreparedStatement':
+        """
+        Returns a statement for a predicate with '?' placeholders in place of values, e.g. "equals id ?",
+        the predicate is tokenized once and its values are bound on every call, see PreparedStatement
+        """
+        return PreparedStatement(self, predicate)
 
-    def select(self, *columns):
-        for key, value in self._tree:
+    def snapshot(self) -> 'Table':
+        """
+        Returns a consistent view of the table as of now without copying rows
+        Writes made to this table afterwards are not visible in the snapshot and never wait for its readers
+        Requires a tree type that supports snapshots, e.g. PersistentAVLTree
+        """
+        try:
+            tree = self._tree.snapshot()
+        except NotImplementedError as error:
+            raise RuntimeError(str(error)) from error
+        try:
+            indexes = {name: (position, index.snapshot()) for name, (position, index) in self._indexes.items()}
+        except NotImplementedError as error:
+            raise RuntimeError(str(error)) from error
+        return self._derive(tree, indexes)
+
+    def _derive(self, tree: AbstractTree, indexes: Dict[str, Tuple[int, AbstractTree]]) -> 'Table':
+        """Returns a table with the columns of this table over the given trees"""
+        table = Table.__new__(Table)
+        table._columns = self._columns
+        table._tree_type = self._tree_type
+        table._tree = tree
+        table._indexes = indexes
+        table._index_types = dict(self._index_types)
+        table._plans = PlanCache(self._columns)
+        return table
+
+    def freeze(self) -> 'Table':
+        """
+        Returns a read-only copy of the table kept in sorted arrays, for tables that are loaded once and then only read
+        Inserting into or deleting from it raises NotImplementedError
+        """
+        indexes = {name: (position, index.freeze()) for name, (position, index) in self._indexes.items()}
+        return self._derive(self._tree.freeze(), indexes)
+
+    def select(self, *columns, offset: int = 0, limit: Optional[int] = None):
+        if offset < 0:
+            raise RuntimeError('Offset should be non-negative')
+        if offset >= len(self._tree):
+            return
+        # Seek to the first row of the page by position instead of skipping rows one by one
+        rows = self._tree.range(lo=self._tree.select(offset)[0]) if offset else iter(self._tree)
+        for key, value in rows if limit is None else islice(rows, limit):
             yield self._columns.make_values(key, value, list(columns))
 
-    def select_where(self, predicate: str, *columns):
-        frames = list(compile_predicate(predicate, self._columns))
-        unique_frames = filter(lambda x: x.is_unique(), frames)
-        standard_frames = filter(lambda x: not x.is_unique(), frames)
+    def _scan(self, key_range):
+        lo, hi, prefix = key_range
+        lo = None if lo is None else self._columns.encode_key(lo)
+        hi = None if hi is None else self._columns.encode_key(hi)
+        prefix = self._columns.encode_prefix(prefix)
+        for key, value in self._tree.range(lo, hi, (True, False)):
+            if key[:len(prefix)] != prefix:
+                return
+            yield key, value
 
-        yielded = set()
+    def _index_scan(self, column: str, lower, upper, inclusive: bool):
+        """Yields row keys with values of the indexed column between lower and upper, None leaves a side open"""
+        _, index = self._indexes[column]
+        for (item, key), _ in index.range(None if lower is None else (lower,)):
+            if upper is not None and (upper < item if inclusive else not item < upper):
+                return
+            if lower is None or inclusive or lower < item:
+                yield key
 
-        for frame in unique_frames:
-            if frame.get_unique() not in yielded:
-                if frame.get_unique() in self._tree:
-                    value = self._tree.get(frame.get_unique())
-                    values = self._columns.make_values(frame.get_unique(), value, [])
+    def _needs_full_scan(self, frame: Frame) -> bool:
+        """Whether neither the table tree nor a secondary index narrows down the rows of a frame"""
+        return frame.get_key_range() is None and \
+            not any(column in frame.unique or column in frame.bounds for column in self._indexes)
 
-                    if frame.check(values):
-                        yielded.add(frame.get_unique())
-                        yield self._columns.make_values(frame.get_unique(), value, list(columns))
-        for frame in standard_frames:
+    def _frame_rows(self, frame: Frame):
+        """
+        Returns (rows, ordered), the pairs of the table a frame that does not need a full scan has to check
+        and whether they come in key order
+        Equality beats bounds and the table tree beats secondary indexes
+        """
+        key_range = frame.get_key_range()
+        if key_range is not None and key_range[2]:
+            return self._scan(key_range), True
+        keys = None
+        for column in self._indexes:
+            if column in frame.unique:
+                keys = list(self._index_scan(column, frame.unique[column], frame.unique[column], True))
+                break
+        if keys is None and key_range is not None:
+            return self._scan(key_range), True
+        if keys is None:
+            for column in self._indexes:
+                if column in frame.bounds:
+                    keys = list(self._index_scan(column, *frame.bounds[column], False))
+                    break
+        return zip(keys, self._tree.get_many(keys)), False
+
+    def _matches(self, frames: List[Frame]):
+        """
+        Yields (key, value, follows) for rows matching any of the frames,
+        follows tells whether the row directly follows the previously yielded one in key order
+        """
+        unique_frames = [frame for frame in frames if frame.is_unique()]
+        standard_frames = [frame for frame in frames if not frame.is_unique()]
+
+        if any(map(self._needs_full_scan, standard_frames)):
+            # One scan checks every row against all frames at once, no row is seen twice
+            check = compile_matcher(frames)
+            follows = False
             for key, value in self._tree:
-                if key not in yielded:
-                    values = self._columns.make_values(key, value, [])
-                    if frame.check(values):
-                        yielded.add(key)
-                        yield self._columns.make_values(key, value, list(columns))
+                if check(key, value):
+                    yield key, value, follows
+                    follows = True
+                else:
+                    follows = False
+            return
 
-    def delete(self, predicate: str):
-        frames = list(compile_predicate(predicate, self._columns))
-        unique_frames = filter(lambda x: x.is_unique(), frames)
-        standard_frames = filter(lambda x: not x.is_unique(), frames)
+        found = set()
+
+        # All point lookups go to the tree as one batch sharing the descents
+        keys = [self._columns.encode_key(frame.get_unique()) for frame in unique_frames]
+        missing = object()
+        for frame, key, value in zip(unique_frames, keys, self._tree.get_many(keys, missing)):
+            if value is not missing and key not in found:
+                if frame.matcher()(key, value):
+                    found.add(key)
+                    yield key, value, False
+        for frame in standard_frames:
+            rows, ordered = self._frame_rows(frame)
+            check = frame.matcher()
+            follows = False
+            for key, value in rows:
+                if key not in found:
+                    if check(key, value):
+                        found.add(key)
+                        yield key, value, follows
+                        follows = ordered
+                        continue
+                follows = False
 
-        deleted = set()
+    def _find(self, frames: List[Frame]):
+        for key, value, _ in self._matches(frames):
+            yield key, value
 
-        for frame in unique_frames:
-            if frame.get_unique() not in deleted:
-                if frame.get_unique() in self._tree:
-                    value = self._tree.get(frame.get_unique())
-                    values = self._columns.make_values(frame.get_unique(), value, [])
+    def select_where(self, predicate: str, *columns):
+        return self._select_frames(self._plans.get(predicate), columns)
 
-                    if frame.check(values):
-                        deleted.add(frame.get_unique())
-                        self._tree.delete(frame.get_unique())
+    def _select_frames(self, frames: List[Frame], columns):
+        for key, value in self._find(frames):
+            yield self._columns.make_values(key, value, list(columns))
 
-        for frame in standard_frames:
-            for key, value in self._tree:
-                if key not in deleted:
-                    values = self._columns.make_values(key, value, [])
-                    if frame.check(values):
-                        deleted.add(key)
-                        self._tree.delete(key)
+    def delete(self, predicate: str):
+        self._delete_frames(self._plans.get(predicate))
+
+    def _delete_frames(self, frames: List[Frame]):
+        # Runs of rows matched one after another by a scan are deleted with a single delete_range
+        runs = []
+        for key, value, follows in self._matches(frames):
+            if self._indexes:
+                self._unindex(key, value)
+            if follows:
+                runs[-1][1] = key
+            else:
+                runs.append([key, key])
+        for first, last in runs:
+            if first is last:
+                self._tree.delete(first)
+            else:
+                self._tree.delete_range(first, last)
 
     def write(self, binary_io: AdvancedBinaryIO):
         binary_io.write_int(len(self._columns.columns))
@@ -88,9 +292,17 @@ class Table:
                     binary_io.write_string(item)
                 else:
                     raise RuntimeError('Unsupported column type')
+        binary_io.write_int(len(self._indexes))
+        for column in self._indexes:
+            binary_io.write_string(column)
+            binary_io.write_string(_type_name(self._index_types.get(column)))
 
     @staticmethod
-    def load(binary_io: AdvancedBinaryIO, tree_type: Type):
+    def load(binary_io: AdvancedBinaryIO, tree_type: Type, encode_keys: bool = False, version: int = FORMAT_VERSION):
+        """
+        Reads a table saved by write
+        :param version: format version of the record, see FORMAT_VERSION
+        """
         column_count = binary_io.read_int()
         columns = []
         for _ in range(column_count):
@@ -99,8 +311,9 @@ class Table:
                 binary_io.read_string(),
                 binary_io.read_bool()
             ))
-        table = Table(tree_type, columns)
+        table = Table(tree_type, columns, encode_keys)
         rows_count = binary_io.read_int()
+        pairs = []
         for _ in range(rows_count):
             values = []
             for column in columns:
@@ -114,6 +327,45 @@ class Table:
                     values.append(binary_io.read_string())
                 else:
                     raise RuntimeError('Unsupported column type')
-            table.insert(*values)
+            pairs.append(table._columns.make_key_value_pair(values))
 
+        # Rows are written in key order, so sorting is linear and the tree is built without rebalancing
+        pairs.sort(key=itemgetter(0))
+        table._tree = tree_type.bulk_load(pairs)
+        if version < 1:
+            return table
+        names = [column.name for column in columns]
+        for _ in range(binary_io.read_int()):
+            column = binary_io.read_string()
+            index_type = INDEX_TREE_TYPES.get(binary_io.read_string(), tree_type)
+            if index_type is not tree_type:
+                table._index_types[column] = index_type
+            table._build_index(names.index(column), column, index_type, pairs)
         return table
+
+
+class PreparedStatement:
+    """
+    Predicate with '?' placeholders tokenized once, see Table.prepare
+    Every call binds values to the placeholders in order and compiles the bound tokens,
+    matchers of the same shape share their compiled code, so only the frames are built again
+    """
+
+    def __init__(self, table: Table, predicate: str):
+        self.predicate = predicate
+        self._table = table
+        self._tokens = list(Tokenizer(predicate))
+        self.parameter_count = sum(isinstance(token, ParameterToken) for token in self._tokens)
+
+    def _frames(self, values: Sequence) -> List[Frame]:
+        tokens = bind_parameters(self._tokens, values)
+        # pylint: disable=protected-access
+        return [frame for frame in compile_tokens(tokens, self._table._columns) if not frame.alwaysFalse]
+
+    def select_where(self, values: Sequence, *columns):
+        """Selects the columns of rows matching the predicate with the values bound, see Table.select_where"""
+        return self._table._select_frames(self._frames(values), columns)  # pylint: disable=protected-access
+
+    def delete(self, values: Sequence):
+        """Deletes rows matching the predicate with the values bound, see Table.delete"""
+        self._table._delete_frames(self._frames(values))  # pylint: disable=protected-access
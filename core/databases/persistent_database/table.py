@@ -1,3 +1,4 @@
+from bisect import bisect_left
 from typing import List, Tuple, Optional
 
 from core.databases.utils.binary_io import AdvancedBinaryIO
@@ -92,13 +93,11 @@ class Table:
 
     @staticmethod
     def _get_new_child_index(node: Node, item: Pair) -> Optional[int]:
-        for idx, parent in enumerate(node.items):
-            if parent.key == item.key:
-                parent.value = item.value
-                return None
-            if parent.key > item.key:
-                return idx
-        return len(node.items)
+        idx = bisect_left([parent.key for parent in node.items], item.key)
+        if idx < len(node.items) and node.items[idx].key == item.key:
+            node.items[idx].value = item.value
+            return None
+        return idx
 
     def _insert_node(self, node_ptr: int, item: Pair) -> Optional[Tuple[Pair, Node, Node]]:
         node = self._get_node(node_ptr)
@@ -139,13 +138,19 @@ class Table:
             yield self._columns.make_values(key, value, list(columns))
 
     def __iter__(self):
-        def dfs(ptr: int):
-            node = self._get_node(ptr)
-            for idx, item in enumerate(node.items):
-                if node.child_ptrs:
-                    yield from dfs(node.child_ptrs[idx])
-                yield item.key, item.value
-            if node.child_ptrs:
-                yield from dfs(node.child_ptrs[-1])
-
-        return dfs(self._root_ptr)
+        stack = []
+        node = self._get_node(self._root_ptr)
+        while node is not None:
+            stack.append((node, 0))
+            node = self._get_node(node.child_ptrs[0]) if node.child_ptrs else None
+
+        while stack:
+            node, idx = stack.pop()
+            if idx == len(node.items):
+                continue
+            yield node.items[idx].key, node.items[idx].value
+            stack.append((node, idx + 1))
+            child = self._get_node(node.child_ptrs[idx + 1]) if node.child_ptrs else None
+            while child is not None:
+                stack.append((child, 0))
+                child = self._get_node(child.child_ptrs[0]) if child.child_ptrs else None
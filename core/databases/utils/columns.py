@@ -1,6 +1,10 @@
 from dataclasses import dataclass
 from typing import Literal, List, Tuple
 
+from core.trees import key_codec
+
+VALUE_TYPES = {'int': int, 'float': float, 'bool': bool, 'str': str}
+
 
 @dataclass
 class Column:
@@ -15,10 +19,32 @@ class UniqueColumn(Column):
 
 
 class Columns:
-    def __init__(self, columns: List[Column]):
+    def __init__(self, columns: List[Column], encode_keys: bool = False):
+        """
+        With encode_keys the tree keys are bytes from key_codec instead of tuples of unique column values,
+        so trees compare composite keys with a single bytes comparison
+        Keys are decoded back to tuples only when rows are materialized by make_values
+        """
         self.columns = columns
         if not any(map(lambda column: column.is_unique, self.columns)):
             raise RuntimeError('At least one column should be unique')
+        self.encode_keys = encode_keys
+        if encode_keys and any(column.value_type not in VALUE_TYPES for column in self.columns):
+            raise RuntimeError('Unsupported column type')
+        # Integral floats and bools decode as int, they are converted back to the column type
+        self._key_types = [VALUE_TYPES.get(column.value_type) for column in self.columns if column.is_unique]
+        self._encode = key_codec.tuple_encoder(self._key_types) if encode_keys else None
+        # Column name -> (whether the column is in the key, index in the key or value tuple), in column order
+        self._locations = {}
+        key_idx = value_idx = 0
+        for column in self.columns:
+            if column.is_unique:
+                self._locations[column.name] = True, key_idx
+                key_idx += 1
+            else:
+                self._locations[column.name] = False, value_idx
+                value_idx += 1
+        self._positions = {column.name: idx for idx, column in enumerate(self.columns)}
 
     def make_key_value_pair(self, values: List) -> Tuple:
         key = []
@@ -28,26 +54,42 @@ class Columns:
                 key.append(value)
             else:
                 value_list.append(value)
-        return tuple(key), tuple(value_list)
+        return self.encode_key(tuple(key)), tuple(value_list)
+
+    def encode_key(self, key: Tuple):
+        """Returns the tree key for a tuple of unique column values"""
+        return self._encode(key) if self.encode_keys else key
+
+    def encode_prefix(self, prefix: Tuple):
+        """Returns a value that the tree keys of all rows with the given leading unique column values start with"""
+        return key_codec.encode_prefix(prefix) if self.encode_keys else prefix
+
+    def decode_key(self, key) -> Tuple:
+        """Returns the tuple of unique column values for a tree key"""
+        if not self.encode_keys:
+            return key
+        return tuple(value_type(item) for value_type, item in zip(self._key_types, key_codec.decode_key(key)))
 
     def make_values(self, key: Tuple, value: Tuple, columns: List[str]) -> List:
-        key = list(key)
-        value_list = list(value)
-        values = []
-        for column in self.columns:
-            if column.is_unique:
-                item = key.pop(0)
-            else:
-                item = value_list.pop(0)
-            if not columns or column.name in columns:
-                values.append(item)
-        return values
+        key = self.decode_key(key)
+        return [key[idx] if in_key else value[idx] for name, (in_key, idx) in self._locations.items()
+                if not columns or name in columns]
+
+    def locate(self, name: str) -> Tuple[bool, int]:
+        """Returns whether the column is stored in the key and its index in the key or value tuple"""
+        if name not in self._locations:
+            raise ValueError(f'Column {name} does not exist')
+        return self._locations[name]
+
+    def get_type(self, name: str) -> str:
+        if name not in self._positions:
+            raise ValueError(f'Column {name} does not exist')
+        return self.columns[self._positions[name]].value_type
 
     def get_value(self, values: List, name: str):
-        for idx, column in enumerate(self.columns):
-            if column.name == name:
-                return values[idx]
-        raise ValueError
+        if name not in self._positions:
+            raise ValueError(f'Column {name} does not exist')
+        return values[self._positions[name]]
 
     def get_unique(self):
         for idx, column in enumerate(self.columns):
@@ -1,26 +1,96 @@
-from typing import List, Dict, Any, Tuple
+from functools import lru_cache
+from typing import Callable, List, Dict, Any, Tuple, Optional
 
 from core.databases.utils.columns import Columns
 from core.databases.utils.node import Node, ColumnNode, ValueNode, BinaryNode
 
+OPERATORS = {'less': '<', 'greater': '>', 'equals': '==', 'and': 'and', 'or': 'or'}
+
+
+def node_bounds(node: Node) -> Dict[str, Tuple[Any, Any]]:
+    """Returns strict column bounds implied by a less or greater node comparing a column with a value"""
+    if not isinstance(node, BinaryNode) or node.operator not in ('less', 'greater'):
+        return {}
+    smaller, greater = (node.left, node.right) if node.operator == 'less' else (node.right, node.left)
+    if isinstance(smaller, ColumnNode) and isinstance(greater, ValueNode):
+        return {smaller.name: (None, greater.data)}
+    if isinstance(smaller, ValueNode) and isinstance(greater, ColumnNode):
+        return {greater.name: (smaller.data, None)}
+    return {}
+
+
+def bound_nodes(bounds: Dict[str, Tuple[Any, Any]]) -> List[Node]:
+    """Returns less and greater nodes checking the strict column bounds"""
+    nodes = []
+    for name, (lower, upper) in bounds.items():
+        if lower is not None:
+            nodes.append(BinaryNode('greater', ColumnNode(name), ValueNode(lower)))
+        if upper is not None:
+            nodes.append(BinaryNode('less', ColumnNode(name), ValueNode(upper)))
+    return nodes
+
+
+def signature(node: Node) -> Tuple:
+    """Returns a hashable description of the node, equal for nodes checking the same condition"""
+    if isinstance(node, BinaryNode):
+        return node.operator, signature(node.left), signature(node.right)
+    if isinstance(node, ColumnNode):
+        return 'column', node.name
+    return 'value', type(node.data), node.data
+
 
 class Frame:
-    def __init__(self, columns: Columns, nodes: List[Node] = None, unique: Dict[str, Any] = None):
+    def __init__(self, columns: Columns, nodes: List[Node] = None, unique: Dict[str, Any] = None,
+                 bounds: Dict[str, Tuple[Any, Any]] = None):
         self.columns = columns
         self.unique = unique if unique else {}
         self.additional = nodes if nodes else []
+        self.bounds = bounds if bounds else {}
         self.alwaysFalse = False
+        self._matcher = None
 
     def __add__(self, other):
-        if isinstance(other, FalseFrame):
+        if self.alwaysFalse or other.alwaysFalse:
             return FalseFrame(self.columns)
         for key, value in other.unique.items():
             if key in self.unique and self.unique[key] != value:
                 return FalseFrame(self.columns)
-        return Frame(self.columns, self.additional + other.additional, self.unique | other.unique)
+        bounds = dict(self.bounds)
+        for name, (lower, upper) in other.bounds.items():
+            if name in bounds:
+                old_lower, old_upper = bounds[name]
+                lower = old_lower if lower is None or (old_lower is not None and old_lower > lower) else lower
+                upper = old_upper if upper is None or (old_upper is not None and old_upper < upper) else upper
+            bounds[name] = lower, upper
+        unique = self.unique | other.unique
+        if any(self._contradicts(name, lower, upper, unique) for name, (lower, upper) in bounds.items()):
+            return FalseFrame(self.columns)
+        # Comparisons of a column with a value are checked once, against the tightest bounds
+        nodes = [node for node in self.additional + other.additional if not node_bounds(node)]
+        return Frame(self.columns, nodes + bound_nodes(bounds), unique, bounds)
+
+    def _contradicts(self, name: str, lower, upper, unique: Dict[str, Any]) -> bool:
+        """Whether no value of the column lies strictly between lower and upper and equals its value in unique"""
+        try:
+            if name in unique:
+                value = unique[name]
+                return (lower is not None and not lower < value) or (upper is not None and not value < upper)
+            if lower is None or upper is None:
+                return False
+            if self.columns.get_type(name) == 'int' and isinstance(lower, int) and isinstance(upper, int):
+                return upper - lower <= 1
+            return not lower < upper
+        except TypeError:
+            # Values of other types are left for the check to compare
+            return False
+
+    def conditions(self) -> List[Node]:
+        """Returns nodes that all hold for the rows of the frame"""
+        return self.additional + [BinaryNode('equals', ColumnNode(name), ValueNode(value))
+                                  for name, value in self.unique.items()]
 
     def is_unique(self):
-        return len(self.unique) == len(list(self.columns.get_unique()))
+        return all(column.name in self.unique for _, column in self.columns.get_unique())
 
     def get_unique(self) -> Tuple:
         columns = []
@@ -29,35 +99,85 @@ class Frame:
                 columns.append(self.unique[item.name])
         return tuple(columns)
 
-    def check(self, values):
-        def _check(node: Node):
-            if isinstance(node, BinaryNode):
-                if node.operator == 'less':
-                    return _check(node.left) < _check(node.right)
-                if node.operator == 'greater':
-                    return _check(node.left) > _check(node.right)
-                if node.operator == 'equal':
-                    return _check(node.left) == _check(node.right)
-                if node.operator == 'and':
-                    return _check(node.left) and _check(node.right)
-                if node.operator == 'or':
-                    return _check(node.left) or _check(node.right)
+    def get_key_range(self) -> Optional[Tuple[Optional[Tuple], Optional[Tuple], Tuple]]:
+        """
+        Returns (lo, hi, prefix) describing the interval of unique keys this frame can match
+        lo is inclusive, hi is exclusive, every matching key starts with prefix
+        Returns None if the frame does not restrict the leading unique column
+        """
+        prefix = ()
+        for _, column in self.columns.get_unique():
+            if column.name in self.unique:
+                prefix += (self.unique[column.name],)
+                continue
+            lower, upper = self.bounds.get(column.name, (None, None))
+            if lower is None and upper is None:
+                break
+            lo = prefix + (lower,) if lower is not None else prefix or None
+            hi = prefix + (upper,) if upper is not None else None
+            return lo, hi, prefix
+        if not prefix:
+            return None
+        return prefix, None, prefix
+
+    def matcher(self) -> Callable[[Any, Tuple], bool]:
+        """
+        Returns a function telling whether the row with the given tree key and value tuple matches the frame
+        The conditions are compiled once into the source of a single function that reads the columns
+        straight from the key and value tuples, the row is never materialized
+        """
+        if self._matcher is None:
+            self._matcher = compile_matcher([self])
+        return self._matcher
+
+    def _source(self, namespace: Dict[str, Any]) -> Tuple[str, bool]:
+        """Returns the source of the expression checking the frame and whether it reads the key"""
+        uses_key = False
+
+        def _source(node: Node) -> str:
+            nonlocal uses_key
+            if isinstance(node, BinaryNode) and node.operator in OPERATORS:
+                return f'({_source(node.left)} {OPERATORS[node.operator]} {_source(node.right)})'
             if isinstance(node, ColumnNode):
-                return self.columns.get_value(values, node.name)
+                in_key, idx = self.columns.locate(node.name)
+                uses_key = uses_key or in_key
+                return f'{"key" if in_key else "value"}[{idx}]'
             if isinstance(node, ValueNode):
-                return node.data
+                # Values are passed to the function as globals, never as source
+                name = f'c{len(namespace)}'
+                namespace[name] = node.data
+                return name
             raise RuntimeError
 
-        if not all(map(_check, self.additional)):
-            return False
-        if not self.is_unique():
-            for unique_key, unique_value in self.unique.items():
-                if self.columns.get_value(values, unique_key) != unique_value:
-                    return False
-        return True
+        conditions = [_source(node) for node in self.conditions()]
+        return f'({" and ".join(conditions) or "True"})', uses_key
 
 
 class FalseFrame(Frame):
-    def check(self, values):
-        return False
+    def __init__(self, columns: Columns):
+        super().__init__(columns)
+        self.alwaysFalse = True
+
+    def matcher(self) -> Callable[[Any, Tuple], bool]:
+        return lambda key, value: False
+
+
+@lru_cache(maxsize=256)
+def _compile_source(source: str):
+    """Compiles the source of a matcher, predicates of the same shape with other values share it"""
+    return compile(source, '<predicate>', 'exec')
+
 
+def compile_matcher(frames: List[Frame]) -> Callable[[Any, Tuple], bool]:
+    """
+    Returns a function telling whether the row with the given tree key and value tuple matches any of the frames
+    The frames are checked in the given order and the first match ends the check
+    """
+    if not frames:
+        return lambda key, value: False
+    namespace = {'decode': frames[0].columns.decode_key}
+    sources = [frame._source(namespace) for frame in frames]  # pylint: disable=protected-access
+    decode = '    key = decode(key)\n' if frames[0].columns.encode_keys and any(uses_key for _, uses_key in sources) else ''
+    source = f'def check(key, value):\n{decode}    return {" or ".join(expression for expression, _ in sources)}\n'
+    exec(_compile_source(source), namespace)  # pylint: disable=exec-used
+    return namespace['check']
@@ -0,0 +1,47 @@
+from collections import OrderedDict
+from typing import Dict, List
+
+from core.databases.utils.columns import Columns
+from core.databases.utils.frame import Frame
+from core.databases.utils.predicate_compiler import compile_predicate
+
+# Number of distinct predicate texts a table keeps compiled
+PLAN_CACHE_SIZE = 128
+
+
+class PlanCache:
+    """
+    LRU cache of the frames compiled from predicate texts, a repeated predicate is neither tokenized nor
+    compiled again and its frames keep their compiled matchers
+    The frames do not depend on the rows or the indexes of the table, so the cache is never invalidated
+    """
+
+    def __init__(self, columns: Columns, size: int = PLAN_CACHE_SIZE):
+        if size < 0:
+            raise ValueError('Plan cache size should be non-negative')
+        self._columns = columns
+        self._size = size
+        self._plans: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, predicate: str) -> List[Frame]:
+        """Returns the frames of the predicate that can match rows"""
+        frames = self._plans.get(predicate)
+        if frames is not None:
+            self.hits += 1
+            self._plans.move_to_end(predicate)
+            return frames
+        self.misses += 1
+        frames = [frame for frame in compile_predicate(predicate, self._columns) if not frame.alwaysFalse]
+        if self._size:
+            self._plans[predicate] = frames
+            if len(self._plans) > self._size:
+                self._plans.popitem(last=False)
+        return frames
+
+    def __len__(self):
+        return len(self._plans)
+
+    def report(self) -> Dict:
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._plans)}
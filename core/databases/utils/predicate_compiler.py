@@ -1,14 +1,98 @@
 import itertools
-from typing import List
+from typing import List, Dict, Tuple, Any
 
 from core.databases.utils.columns import Columns
-from core.databases.utils.frame import Frame
+from core.databases.utils.frame import Frame, FalseFrame, bound_nodes, node_bounds, signature
 from core.databases.utils.node import Node, BinaryNode, ColumnNode, ValueNode
-from core.databases.utils.tokenizer import Tokenizer, ColumnToken
+from core.databases.utils.tokenizer import Tokenizer, Token, ColumnToken, ValueToken, ParameterToken
 
+# Most frames an 'or' or an 'and' may expand to before one of its sides becomes a single residual frame
+MAX_FRAMES = 64
 
-def compile_predicate(expr: str, columns: Columns) -> List[Frame]:
-    tokens = list(Tokenizer(expr))
+
+def _residual(frames: List[Frame], node: Node, columns: Columns) -> Frame:
+    """Returns a single frame for the frames of a subexpression, checking its node unless one frame is enough"""
+    frames = [frame for frame in frames if not frame.alwaysFalse]
+    if not frames:
+        return FalseFrame(columns)
+    if len(frames) == 1:
+        return frames[0]
+    # The node is as large as the subexpression, unlike the conditions of its expanded frames
+    return Frame(columns, [node])
+
+
+def _interval(frame: Frame):
+    """Returns the column and the bounds of a frame that only bounds a single column, otherwise None"""
+    if frame.unique or len(frame.bounds) != 1 or not all(map(node_bounds, frame.additional)):
+        return None
+    return next(iter(frame.bounds.items()))
+
+
+def _merge_intervals(intervals: List[Tuple[Any, Any]]) -> List[Tuple[Any, Any]]:
+    """Merges overlapping open intervals, None is an open end"""
+    intervals = sorted(intervals, key=lambda interval: (interval[0] is not None, interval[0]))
+    merged = [list(intervals[0])]
+    for lower, upper in intervals[1:]:
+        last_upper = merged[-1][1]
+        if last_upper is None or lower is None or lower < last_upper:
+            merged[-1][1] = None if last_upper is None or upper is None else max(last_upper, upper)
+        else:
+            merged.append([lower, upper])
+    return [tuple(interval) for interval in merged]
+
+
+def _simplify(frames: List[Frame], columns: Columns) -> List[Frame]:
+    """
+    Drops contradictory frames, merges frames bounding the same column into disjoint intervals and
+    drops frames whose conditions include all conditions of another frame, which therefore matches their rows
+    """
+    frames = [frame for frame in frames if not frame.alwaysFalse]
+    if len(frames) < 2:
+        return frames
+    intervals: Dict[str, List[int]] = {}
+    for idx, frame in enumerate(frames):
+        interval = _interval(frame)
+        if interval is not None:
+            intervals.setdefault(interval[0], []).append(idx)
+    replaced = {}
+    for name, members in intervals.items():
+        if len(members) < 2:
+            continue
+        try:
+            merged = _merge_intervals([frames[idx].bounds[name] for idx in members])
+        except TypeError:
+            # Bounds of different types are left as they are
+            continue
+        replaced.update(dict.fromkeys(members))
+        replaced[members[0]] = [Frame(columns, bound_nodes({name: interval}), bounds={name: interval})
+                                for interval in merged]
+    if replaced:
+        # The merged intervals take the place of the first frame they replace
+        frames = [item for idx, frame in enumerate(frames) for item in replaced.get(idx, [frame]) or []]
+
+    signatures = [frozenset(map(signature, frame.conditions())) for frame in frames]
+    result = []
+    for idx, frame in enumerate(frames):
+        # Of equal frames the first one is kept
+        if not any(signatures[other] < signatures[idx] or (other < idx and signatures[other] == signatures[idx])
+                   for other in range(len(frames))):
+            result.append(frame)
+    return result
+
+
+def compile_predicate(expr: str, columns: Columns, max_frames: int = MAX_FRAMES) -> List[Frame]:
+    """
+    Returns frames whose union matches the rows matching the predicate
+    Expanding 'and' over 'or' is bounded by max_frames, beyond it the larger side is checked as a residual
+    condition of a single frame instead of being split into frames with key ranges of their own
+    """
+    return compile_tokens(list(Tokenizer(expr)), columns, max_frames)
+
+
+def compile_tokens(tokens: List[Token], columns: Columns, max_frames: int = MAX_FRAMES) -> List[Frame]:
+    """Returns frames for an already tokenized predicate, see compile_predicate"""
+    if any(isinstance(token, ParameterToken) for token in tokens):
+        raise RuntimeError('Predicate has placeholders, use Table.prepare to bind their values')
     idx = 0
 
     def _compile_dynamic() -> Node:
@@ -16,7 +100,8 @@ def compile_predicate(expr: str, columns: Columns) -> List[Frame]:
         token = tokens[idx]
         idx += 1
 
-        if token.data in ['or', 'and', 'equals', 'less', 'greater']:
+        # Values, e.g. the string 'less', are never operators
+        if not isinstance(token, ValueToken) and token.data in ['or', 'and', 'equals', 'less', 'greater']:
             return BinaryNode(token.data, _compile_dynamic(), _compile_dynamic())
         elif isinstance(token, ColumnToken):
             return ColumnNode(token.data)
@@ -33,14 +118,35 @@ def compile_predicate(expr: str, columns: Columns) -> List[Frame]:
         else:
             return ValueNode(token.data)
 
+    def _compile_node(position: int) -> Node:
+        """Compiles the subexpression starting at the token position into a node"""
+        nonlocal idx
+        current, idx = idx, position
+        node = _compile_dynamic()
+        idx = current
+        return node
+
     def _compile_static() -> List[Frame]:
         nonlocal idx
         token = tokens[idx]
         idx += 1
+        if isinstance(token, ValueToken):
+            raise RuntimeError(f'Expected an operator, got value {token.data!r}')
         if token.data == 'or':
-            return _compile_static() + _compile_static()
+            start = idx - 1
+            frames = _compile_static() + _compile_static()
+            return frames if len(frames) <= max_frames else [_residual(frames, _compile_node(start), columns)]
         elif token.data == 'and':
-            return list(map(lambda x: x[0] + x[1], itertools.product(_compile_static(), _compile_static())))
+            left_start = idx
+            left = _compile_static()
+            right_start = idx
+            right = _compile_static()
+            if len(left) * len(right) > max_frames:
+                if len(left) >= len(right):
+                    left = [_residual(left, _compile_node(left_start), columns)]
+                else:
+                    right = [_residual(right, _compile_node(right_start), columns)]
+            return list(map(lambda x: x[0] + x[1], itertools.product(left, right)))
         elif token.data == 'equals':
             value1 = _compile_value()
             value2 = _compile_value()
@@ -51,8 +157,14 @@ def compile_predicate(expr: str, columns: Columns) -> List[Frame]:
             else:
                 return [Frame(columns, [BinaryNode('equals', value1, value2)])]
         elif token.data == 'less':
-            return [Frame(columns, [BinaryNode('less', _compile_dynamic(), _compile_dynamic())])]
+            value1 = _compile_dynamic()
+            value2 = _compile_dynamic()
+            node = BinaryNode('less', value1, value2)
+            return [Frame(columns, [node], bounds=node_bounds(node))]
         elif token.data == 'greater':
-            return [Frame(columns, [BinaryNode('greater', _compile_dynamic(), _compile_dynamic())])]
+            value1 = _compile_dynamic()
+            value2 = _compile_dynamic()
+            node = BinaryNode('greater', value1, value2)
+            return [Frame(columns, [node], bounds=node_bounds(node))]
 
-    return _compile_static()
+    return _simplify(_compile_static(), columns)
@@ -1,3 +1,6 @@
+from typing import List, Sequence
+
+
 class Token:
     def __init__(self, data):
         self.data = data
@@ -23,10 +26,25 @@ class StringToken(ValueToken):
         super().__init__(text)
 
 
+class ParameterToken(Token):
+    """Placeholder '?' for a value bound later, data is its zero-based position among the placeholders"""
+    def __init__(self, position: int):
+        super().__init__(position)
+
+
+def bind_parameters(tokens: List[Token], values: Sequence) -> List[Token]:
+    """Returns the tokens with every placeholder replaced by its value"""
+    count = sum(isinstance(token, ParameterToken) for token in tokens)
+    if len(values) != count:
+        raise RuntimeError(f'Expected {count} bind values, got {len(values)}')
+    return [ValueToken(values[token.data]) if isinstance(token, ParameterToken) else token for token in tokens]
+
+
 class Tokenizer:
     def __init__(self, text: str):
         self._text = text
         self._idx = 0
+        self._parameters = 0
 
     def advance(self):
         self._idx += 1
@@ -46,10 +64,10 @@ class Tokenizer:
     def read_token(self) -> Token:
         if self.get_char().isdigit() or self.get_char() == '-':
             num = ""
-            while self.get_char().isdigit() or self.get_char() == '.' or self.get_char() == '-':
+            while not self.is_end() and (self.get_char().isdigit() or self.get_char() in ['.', '-']):
                 num += self.get_char()
                 self.advance()
-            return NumberToken(int(num))
+            return NumberToken(float(num) if '.' in num else int(num))
         elif self.get_char() == '\'':
             text = ""
             self.advance()
@@ -60,10 +78,14 @@ class Tokenizer:
             return StringToken(text)
         elif self.get_char().isalpha():
             text = ""
-            while self.get_char() not in ['(', ')', ','] and not self.get_char().isspace():
+            while not self.is_end() and self.get_char() not in ['(', ')', ','] and not self.get_char().isspace():
                 text += self.get_char()
                 self.advance()
             return ColumnToken(text)
+        elif self.get_char() == '?':
+            self.advance()
+            self._parameters += 1
+            return ParameterToken(self._parameters - 1)
         else:
             raise RuntimeError
 
@@ -1,7 +1,15 @@
 from abc import abstractmethod
+from typing import Dict, List
 
 
-class AbstractTree:
+class AbstractTree:  # pylint: disable=too-many-public-methods
+    # Whether lookups restructure the tree, so that they are not safe to run concurrently with each other
+    mutating_reads = False
+    # Names of methods that perform a structural event, counted by InstrumentedTree, e.g. {'rotations': ('rotate',)}
+    instrumented_events = {}
+    # Whether the tree orders keys by comparing them, InstrumentedTree only counts comparisons of such trees
+    compares_keys = True
+
     @abstractmethod
     def insert(self, key, value):
         """
@@ -41,6 +49,116 @@ class AbstractTree:
     def __iter__(self):
         pass
 
+    def __reversed__(self):
+        """
+        Iterates over key-value pairs in descending key order
+        :return:
+        """
+        return reversed(list(self))
+
+    @classmethod
+    def bulk_load(cls, items, *args, **kwargs):
+        """
+        Builds a tree from key-value pairs sorted by key
+        Raises ValueError if the keys are not strictly increasing
+        :param items: iterable of key-value pairs
+        :return: new tree
+        """
+        tree = cls(*args, **kwargs)
+        for key, value in cls._check_sorted(items):
+            tree.insert(key, value)
+        return tree
+
+    @staticmethod
+    def _check_sorted(items):
+        """Yields key-value pairs, raises ValueError as soon as the keys stop strictly increasing"""
+        previous = None
+        for idx, (key, value) in enumerate(items):
+            if idx and not previous < key:
+                raise ValueError(f'Keys are not sorted: {previous!r} is followed by {key!r}')
+            previous = key
+            yield key, value
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def depth(self, key) -> int:
+        """
+        Returns the number of nodes a search for the given key visits, whether the key is found or not
+        :param key:
+        :return:
+        """
+        raise NotImplementedError(f'{type(self).__name__} does not report depth')
+
+    def height(self) -> int:
+        """
+        Returns the number of nodes on the longest path from the root, 0 for an empty tree
+        :return:
+        """
+        return max((self.depth(key) for key, _ in self), default=0)
+
+    def snapshot(self):
+        """
+        Returns a frozen view of the current contents that later writes to this tree do not change
+        Only trees that never modify published nodes can do this without copying
+        :return:
+        """
+        raise NotImplementedError(f'{type(self).__name__} does not support snapshots')
+
+    def freeze(self):
+        """
+        Returns an immutable copy of the current contents kept in sorted arrays, see FrozenTree
+        It is built in O(n) and answers lookups and range scans faster and in less memory than linked trees
+        :return:
+        """
+        # Imported here, FrozenTree is itself an AbstractTree
+        from core.trees.frozen_tree import FrozenTree  # pylint: disable=import-outside-toplevel
+        return FrozenTree(iter(self))
+
+    def rank(self, key) -> int:
+        """
+        Returns the number of keys less than the given key
+        :param key:
+        :return:
+        """
+        return self._rank(key, False)
+
+    def select(self, index: int):
+        """
+        Returns key-value pair with the given zero-based position in key order
+        Negative indices count from the end, raises IndexError if index is out of range
+        :param index:
+        :return:
+        """
+        index = self._check_index(index)
+        for idx, pair in enumerate(self):
+            if idx == index:
+                return pair
+        raise IndexError('Tree index out of range')
+
+    def count_range(self, lo=None, hi=None, inclusive=(True, True)) -> int:
+        """
+        Returns the number of keys between lo and hi
+        Takes the same arguments as range
+        :return:
+        """
+        upper = len(self) if hi is None else self._rank(hi, inclusive[1])
+        lower = 0 if lo is None else self._rank(lo, not inclusive[0])
+        return max(upper - lower, 0)
+
+    def _check_index(self, index: int) -> int:
+        """Returns non-negative index, raises IndexError if it is out of range"""
+        size = len(self)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError('Tree index out of range')
+        return index
+
+    def _rank(self, key, inclusive: bool) -> int:
+        """Returns the number of keys less than (or equal to, if inclusive) the given key"""
+        return sum(1 for _ in self.range(hi=key, inclusive=(True, inclusive)))
+
     def __getitem__(self, item):
         return self.get(item)
 
@@ -49,3 +167,137 @@ class AbstractTree:
 
     def __contains__(self, item):
         return self.contains(item)
+
+    def get_or_default(self, key, default=None):
+        """
+        Returns value for the given key or default if the tree does not contain it, in a single descent
+        :param key:
+        :param default:
+        :return:
+        """
+        try:
+            return self.get(key)
+        except KeyError:
+            return default
+
+    def get_many(self, keys, default=None) -> List:
+        """
+        Returns values for the given keys in the same order, default for missing keys
+        The keys are sorted and looked up together, so descents share the common part of their paths
+        :param keys:
+        :param default:
+        :return:
+        """
+        keys = list(keys)
+        found = self._find_many(sorted(set(keys)))
+        return [found.get(key, default) for key in keys]
+
+    def contains_many(self, keys) -> List[bool]:
+        """
+        Checks which of the given keys are in the tree, keeps the order of keys
+        :param keys:
+        :return:
+        """
+        keys = list(keys)
+        found = self._find_many(sorted(set(keys)))
+        return [key in found for key in keys]
+
+    def _find_many(self, keys: List) -> Dict:
+        """Returns a dict of found key-value pairs for the sorted distinct keys"""
+        missing = object()
+        found = {}
+        for key in keys:
+            value = self.get_or_default(key, missing)
+            if value is not missing:
+                found[key] = value
+        return found
+
+    def _replace_value(self, key, value, default=None):
+        """Overwrites the value of key and returns the previous one, returns default and changes nothing if key is missing"""
+        previous = self.get_or_default(key, default)
+        if previous is not default:
+            self.insert(key, value)
+        return previous
+
+    def delete_range(self, lo=None, hi=None, inclusive=(True, True)) -> int:
+        """
+        Deletes the keys between lo and hi
+        Takes the same arguments as range
+        :return: number of deleted keys
+        """
+        keys = [key for key, _ in self.range(lo, hi, inclusive)]
+        for key in keys:
+            self.delete(key)
+        return len(keys)
+
+    def range(self, lo=None, hi=None, inclusive=(True, True)):
+        """
+        Returns an iterator over key-value pairs with keys between lo and hi in ascending order
+        A bound equal to None leaves that side of the range open
+        :param lo: lower bound
+        :param hi: upper bound
+        :param inclusive: pair of flags telling whether lo and hi themselves are included
+        :return:
+        """
+        for key, value in self:
+            if not self._below_upper(key, hi, inclusive[1]):
+                return
+            if self._above_lower(key, lo, inclusive[0]):
+                yield key, value
+
+    def floor(self, key):
+        """
+        Returns key-value pair with the greatest key less than or equal to the given key
+        Raises KeyError if there is no such key
+        :param key:
+        :return:
+        """
+        result = None
+        for pair in self.range(hi=key):
+            result = pair
+        if result is None:
+            raise KeyError(key)
+        return result
+
+    def ceiling(self, key):
+        """
+        Returns key-value pair with the smallest key greater than or equal to the given key
+        Raises KeyError if there is no such key
+        :param key:
+        :return:
+        """
+        for pair in self.range(lo=key):
+            return pair
+        raise KeyError(key)
+
+    def min(self):
+        """
+        Returns key-value pair with the smallest key
+        Raises KeyError if the tree is empty
+        :return:
+        """
+        for pair in self:
+            return pair
+        raise KeyError('Tree is empty')
+
+    def max(self):
+        """
+        Returns key-value pair with the greatest key
+        Raises KeyError if the tree is empty
+        :return:
+        """
+        for pair in reversed(self):
+            return pair
+        raise KeyError('Tree is empty')
+
+    @staticmethod
+    def _above_lower(key, lo, inclusive: bool) -> bool:
+        if lo is None:
+            return True
+        return lo <= key if inclusive else lo < key
+
+    @staticmethod
+    def _below_upper(key, hi, inclusive: bool) -> bool:
+        if hi is None:
+            return True
+        return key <= hi if inclusive else key < hi
@@ -0,0 +1,331 @@
+from collections import Counter, deque
+from dataclasses import dataclass, field, fields
+from threading import Thread
+from typing import Dict, Optional, Type
+
+from core.trees.abstract_tree import AbstractTree
+from core.trees.avl_tree import AVLTree
+from core.trees.b_tree import BTree
+from core.trees.builtin_tree import BuiltinTree
+from core.trees.red_black_tree import RedBlackTree
+from core.trees.splay_tree import SplayTree
+
+# Number of operations between two estimates of the workload
+WINDOW = 4096
+# Another tree type has to be estimated this much cheaper than the current one to migrate to it
+MARGIN = 0.3
+# One lookup key out of this many is sampled to estimate how skewed lookups are
+SAMPLE_EVERY = 8
+SAMPLE_SIZE = 512
+# Operations between checks whether a background rebuild has finished
+MIGRATION_CHECK = 64
+
+
+@dataclass(frozen=True)
+class OperationCosts:
+    """Estimated microseconds per operation, see DEFAULT_COSTS"""
+    insert: float
+    delete: float
+    lookup: float
+    # Lookup of a key that was looked up recently
+    hot_lookup: float
+    # Starting a range or full scan
+    seek: float
+    row: float
+    # Part of the seek cost paid for every key in the tree, for trees that sort on every scan
+    seek_per_key: float = 0.0
+
+
+# Measured on tables of 20000 random single column keys, hot lookups hit 50 keys
+DEFAULT_COSTS = {
+    AVLTree: OperationCosts(insert=17.5, delete=17.8, lookup=1.8, hot_lookup=0.7, seek=9.3, row=0.33),
+    RedBlackTree: OperationCosts(insert=4.1, delete=5.2, lookup=2.2, hot_lookup=0.95, seek=16.5, row=0.42),
+    SplayTree: OperationCosts(insert=5.1, delete=5.3, lookup=4.3, hot_lookup=1.5, seek=8.5, row=0.34),
+    BTree: OperationCosts(insert=2.1, delete=2.5, lookup=1.7, hot_lookup=1.3, seek=9.4, row=0.14),
+    BuiltinTree: OperationCosts(insert=0.23, delete=0.24, lookup=0.38, hot_lookup=0.16, seek=0.0, row=2.1,
+                                seek_per_key=0.55),
+}
+
+
+@dataclass
+class Workload:
+    """Operations counted by AdaptiveTree since the last estimate and a sample of recent lookup keys"""
+    inserts: int = 0
+    deletes: int = 0
+    lookups: int = 0
+    scans: int = 0
+    rows: int = 0
+    samples: deque = field(default_factory=lambda: deque(maxlen=SAMPLE_SIZE))
+
+    def reset(self):
+        """Starts a new window, the sample of keys is kept"""
+        self.inserts = self.deletes = self.lookups = self.scans = self.rows = 0
+
+    def lookup(self, key):
+        self.lookups += 1
+        if not self.lookups % SAMPLE_EVERY:
+            self.samples.append(key)
+
+    def hot_ratio(self) -> float:
+        """Returns the share of sampled lookups whose key was sampled more than once"""
+        counts = Counter(self.samples)
+        return sum(count for count in counts.values() if count > 1) / len(self.samples) if self.samples else 0
+
+    def estimate(self, costs: Dict[Type, OperationCosts], size: int) -> Dict[str, float]:
+        """Returns the estimated cost in microseconds of the counted operations for every tree type in costs"""
+        hot = self.hot_ratio()
+        return {tree_type.__name__: self.inserts * cost.insert + self.deletes * cost.delete +
+                self.lookups * (hot * cost.hot_lookup + (1 - hot) * cost.lookup) +
+                self.scans * (cost.seek + cost.seek_per_key * size) + self.rows * cost.row
+                for tree_type, cost in costs.items()}
+
+    def as_dict(self) -> Dict:
+        result = {item.name: getattr(self, item.name) for item in fields(self) if item.name != 'samples'}
+        result['hot_ratio'] = self.hot_ratio()
+        return result
+
+
+class _Migration:
+    """Rebuild of the pairs in another tree type, writes made meanwhile are logged to be replayed on it"""
+
+    def __init__(self, target: Type, source, background: bool):
+        self.target = target
+        self.log = []
+        self._source = source
+        self._tree = None
+        self._builder = Thread(target=self._build, daemon=True) if background else None
+        if self._builder is None:
+            self._build()
+        else:
+            self._builder.start()
+
+    def _build(self):
+        self._tree = self.target.bulk_load(iter(self._source))
+
+    def done(self) -> bool:
+        return self._builder is None or not self._builder.is_alive()
+
+    def finish(self) -> AbstractTree:
+        """Waits for the rebuild and returns the new tree with the logged writes applied"""
+        if self._builder is not None:
+            self._builder.join()
+        for key, value, deleted in self.log:
+            if deleted:
+                # The key may be missing from the rebuilt tree if it was inserted and deleted after the snapshot
+                if self._tree.contains(key):
+                    self._tree.delete(key)
+            else:
+                self._tree.insert(key, value)
+        return self._tree
+
+
+class AdaptiveTree(AbstractTree):
+    """
+    Tree wrapper that counts the operation mix and moves its contents to the tree type
+    estimated to be the cheapest for it
+    Every WINDOW operations the counts are priced with the costs of every candidate type,
+    when another type is clearly cheaper, by more than the rebuild costs, the pairs are bulk loaded
+    into it by a background thread
+    The current tree keeps serving all operations meanwhile, writes are also logged and
+    replayed on the new tree before it replaces the current one, always in the calling thread,
+    so the wrapped trees never see concurrent access
+    Only trees with snapshots, e.g. PersistentAVLTree, are read by the background thread, the pairs of
+    other trees are first copied in the calling thread, so starting a migration from them takes O(n)
+    Deleting a missing key raises KeyError whatever tree is wrapped
+    Use AdaptiveTree.wrap(tree_type, ...) to get a tree type for Database and Table
+    """
+    tree_type: Type = AVLTree
+    costs: Dict[Type, OperationCosts] = DEFAULT_COSTS
+    window: int = WINDOW
+    margin: float = MARGIN
+    background: bool = True
+
+    def __init__(self, tree: Optional[AbstractTree] = None):
+        self._tree = self.tree_type() if tree is None else tree
+        self.workload = Workload()
+        self._operations = 0
+        self._next_check = self.window
+        self._estimates = {}
+        self._migrations = []
+        self._migration: Optional[_Migration] = None
+
+    @classmethod
+    def wrap(cls, tree_type: Type, costs: Optional[Dict[Type, OperationCosts]] = None, window: int = WINDOW,
+             margin: float = MARGIN, background: bool = True) -> Type:
+        """
+        Returns an adaptive tree type that starts with tree_type and may move to any type in costs
+        :param tree_type: initial tree type, it should have costs as well
+        :param costs: operation costs of the candidate types, DEFAULT_COSTS by default
+        :param window: number of operations between estimates
+        :param margin: relative saving required to migrate
+        :param background: whether migrations build the new tree in a background thread
+        :return:
+        """
+        costs = DEFAULT_COSTS if costs is None else costs
+        if tree_type not in costs:
+            raise ValueError(f'No costs for {tree_type.__name__}')
+        if window <= 0 or not 0 <= margin < 1:
+            raise ValueError('Window should be positive and margin between 0 and 1')
+        return type(f'Adaptive{tree_type.__name__}', (cls,),
+                    {'tree_type': tree_type, 'costs': costs, 'window': window, 'margin': margin,
+                     'background': background})
+
+    @classmethod
+    def bulk_load(cls, items):
+        return cls(cls.tree_type.bulk_load(items))
+
+    @property
+    def mutating_reads(self):
+        return self._tree.mutating_reads
+
+    def _count(self):
+        self._operations += 1
+        if self._operations >= self._next_check:
+            self._check()
+
+    def _check(self):
+        if self._migration is not None:
+            if self._migration.done():
+                self._finish_migration()
+            else:
+                self._next_check = self._operations + MIGRATION_CHECK
+            return
+        self._next_check = self._operations + self.window
+        self._estimates = self.workload.estimate(self.costs, len(self._tree))
+        self.workload.reset()
+        current_type = type(self._tree)
+        current = self._estimates[current_type.__name__]
+        best = min(self.costs, key=lambda tree_type: self._estimates[tree_type.__name__])
+        saving = current - self._estimates[best.__name__]
+        # The rebuild has to pay off within a single window
+        if best is not current_type and saving > current * self.margin and saving > self._rebuild_cost(best):
+            self._start_migration(best)
+
+    def _rebuild_cost(self, target: Type) -> float:
+        """Every pair is read once from the current tree and loaded once into target"""
+        return len(self._tree) * (self.costs[type(self._tree)].row + self.costs[target].row)
+
+    def _start_migration(self, target: Type):
+        self._migrations.append({'operation': self._operations, 'from': type(self._tree).__name__,
+                                 'to': target.__name__, 'size': len(self._tree), 'estimates': dict(self._estimates),
+                                 'rebuild_cost': self._rebuild_cost(target),
+                                 'hot_ratio': self.workload.hot_ratio(), 'finished': False})
+        try:
+            # A snapshot stays unchanged, so the builder can read it while this tree takes writes
+            source = self._tree.snapshot()
+        except NotImplementedError:
+            # The builder cannot read a tree that takes writes meanwhile, the copy blocks the caller
+            source = list(self._tree)
+        self._migration = _Migration(target, source, self.background)
+        if self.background:
+            self._next_check = self._operations + MIGRATION_CHECK
+        else:
+            self._finish_migration()
+
+    def _finish_migration(self):
+        try:
+            self._tree = self._migration.finish()
+            self._migrations[-1]['finished'] = True
+        finally:
+            # A failed migration is dropped, the current tree keeps serving
+            self._migration = None
+            self._next_check = self._operations + self.window
+
+    def wait_for_migration(self):
+        """Blocks until a running migration finishes and its tree replaces the current one"""
+        if self._migration is not None:
+            self._finish_migration()
+
+    def report(self) -> Dict:
+        """Returns the current tree type, the workload and estimates of the last window and all migrations"""
+        return {'tree_type': type(self._tree).__name__,
+                'migrating_to': self._migration and self._migration.target.__name__,
+                'operations': self._operations, 'workload': self.workload.as_dict(),
+                'estimates': dict(self._estimates), 'migrations': [dict(item) for item in self._migrations]}
+
+    def _counted_rows(self, rows):
+        self.workload.scans += 1
+        self._count()
+        for pair in rows:
+            self.workload.rows += 1
+            yield pair
+
+    def insert(self, key, value):
+        self._tree.insert(key, value)
+        if self._migration is not None:
+            self._migration.log.append((key, value, False))
+        self.workload.inserts += 1
+        self._count()
+
+    def delete(self, key):
+        # Wrapped types differ on missing keys, a migration must not change what callers see
+        if not self._tree.contains(key):
+            raise KeyError(key)
+        self._tree.delete(key)
+        if self._migration is not None:
+            self._migration.log.append((key, None, True))
+        self.workload.deletes += 1
+        self._count()
+
+    def get(self, key):
+        self.workload.lookup(key)
+        self._count()
+        return self._tree.get(key)
+
+    def contains(self, key) -> bool:
+        self.workload.lookup(key)
+        self._count()
+        return self._tree.contains(key)
+
+    def get_or_default(self, key, default=None):
+        self.workload.lookup(key)
+        self._count()
+        return self._tree.get_or_default(key, default)
+
+    def get_many(self, keys, default=None):
+        keys = list(keys)
+        for key in keys:
+            self.workload.lookup(key)
+        self._count()
+        return self._tree.get_many(keys, default)
+
+    def contains_many(self, keys):
+        keys = list(keys)
+        for key in keys:
+            self.workload.lookup(key)
+        self._count()
+        return self._tree.contains_many(keys)
+
+    def __iter__(self):
+        return self._counted_rows(iter(self._tree))
+
+    def __reversed__(self):
+        return self._counted_rows(reversed(self._tree))
+
+    def __len__(self):
+        return len(self._tree)
+
+    def range(self, lo=None, hi=None, inclusive=(True, True)):
+        return self._counted_rows(self._tree.range(lo, hi, inclusive))
+
+    def floor(self, key):
+        self.workload.lookup(key)
+        self._count()
+        return self._tree.floor(key)
+
+    def ceiling(self, key):
+        self.workload.lookup(key)
+        self._count()
+        return self._tree.ceiling(key)
+
+    def select(self, index: int):
+        return self._tree.select(index)
+
+    def depth(self, key) -> int:
+        return self._tree.depth(key)
+
+    def height(self) -> int:
+        return self._tree.height()
+
+    def snapshot(self):
+        return self._tree.snapshot()
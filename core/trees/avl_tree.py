@@ -1,11 +1,14 @@
 """
 AVL Tree
 """
-from core.trees.abstract_tree import AbstractTree
+from bisect import bisect_left
+
+from core.trees.joinable_tree import JoinableTree
 
 
 class AVLNode:
     """AVL node"""
+    __slots__ = ('key', 'val', 'left', 'right', 'height', 'size')
 
     def __init__(self, key, val, left=None, right=None):
         """Init"""
@@ -14,24 +17,40 @@ class AVLNode:
         self.left = left
         self.right = right
         self.height = 1
+        self.size = 1
 
 
-class AVLTree(AbstractTree):
+class AVLTree(JoinableTree):
     """AVL tree"""
+    instrumented_events = {'rotations': ('l_rotate', 'r_rotate')}
 
     def __init__(self):
         """Init"""
         self._root = None
 
     def __iter__(self):
-        """Iter"""
-        def dfs(node: AVLNode):
-            """DFS"""
-            if node:
-                yield from dfs(node.left)
-                yield node.key, node.val
-                yield from dfs(node.right)
-        yield from dfs(self._root)
+        """In-order iteration with an explicit stack"""
+        stack = []
+        node = self._root
+        while stack or node is not None:
+            while node is not None:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            yield node.key, node.val
+            node = node.right
+
+    def __reversed__(self):
+        """Reverse in-order iteration with an explicit stack"""
+        stack = []
+        node = self._root
+        while stack or node is not None:
+            while node is not None:
+                stack.append(node)
+                node = node.right
+            node = stack.pop()
+            yield node.key, node.val
+            node = node.left
 
     def insert(self, key, val):
         """Insert"""
@@ -48,6 +67,7 @@ class AVLTree(AbstractTree):
 
             root.height = 1 + max(self.n_height(root.left),
                                   self.n_height(root.right))
+            root.size = 1 + self.n_size(root.left) + self.n_size(root.right)
 
             balance = self.balance(root)
             if balance > 1:
@@ -63,11 +83,29 @@ class AVLTree(AbstractTree):
                 return self.l_rotate(root)
 
             return root
-        if isinstance(key, list):
-            for num in zip(key, val):
-                self._root = insert_helper(self._root, num[0], num[1])
-        else:
-            self._root = insert_helper(self._root, key, val)
+        self._root = insert_helper(self._root, key, val)
+
+    @classmethod
+    def bulk_load(cls, items):
+        """
+        Builds a balanced tree from sorted pairs in O(n)
+        Raises ValueError if keys are not strictly increasing
+        """
+        items = list(cls._check_sorted(items))
+
+        def build(low: int, high: int):
+            """Builds subtree from items[low:high]"""
+            if low == high:
+                return None
+            mid = (low + high) // 2
+            node = AVLNode(*items[mid], build(low, mid), build(mid + 1, high))
+            node.height = (high - low).bit_length()
+            node.size = high - low
+            return node
+
+        tree = cls()
+        tree._root = build(0, len(items))
+        return tree
 
     def get(self, key):
         """
@@ -94,6 +132,118 @@ class AVLTree(AbstractTree):
         except KeyError:
             return False
 
+    def get_or_default(self, key, default=None):
+        """
+        Returns node's value if found
+        Else returns default
+        """
+        root = self._root
+        while root is not None:
+            if key < root.key:
+                root = root.left
+            elif key > root.key:
+                root = root.right
+            else:
+                return root.val
+        return default
+
+    def _find_many(self, keys):
+        """
+        Looks up sorted keys in one walk
+        Every node splits the keys between its subtrees, so shared path prefixes are visited once
+        """
+        found = {}
+        stack = [(self._root, 0, len(keys))]
+        while stack:
+            root, low, high = stack.pop()
+            if root is None or low == high:
+                continue
+            mid = bisect_left(keys, root.key, low, high)
+            after = mid
+            if mid < high and keys[mid] == root.key:
+                found[root.key] = root.val
+                after += 1
+            stack.append((root.left, low, mid))
+            stack.append((root.right, after, high))
+        return found
+
+    def range(self, lo=None, hi=None, inclusive=(True, True)):
+        """
+        Yields key-value pairs between lo and hi in ascending order
+        Descends once to lo, then walks in order until hi
+        """
+        stack = []
+        root = self._root
+        while root is not None:
+            if self._above_lower(root.key, lo, inclusive[0]):
+                stack.append(root)
+                root = root.left
+            else:
+                root = root.right
+        while stack:
+            root = stack.pop()
+            if not self._below_upper(root.key, hi, inclusive[1]):
+                return
+            yield root.key, root.val
+            root = root.right
+            while root is not None:
+                stack.append(root)
+                root = root.left
+
+    def floor(self, key):
+        """
+        Returns pair with the greatest key <= key
+        Else raises KeyError
+        """
+        root, result = self._root, None
+        while root is not None:
+            if key < root.key:
+                root = root.left
+            else:
+                result = root
+                if key == root.key:
+                    break
+                root = root.right
+        if result is None:
+            raise KeyError(key)
+        return result.key, result.val
+
+    def ceiling(self, key):
+        """
+        Returns pair with the smallest key >= key
+        Else raises KeyError
+        """
+        root, result = self._root, None
+        while root is not None:
+            if key > root.key:
+                root = root.right
+            else:
+                result = root
+                if key == root.key:
+                    break
+                root = root.left
+        if result is None:
+            raise KeyError(key)
+        return result.key, result.val
+
+    def min(self):
+        """Returns pair with the smallest key"""
+        root = self._root
+        if root is None:
+            raise KeyError('Tree is empty')
+        while root.left is not None:
+            root = root.left
+        return root.key, root.val
+
+    def max(self):
+        """Returns pair with the greatest key"""
+        root = self._root
+        if root is None:
+            raise KeyError('Tree is empty')
+        while root.right is not None:
+            root = root.right
+        return root.key, root.val
+
     def delete(self, key):
         """Delete"""
         def helper(root: AVLNode):
@@ -124,12 +274,14 @@ class AVLTree(AbstractTree):
                     return temp
                 temp = helper(root.right)
                 root.key = temp.key
+                root.val = temp.val
                 root.right = delete_helper(temp.key, root.right)
             if root is None:
                 return root
 
             root.height = 1 + max(self.n_height(root.left),
                                   self.n_height(root.right))
+            root.size = 1 + self.n_size(root.left) + self.n_size(root.right)
 
             n_balance = self.balance(root)
 
@@ -156,8 +308,10 @@ class AVLTree(AbstractTree):
         node.right = lr_nde
         node.height = 1 + max(self.n_height(node.left),
                               self.n_height(node.right))
+        node.size = 1 + self.n_size(node.left) + self.n_size(node.right)
         r_nde.height = 1 + max(self.n_height(r_nde.left),
                                self.n_height(r_nde.right))
+        r_nde.size = 1 + self.n_size(r_nde.left) + self.n_size(r_nde.right)
         return r_nde
 
     def r_rotate(self, node: AVLNode):
@@ -168,16 +322,151 @@ class AVLTree(AbstractTree):
         node.left = rl_nde
         node.height = 1 + max(self.n_height(node.left),
                               self.n_height(node.right))
+        node.size = 1 + self.n_size(node.left) + self.n_size(node.right)
         l_nde.height = 1 + max(self.n_height(l_nde.left),
                                self.n_height(l_nde.right))
+        l_nde.size = 1 + self.n_size(l_nde.left) + self.n_size(l_nde.right)
         return l_nde
 
+    def _joinable(self, other) -> bool:
+        """Any AVL tree, the nodes of other are only read"""
+        return isinstance(other, AVLTree)
+
+    def _root_subtree(self):
+        return self._root
+
+    def _set_root(self, subtree):
+        self._root = subtree
+
+    def _empty(self):
+        return None
+
+    def _size_of(self, subtree) -> int:
+        return self.n_size(subtree)
+
+    def _expose(self, subtree):
+        return subtree.left, subtree, subtree.right
+
+    def _new_node(self, key, value):
+        return AVLNode(key, value)
+
+    def _pair(self, node):
+        return node.key, node.val
+
+    def _node(self, node: AVLNode, left, right) -> AVLNode:
+        """Links the children to the node and updates its height and size"""
+        node.left = left
+        node.right = right
+        node.height = 1 + max(self.n_height(left), self.n_height(right))
+        node.size = 1 + self.n_size(left) + self.n_size(right)
+        return node
+
+    def _join(self, left, node, right):
+        """Descends the spine of the higher subtree to a subtree as high as the other one, see JoinableTree"""
+        if self.n_height(left) > self.n_height(right) + 1:
+            return self._join_right(left, node, right)
+        if self.n_height(right) > self.n_height(left) + 1:
+            return self._join_left(left, node, right)
+        return self._node(node, left, right)
+
+    def _join_right(self, left: AVLNode, node, right):
+        """Joins along the right spine of left, which is higher than right"""
+        inner = left.right
+        if self.n_height(inner) <= self.n_height(right) + 1:
+            joined = self._node(node, inner, right)
+            if self.n_height(joined) <= self.n_height(left.left) + 1:
+                return self._node(left, left.left, joined)
+            return self._join_rotate_left(self._node(left, left.left, self._join_rotate_right(joined)))
+        joined = self._join_right(inner, node, right)
+        result = self._node(left, left.left, joined)
+        if self.n_height(joined) <= self.n_height(left.left) + 1:
+            return result
+        return self._join_rotate_left(result)
+
+    def _join_left(self, left, node, right: AVLNode):
+        """Joins along the left spine of right, which is higher than left"""
+        inner = right.left
+        if self.n_height(inner) <= self.n_height(left) + 1:
+            joined = self._node(node, left, inner)
+            if self.n_height(joined) <= self.n_height(right.right) + 1:
+                return self._node(right, joined, right.right)
+            return self._join_rotate_right(self._node(right, self._join_rotate_left(joined), right.right))
+        joined = self._join_left(left, node, inner)
+        result = self._node(right, joined, right.right)
+        if self.n_height(joined) <= self.n_height(right.right) + 1:
+            return result
+        return self._join_rotate_right(result)
+
+    def _join_rotate_left(self, node: AVLNode) -> AVLNode:
+        """Left rotation built with _node, so that subclasses decide whether nodes are reused"""
+        top = node.right
+        return self._node(top, self._node(node, node.left, top.left), top.right)
+
+    def _join_rotate_right(self, node: AVLNode) -> AVLNode:
+        """Right rotation built with _node"""
+        top = node.left
+        return self._node(top, top.left, self._node(node, top.right, node.right))
+
     def n_height(self, root: AVLNode):
         """Returns node height"""
         if not root:
             return 0
         return root.height
 
+    def n_size(self, root: AVLNode):
+        """Returns number of nodes in the subtree"""
+        if not root:
+            return 0
+        return root.size
+
+    def __len__(self):
+        """Number of keys"""
+        return self.n_size(self._root)
+
+    def _rank(self, key, inclusive: bool) -> int:
+        """Counts keys less than key (or equal to it if inclusive)"""
+        count = 0
+        root = self._root
+        while root is not None:
+            if root.key < key or (inclusive and root.key == key):
+                count += self.n_size(root.left) + 1
+                root = root.right
+            else:
+                root = root.left
+        return count
+
+    def select(self, index: int):
+        """Returns pair at the given position in key order"""
+        index = self._check_index(index)
+        root = self._root
+        while True:
+            left_size = self.n_size(root.left)
+            if index < left_size:
+                root = root.left
+            elif index == left_size:
+                return root.key, root.val
+            else:
+                index -= left_size + 1
+                root = root.right
+
+    def depth(self, key) -> int:
+        """Number of nodes on the search path of key"""
+        depth = 0
+        root = self._root
+        while root is not None:
+            depth += 1
+            if key < root.key:
+                root = root.left
+            elif key > root.key:
+                root = root.right
+            else:
+                break
+        return depth
+
+    def height(self) -> int:
+        """Height of the root"""
+        return self.n_height(self._root)
+
     def balance(self, root: AVLNode):
         """Checks balance"""
         if not root:
@@ -1,19 +1,25 @@
+from array import array
+from bisect import bisect_left, bisect_right
 from dataclasses import dataclass
-from typing import List, Any, Optional, Tuple
+from typing import List, Any, MutableSequence, Optional, Tuple
 
 from core.trees.abstract_tree import AbstractTree
 
+DEFAULT_ORDER = 128
+# Typed array codes for keys of these exact types, bool and other int subclasses stay in lists
+KEY_TYPECODES = {int: 'q', float: 'd'}
+_INT64 = 2 ** 63
+
 
 class BTree(AbstractTree):
-    @dataclass
-    class _Pair:
-        key: Any
-        value: Any
+    instrumented_events = {'splits': ('_split',), 'merges': ('_merge',)}
 
-    @dataclass
+    @dataclass(slots=True)
     class _Node:
-        items: List
+        keys: MutableSequence
+        values: List
         children: List
+        size: int = 0
 
         def is_inner(self) -> bool:
             return not self.is_leaf()
@@ -21,167 +27,413 @@ class BTree(AbstractTree):
         def is_leaf(self) -> bool:
             return not self.children
 
-    def __init__(self, order: int = 3):
+    def __init__(self, order: int = DEFAULT_ORDER, typed_keys: bool = True):
+        """
+        :param order: maximum number of children of a node
+        :param typed_keys: keep keys in typed arrays of 8-byte machine values while all of them are ints
+        that fit into 64 bits or all of them are floats, instead of in lists of pointers to key objects
+        """
+        if order < 3:
+            raise ValueError('BTree order should be at least 3')
         self._order = order
+        self._typed_keys = typed_keys
+        # Typecode of the arrays holding the keys of all nodes, None if they are lists
+        self._typecode = None
         self._root = None
 
+    @staticmethod
+    def _typecode_of(key) -> Optional[str]:
+        typecode = KEY_TYPECODES.get(type(key))
+        if typecode == 'q' and not -_INT64 <= key < _INT64:
+            return None
+        return typecode
+
+    def _new_keys(self, keys=()) -> MutableSequence:
+        return list(keys) if self._typecode is None else array(self._typecode, keys)
+
+    def _fit_key(self, key):
+        """Chooses the key storage for the first key, switches all nodes to lists for a key that does not fit"""
+        if self._root is None:
+            self._typecode = self._typecode_of(key) if self._typed_keys else None
+        elif self._typecode is not None and self._typecode_of(key) != self._typecode:
+            self._typecode = None
+            stack = [self._root]
+            while stack:
+                node = stack.pop()
+                node.keys = list(node.keys)
+                stack.extend(node.children)
+
     def __iter__(self):
-        def dfs(node: BTree._Node):
-            for idx, item in enumerate(node.items):
-                if node.children:
-                    yield from dfs(node.children[idx])
-                yield item.key, item.value
-            if node.children:
-                yield from dfs(node.children[-1])
+        stack = []
+        node = self._root
+        while node is not None:
+            stack.append((node, 0))
+            node = node.children[0] if node.children else None
+
+        while stack:
+            node, idx = stack.pop()
+            if not node.children:
+                yield from zip(node.keys, node.values)
+                continue
+            if idx == len(node.keys):
+                continue
+            yield node.keys[idx], node.values[idx]
+            stack.append((node, idx + 1))
+            child = node.children[idx + 1]
+            while child is not None:
+                stack.append((child, 0))
+                child = child.children[0] if child.children else None
 
-        yield from dfs(self._root)
+    def __reversed__(self):
+        stack = []
+        node = self._root
+        while node is not None:
+            stack.append((node, len(node.keys)))
+            node = node.children[-1] if node.children else None
+
+        while stack:
+            node, idx = stack.pop()
+            if not node.children:
+                yield from zip(reversed(node.keys), reversed(node.values))
+                continue
+            if idx == 0:
+                continue
+            yield node.keys[idx - 1], node.values[idx - 1]
+            stack.append((node, idx - 1))
+            child = node.children[idx - 1]
+            while child is not None:
+                stack.append((child, len(child.keys)))
+                child = child.children[-1] if child.children else None
 
     @staticmethod
-    def _get_new_child_index(node: _Node, item: _Pair) -> Optional[int]:
-        for idx, parent in enumerate(node.items):
-            if parent.key == item.key:
-                parent.value = item.value
-                return None
-            if parent.key > item.key:
-                return idx
-        return len(node.items)
-
-    def _insert(self, node: _Node, item: _Pair) -> Optional[Tuple[_Pair, _Node, _Node]]:
-        if (child_idx := BTree._get_new_child_index(node, item)) is not None:
-            if node.children:
-                splitted_node = self._insert(node.children[child_idx], item)
-                if splitted_node is not None:
-                    parent, left, right = splitted_node
-                    node.items.insert(child_idx, parent)
-                    node.children[child_idx:child_idx + 1] = [left, right]
-            else:
-                node.items.insert(child_idx, item)
+    def _make_node(keys: MutableSequence, values: List, children: List) -> _Node:
+        return BTree._Node(keys, values, children, len(keys) + sum(child.size for child in children))
+
+    def _split(self, node: _Node) -> Tuple[Any, Any, _Node]:
+        middle_idx = len(node.keys) // 2
+        right = self._make_node(node.keys[middle_idx + 1:], node.values[middle_idx + 1:],
+                                node.children[middle_idx + 1:])
+        middle = node.keys[middle_idx], node.values[middle_idx], right
+        del node.keys[middle_idx:], node.values[middle_idx:], node.children[middle_idx + 1:]
+        node.size -= right.size + 1
+        return middle
 
-            if len(node.items) == self._order:
-                middle_idx = len(node.items) // 2
-                middle_item = node.items[middle_idx]
-                left_node = BTree._Node(node.items[:middle_idx], node.children[:middle_idx + 1])
-                right_node = BTree._Node(node.items[middle_idx + 1:], node.children[middle_idx + 1:])
-                return middle_item, left_node, right_node
-        return None
+    def _insert(self, node: _Node, key, value) -> Tuple[bool, Optional[Tuple[Any, Any, _Node]]]:
+        """Returns whether a new key was added and the split of the node if it overflowed"""
+        idx = bisect_left(node.keys, key)
+        if idx < len(node.keys) and node.keys[idx] == key:
+            node.values[idx] = value
+            return False, None
+
+        if node.children:
+            inserted, splitted_node = self._insert(node.children[idx], key, value)
+            if inserted:
+                node.size += 1
+            if splitted_node is None:
+                return inserted, None
+            key, value, right = splitted_node
+            node.children.insert(idx + 1, right)
+        else:
+            node.size += 1
+        node.keys.insert(idx, key)
+        node.values.insert(idx, value)
+
+        if len(node.keys) == self._order:
+            return True, self._split(node)
+        return True, None
 
     def insert(self, key, value):
+        self._fit_key(key)
         if self._root:
-            splitted_node = self._insert(self._root, BTree._Pair(key, value))
+            _, splitted_node = self._insert(self._root, key, value)
             if splitted_node is not None:
-                parent, left, right = splitted_node
-                self._root = self._Node([parent], [left, right])
+                key, value, right = splitted_node
+                self._root = self._make_node(self._new_keys([key]), [value], [self._root, right])
         else:
-            self._root = self._Node([BTree._Pair(key, value)], [])
-
-    def _get(self, key):
-        root = self._root
-        while root is not None:
-            for idx, item in enumerate(root.items):
-                if key < item.key:
-                    if not root.children:
-                        return None
-                    root = root.children[idx]
-                    break
-                if key == item.key:
-                    return item
-            else:
-                if key == root.items[-1].key:
-                    return root.items[-1]
-                if root.children:
-                    root = root.children[-1]
-                else:
-                    break
-        return None
+            self._root = self._make_node(self._new_keys([key]), [value], [])
+
+    @classmethod
+    def bulk_load(cls, items, *args, **kwargs):
+        items = list(cls._check_sorted(items))
+        tree = cls(*args, **kwargs)
+        if not items:
+            return tree
+        order = tree._order
+        if tree._typed_keys:
+            typecodes = {cls._typecode_of(key) for key, _ in items}
+            tree._typecode = typecodes.pop() if len(typecodes) == 1 else None
+        new_keys = tree._new_keys
+
+        # capacities[height] is the maximum number of items in a subtree of that height
+        capacities = [0]
+        while capacities[-1] < len(items):
+            capacities.append(capacities[-1] * order + order - 1)
+
+        def build(low: int, high: int, height: int) -> BTree._Node:
+            if height == 1:
+                return cls._Node(new_keys(key for key, _ in items[low:high]),
+                                 [value for _, value in items[low:high]], [], high - low)
+            children_count = max(2, -(-(high - low + 1) // (capacities[height - 1] + 1)))
+            per_child, extra = divmod(high - low - children_count + 1, children_count)
+            node = cls._Node(new_keys(), [], [], high - low)
+            for idx in range(children_count):
+                size = per_child + (idx < extra)
+                node.children.append(build(low, low + size, height - 1))
+                low += size
+                if idx != children_count - 1:
+                    node.keys.append(items[low][0])
+                    node.values.append(items[low][1])
+                    low += 1
+            return node
+
+        tree._root = build(0, len(items), len(capacities) - 1)
+        return tree
+
+    def _get(self, key) -> Tuple[Optional[_Node], int]:
+        node = self._root
+        while node is not None:
+            idx = bisect_left(node.keys, key)
+            if idx < len(node.keys) and node.keys[idx] == key:
+                return node, idx
+            node = node.children[idx] if node.children else None
+        return None, 0
 
     def get(self, key):
-        pair = self._get(key)
-        if pair is None:
+        node, idx = self._get(key)
+        if node is None:
             raise KeyError(key)
-        return pair.value
+        return node.values[idx]
 
     def contains(self, key) -> bool:
-        return self._get(key) is not None
+        return self._get(key)[0] is not None
+
+    def get_or_default(self, key, default=None):
+        node, idx = self._get(key)
+        return default if node is None else node.values[idx]
+
+    def _replace_value(self, key, value, default=None):
+        """Overwrites the value in place in one descent"""
+        node, idx = self._get(key)
+        if node is None:
+            return default
+        previous, node.values[idx] = node.values[idx], value
+        return previous
+
+    def depth(self, key) -> int:
+        depth = 0
+        node = self._root
+        while node is not None:
+            depth += 1
+            idx = bisect_left(node.keys, key)
+            if idx < len(node.keys) and node.keys[idx] == key:
+                break
+            node = node.children[idx] if node.children else None
+        return depth
+
+    def height(self) -> int:
+        height = 0
+        node = self._root
+        while node is not None:
+            height += 1
+            node = node.children[0] if node.children else None
+        return height
+
+    def _find_many(self, keys):
+        """Looks up sorted keys in one walk, every node splits the keys between its children"""
+        found = {}
+        stack = [(self._root, 0, len(keys))] if self._root is not None else []
+        while stack:
+            node, low, high = stack.pop()
+            while low < high:
+                idx = bisect_left(node.keys, keys[low])
+                if idx < len(node.keys) and node.keys[idx] == keys[low]:
+                    found[keys[low]] = node.values[idx]
+                    low += 1
+                    continue
+                end = bisect_left(keys, node.keys[idx], low, high) if idx < len(node.keys) else high
+                if node.children:
+                    stack.append((node.children[idx], low, end))
+                low = end
+        return found
+
+    def range(self, lo=None, hi=None, inclusive=(True, True)):
+        stack = []
+        node = self._root
+        while node is not None:
+            if lo is None:
+                idx = 0
+            else:
+                idx = bisect_left(node.keys, lo) if inclusive[0] else bisect_right(node.keys, lo)
+            stack.append((node, idx))
+            node = node.children[idx] if node.children else None
+
+        while stack:
+            node, idx = stack.pop()
+            if idx == len(node.keys):
+                continue
+            key = node.keys[idx]
+            if not self._below_upper(key, hi, inclusive[1]):
+                return
+            yield key, node.values[idx]
+            stack.append((node, idx + 1))
+            child = node.children[idx + 1] if node.children else None
+            while child is not None:
+                stack.append((child, 0))
+                child = child.children[0] if child.children else None
+
+    def floor(self, key):
+        node, result = self._root, None
+        while node is not None:
+            idx = bisect_right(node.keys, key)
+            if idx:
+                result = node.keys[idx - 1], node.values[idx - 1]
+                if result[0] == key:
+                    break
+            node = node.children[idx] if node.children else None
+        if result is None:
+            raise KeyError(key)
+        return result
+
+    def ceiling(self, key):
+        node, result = self._root, None
+        while node is not None:
+            idx = bisect_left(node.keys, key)
+            if idx < len(node.keys):
+                result = node.keys[idx], node.values[idx]
+                if result[0] == key:
+                    break
+            node = node.children[idx] if node.children else None
+        if result is None:
+            raise KeyError(key)
+        return result
+
+    def min(self):
+        if self._root is None:
+            raise KeyError('Tree is empty')
+        node = self._root
+        while node.children:
+            node = node.children[0]
+        return node.keys[0], node.values[0]
+
+    def max(self):
+        if self._root is None:
+            raise KeyError('Tree is empty')
+        node = self._root
+        while node.children:
+            node = node.children[-1]
+        return node.keys[-1], node.values[-1]
+
+    def __len__(self):
+        return self._root.size if self._root is not None else 0
+
+    def _rank(self, key, inclusive: bool) -> int:
+        count = 0
+        node = self._root
+        while node is not None:
+            idx = bisect_right(node.keys, key) if inclusive else bisect_left(node.keys, key)
+            count += idx
+            if not node.children:
+                break
+            count += sum(child.size for child in node.children[:idx])
+            node = node.children[idx]
+        return count
+
+    def select(self, index: int):
+        index = self._check_index(index)
+        node = self._root
+        while node.children:
+            for idx, child in enumerate(node.children):
+                if index < child.size:
+                    node = child
+                    break
+                index -= child.size
+                if index == 0:
+                    return node.keys[idx], node.values[idx]
+                index -= 1
+        return node.keys[index], node.values[index]
 
     def _get_min_degree(self) -> int:
         return (self._order + 1) // 2 - 1
 
+    def _merge(self, node: _Node, idx: int):
+        left, right = node.children[idx], node.children.pop(idx + 1)
+        left.keys.append(node.keys.pop(idx))
+        left.values.append(node.values.pop(idx))
+        left.keys.extend(right.keys)
+        left.values.extend(right.values)
+        left.children.extend(right.children)
+        left.size += right.size + 1
+
     def _fix_missing(self, node: _Node, child_idx: int):
-        if len(node.children[child_idx].items) < self._get_min_degree():
-            if child_idx != 0 and len(node.children[child_idx - 1].items) > self._get_min_degree():
-                new_parent = node.children[child_idx - 1].items.pop()
-                new_item = node.items[child_idx - 1]
-                node.items[child_idx - 1] = new_parent
-                node.children[child_idx].items.insert(0, new_item)
-                if node.children[child_idx - 1].is_inner():
-                    node.children[child_idx].children.insert(0, node.children[child_idx - 1].children.pop())
-            elif child_idx != len(node.children) - 1 and \
-                    len(node.children[child_idx + 1].items) > self._get_min_degree():
-                new_parent = node.children[child_idx + 1].items.pop(0)
-                new_item = node.items[child_idx]
-                node.items[child_idx] = new_parent
-                node.children[child_idx].items.append(new_item)
-                if node.children[child_idx + 1].is_inner():
-                    node.children[child_idx].children.append(node.children[child_idx + 1].children.pop(0))
-            else:
-                if child_idx != 0:
-                    left_sibling = node.children[child_idx - 1]
-                    left_sibling.items.extend([node.items.pop(child_idx - 1)] + node.children[child_idx].items)
-                    if node.children[child_idx].is_inner():
-                        left_sibling.children.extend(node.children[child_idx].children)
-                    node.children.pop(child_idx)
-                elif child_idx != len(node.children) - 1:
-                    right_sibling = node.children[child_idx + 1]
-                    right_sibling.items[:0] = node.children[child_idx].items + [node.items.pop(child_idx)]
-                    if node.children[child_idx].is_inner():
-                        right_sibling.children[:0] = node.children[child_idx].children
-                    node.children.pop(child_idx)
-                else:
-                    raise RuntimeError('Invalid BTree structure')
-
-    def _shift_left(self, node: _Node, key, root: _Node, item_idx: int):
-        if node.children:
-            self._shift_left(node.children[-1], key, root, item_idx)
-            self._fix_missing(node, len(node.children) - 1)
+        child = node.children[child_idx]
+        if len(child.keys) >= self._get_min_degree():
+            return
+        if child_idx != 0 and len(node.children[child_idx - 1].keys) > self._get_min_degree():
+            left_sibling = node.children[child_idx - 1]
+            child.keys.insert(0, node.keys[child_idx - 1])
+            child.values.insert(0, node.values[child_idx - 1])
+            node.keys[child_idx - 1] = left_sibling.keys.pop()
+            node.values[child_idx - 1] = left_sibling.values.pop()
+            moved_size = 1
+            if left_sibling.is_inner():
+                child.children.insert(0, left_sibling.children.pop())
+                moved_size += child.children[0].size
+            left_sibling.size -= moved_size
+            child.size += moved_size
+        elif child_idx != len(node.children) - 1 and \
+                len(node.children[child_idx + 1].keys) > self._get_min_degree():
+            right_sibling = node.children[child_idx + 1]
+            child.keys.append(node.keys[child_idx])
+            child.values.append(node.values[child_idx])
+            node.keys[child_idx] = right_sibling.keys.pop(0)
+            node.values[child_idx] = right_sibling.values.pop(0)
+            moved_size = 1
+            if right_sibling.is_inner():
+                child.children.append(right_sibling.children.pop(0))
+                moved_size += child.children[-1].size
+            right_sibling.size -= moved_size
+            child.size += moved_size
+        elif child_idx != 0:
+            self._merge(node, child_idx - 1)
+        elif child_idx != len(node.children) - 1:
+            self._merge(node, child_idx)
         else:
-            root.items[item_idx] = node.items.pop(-1)
+            raise RuntimeError('Invalid BTree structure')
 
-    def _shift_right(self, node: _Node, key, root: _Node, item_idx: int):
+    def _pop_max(self, node: _Node) -> Tuple[Any, Any]:
+        node.size -= 1
         if node.children:
-            self._shift_right(node.children[0], key, root, item_idx)
-            self._fix_missing(node, 0)
-        else:
-            root.items[item_idx] = node.items.pop(0)
+            item = self._pop_max(node.children[-1])
+            self._fix_missing(node, len(node.children) - 1)
+            return item
+        return node.keys.pop(), node.values.pop()
 
     def _delete(self, node: _Node, key):
-        child_idx = 0
-        while child_idx < len(node.items) and node.items[child_idx].key < key:
-            child_idx += 1
-
-        if child_idx < len(node.items) and node.items[child_idx].key == key:
-            if node.children:
-                if key > node.children[child_idx].items[-1].key:
-                    self._shift_left(node.children[child_idx], key, node, child_idx)
-                elif key < node.children[child_idx + 1].items[0].key:
-                    self._shift_right(node.children[child_idx + 1], key, node, child_idx)
-                    child_idx += 1
-                else:
-                    raise RuntimeError('Invalid BTree structure')
-            else:
-                node.items.pop(child_idx)
+        child_idx = bisect_left(node.keys, key)
+
+        if child_idx < len(node.keys) and node.keys[child_idx] == key:
+            if not node.children:
+                del node.keys[child_idx], node.values[child_idx]
+                node.size -= 1
                 return
+            # Replace the deleted item with its in-order predecessor
+            node.keys[child_idx], node.values[child_idx] = self._pop_max(node.children[child_idx])
         else:
             if not node.children:
                 raise KeyError(key)
 
             self._delete(node.children[child_idx], key)
 
+        node.size -= 1
         self._fix_missing(node, child_idx)
 
     def delete(self, key):
+        if self._root is None:
+            raise KeyError(key)
+
         self._delete(self._root, key)
 
-        if not self._root.items:
+        if not self._root.keys:
             if self._root.children:
                 self._root = self._root.children[0]
             else:
@@ -6,6 +6,12 @@ class BuiltinTree(AbstractTree):
     def __init__(self):
         self.dict = {}
 
+    @classmethod
+    def bulk_load(cls, items):
+        tree = cls()
+        tree.dict = dict(cls._check_sorted(items))
+        return tree
+
     def insert(self, key, value):
         self.dict[key] = value
 
@@ -15,8 +21,50 @@ class BuiltinTree(AbstractTree):
     def contains(self, key) -> bool:
         return key in self.dict
 
+    def get_or_default(self, key, default=None):
+        return self.dict.get(key, default)
+
+    def depth(self, key) -> int:  # pylint: disable=unused-argument
+        # A dictionary finds any key with a single hash table probe
+        return 1 if self.dict else 0
+
     def delete(self, key):
         del self.dict[key]
 
+    def __len__(self):
+        return len(self.dict)
+
     def __iter__(self):
         return map(tuple, sorted(self.dict.items()))
+
+    def __reversed__(self):
+        return map(tuple, sorted(self.dict.items(), reverse=True))
+
+    def range(self, lo=None, hi=None, inclusive=(True, True)):
+        keys = sorted(key for key in self.dict
+                      if self._above_lower(key, lo, inclusive[0]) and self._below_upper(key, hi, inclusive[1]))
+        return ((key, self.dict[key]) for key in keys)
+
+    def floor(self, key):
+        result = max((item for item in self.dict if item <= key), default=None)
+        if result is None:
+            raise KeyError(key)
+        return result, self.dict[result]
+
+    def ceiling(self, key):
+        result = min((item for item in self.dict if item >= key), default=None)
+        if result is None:
+            raise KeyError(key)
+        return result, self.dict[result]
+
+    def min(self):
+        if not self.dict:
+            raise KeyError('Tree is empty')
+        key = min(self.dict)
+        return key, self.dict[key]
+
+    def max(self):
+        if not self.dict:
+            raise KeyError('Tree is empty')
+        key = max(self.dict)
+        return key, self.dict[key]
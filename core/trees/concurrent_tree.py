@@ -0,0 +1,190 @@
+from threading import Condition, Lock
+from typing import Optional, Type
+
+from core.trees.abstract_tree import AbstractTree
+from core.trees.avl_tree import AVLTree
+
+
+class _Guard:
+    """Context manager calling the given acquire and release functions"""
+    __slots__ = ('_acquire', '_release')
+
+    def __init__(self, acquire, release):
+        self._acquire = acquire
+        self._release = release
+
+    def __enter__(self):
+        self._acquire()
+
+    def __exit__(self, *exc_info):
+        self._release()
+
+
+class RWLock:
+    """
+    Reader-writer lock, any number of readers or a single writer
+    Waiting writers block new readers, so a stream of readers can not starve them
+    The lock is not reentrant
+    """
+
+    def __init__(self):
+        self._condition = Condition(Lock())
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+        self._read_guard = _Guard(self.acquire_read, self.release_read)
+        self._write_guard = _Guard(self.acquire_write, self.release_write)
+
+    def acquire_read(self):
+        with self._condition:
+            while self._writer or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._condition:
+            self._readers -= 1
+            if not self._readers and self._waiting_writers:
+                self._condition.notify_all()
+
+    def acquire_write(self):
+        with self._condition:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._condition.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+
+    def release_write(self):
+        with self._condition:
+            self._writer = False
+            self._condition.notify_all()
+
+    def read(self):
+        """Returns a context manager holding the lock shared"""
+        return self._read_guard
+
+    def write(self):
+        """Returns a context manager holding the lock exclusively"""
+        return self._write_guard
+
+
+class ConcurrentTree(AbstractTree):
+    """
+    Thread-safe wrapper that guards any tree with a reader-writer lock
+    Lookups share the lock unless the wrapped tree restructures itself on reads
+    Iteration and range copy the matching pairs under the lock, so the caller
+    gets a consistent result and may write to the tree while consuming it
+    Use ConcurrentTree.wrap(tree_type, ...) to get a tree type for Database and Table
+    """
+    tree_type: Type = AVLTree
+    tree_args = ()
+    tree_kwargs = {}
+
+    def __init__(self, tree: Optional[AbstractTree] = None):
+        self._tree = self.tree_type(*self.tree_args, **self.tree_kwargs) if tree is None else tree
+        self._lock = RWLock()
+
+    @classmethod
+    def wrap(cls, tree_type: Type, *args, **kwargs) -> Type:
+        """
+        Returns a thread-safe tree type that creates tree_type(*args, **kwargs) inside
+        :param tree_type:
+        :return:
+        """
+        return type(f'Concurrent{tree_type.__name__}', (cls,),
+                    {'tree_type': tree_type, 'tree_args': args, 'tree_kwargs': kwargs})
+
+    @classmethod
+    def bulk_load(cls, items):
+        return cls(cls.tree_type.bulk_load(items, *cls.tree_args, **cls.tree_kwargs))
+
+    def _reading(self):
+        return self._lock.write() if self._tree.mutating_reads else self._lock.read()
+
+    def insert(self, key, value):
+        with self._lock.write():
+            self._tree.insert(key, value)
+
+    def delete(self, key):
+        with self._lock.write():
+            self._tree.delete(key)
+
+    def get(self, key):
+        with self._reading():
+            return self._tree.get(key)
+
+    def contains(self, key) -> bool:
+        with self._reading():
+            return self._tree.contains(key)
+
+    def get_or_default(self, key, default=None):
+        with self._reading():
+            return self._tree.get_or_default(key, default)
+
+    def get_many(self, keys, default=None):
+        with self._reading():
+            return self._tree.get_many(keys, default)
+
+    def contains_many(self, keys):
+        with self._reading():
+            return self._tree.contains_many(keys)
+
+    def __iter__(self):
+        with self._reading():
+            items = list(self._tree)
+        return iter(items)
+
+    def __reversed__(self):
+        with self._reading():
+            items = list(reversed(self._tree))
+        return iter(items)
+
+    def __len__(self):
+        with self._reading():
+            return len(self._tree)
+
+    def range(self, lo=None, hi=None, inclusive=(True, True)):
+        with self._reading():
+            items = list(self._tree.range(lo, hi, inclusive))
+        return iter(items)
+
+    def floor(self, key):
+        with self._reading():
+            return self._tree.floor(key)
+
+    def ceiling(self, key):
+        with self._reading():
+            return self._tree.ceiling(key)
+
+    def min(self):
+        with self._reading():
+            return self._tree.min()
+
+    def max(self):
+        with self._reading():
+            return self._tree.max()
+
+    def rank(self, key) -> int:
+        with self._reading():
+            return self._tree.rank(key)
+
+    def select(self, index: int):
+        with self._reading():
+            return self._tree.select(index)
+
+    def count_range(self, lo=None, hi=None, inclusive=(True, True)) -> int:
+        with self._reading():
+            return self._tree.count_range(lo, hi, inclusive)
+
+    def depth(self, key) -> int:
+        with self._reading():
+            return self._tree.depth(key)
+
+    def height(self) -> int:
+        with self._reading():
+            return self._tree.height()
+
+    def snapshot(self):
+        with self._reading():
+            return type(self)(self._tree.snapshot())
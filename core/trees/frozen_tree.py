@@ -0,0 +1,140 @@
+"""
+Read-only tree over sorted key and value arrays
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import List
+
+from core.trees.abstract_tree import AbstractTree
+
+_INT64 = 2 ** 63
+
+
+def _key_array(keys: List):
+    """Packs int or float keys into a typed array of machine values, other keys stay in the list"""
+    if keys and all(type(key) is int for key in keys):  # pylint: disable=unidiomatic-typecheck
+        if -_INT64 <= keys[0] and keys[-1] < _INT64:
+            return array('q', keys)
+    if keys and all(type(key) is float for key in keys):  # pylint: disable=unidiomatic-typecheck
+        return array('d', keys)
+    return keys
+
+
+class FrozenTree(AbstractTree):
+    """
+    Immutable tree keeping keys and values in two sorted arrays, see AbstractTree.freeze
+    Keys are found by binary search in C instead of by following node pointers,
+    int and float keys are packed into typed arrays, 8 bytes per key instead of a pointer and an object
+    get_many and contains_many search the sorted distinct keys left to right, each search starting where
+    the previous one ended
+    """
+
+    def __init__(self, items=()):
+        pairs = list(self._check_sorted(items))
+        self._keys = _key_array([key for key, _ in pairs])
+        self._values = [value for _, value in pairs]
+
+    @classmethod
+    def bulk_load(cls, items):
+        return cls(items)
+
+    def freeze(self):
+        return self
+
+    def snapshot(self):
+        return self
+
+    def insert(self, key, value):
+        raise NotImplementedError(f'{type(self).__name__} is read-only')
+
+    def delete(self, key):
+        raise NotImplementedError(f'{type(self).__name__} is read-only')
+
+    def _index(self, key) -> int:
+        """Returns the position of key or -1"""
+        idx = bisect_left(self._keys, key)
+        return idx if idx < len(self._keys) and self._keys[idx] == key else -1
+
+    def get(self, key):
+        idx = self._index(key)
+        if idx < 0:
+            raise KeyError(key)
+        return self._values[idx]
+
+    def contains(self, key) -> bool:
+        return self._index(key) >= 0
+
+    def get_or_default(self, key, default=None):
+        idx = self._index(key)
+        return default if idx < 0 else self._values[idx]
+
+    def _find_many(self, keys: List):
+        """Searches the sorted keys left to right, every search starts where the previous one ended"""
+        found = {}
+        low = 0
+        for key in keys:
+            low = bisect_left(self._keys, key, low)
+            if low == len(self._keys):
+                break
+            if self._keys[low] == key:
+                found[key] = self._values[low]
+        return found
+
+    def __len__(self):
+        return len(self._values)
+
+    def __iter__(self):
+        return zip(self._keys, self._values)
+
+    def __reversed__(self):
+        return zip(reversed(self._keys), reversed(self._values))
+
+    def _bounds(self, lo, hi, inclusive):
+        """Returns start and end positions of keys between lo and hi"""
+        start = 0 if lo is None else (bisect_left if inclusive[0] else bisect_right)(self._keys, lo)
+        end = len(self._keys) if hi is None else (bisect_right if inclusive[1] else bisect_left)(self._keys, hi)
+        return start, max(start, end)
+
+    def range(self, lo=None, hi=None, inclusive=(True, True)):
+        start, end = self._bounds(lo, hi, inclusive)
+        return zip(self._keys[start:end], self._values[start:end])
+
+    def count_range(self, lo=None, hi=None, inclusive=(True, True)) -> int:
+        start, end = self._bounds(lo, hi, inclusive)
+        return end - start
+
+    def _rank(self, key, inclusive: bool) -> int:
+        return (bisect_right if inclusive else bisect_left)(self._keys, key)
+
+    def select(self, index: int):
+        index = self._check_index(index)
+        return self._keys[index], self._values[index]
+
+    def floor(self, key):
+        idx = bisect_right(self._keys, key)
+        if not idx:
+            raise KeyError(key)
+        return self._keys[idx - 1], self._values[idx - 1]
+
+    def ceiling(self, key):
+        idx = bisect_left(self._keys, key)
+        if idx == len(self._keys):
+            raise KeyError(key)
+        return self._keys[idx], self._values[idx]
+
+    def min(self):
+        if not self._values:
+            raise KeyError('Tree is empty')
+        return self._keys[0], self._values[0]
+
+    def max(self):
+        if not self._values:
+            raise KeyError('Tree is empty')
+        return self._keys[-1], self._values[-1]
+
+    def depth(self, key) -> int:  # pylint: disable=unused-argument
+        """Returns the number of probes of a binary search"""
+        return len(self._keys).bit_length()
+
+    def height(self) -> int:
+        return len(self._keys).bit_length()
@@ -0,0 +1,246 @@
+from collections import Counter
+from dataclasses import dataclass, field, fields
+from functools import wraps
+from typing import Dict, Type
+
+from core.trees.abstract_tree import AbstractTree
+from core.trees.avl_tree import AVLTree
+
+
+@dataclass
+class TreeStats:
+    """Counters collected by InstrumentedTree"""
+    operations: int = 0
+    comparisons: int = 0
+    rotations: int = 0
+    splits: int = 0
+    merges: int = 0
+    # Estimated by a separate depth probe before every keyed operation, see InstrumentedTree._search
+    nodes_visited: int = 0
+    # Number of searches by the number of nodes they visited, estimated the same way
+    depths: Counter = field(default_factory=Counter)
+
+    def reset(self):
+        for item in fields(self):
+            setattr(self, item.name, Counter() if item.name == 'depths' else 0)
+
+    def as_dict(self) -> Dict:
+        result = {item.name: getattr(self, item.name) for item in fields(self) if item.name != 'depths'}
+        searches = sum(self.depths.values())
+        result['mean_depth'] = sum(depth * count for depth, count in self.depths.items()) / searches if searches else 0
+        result['max_depth'] = max(self.depths, default=0)
+        return result
+
+
+def _unwrap(key):
+    return key.key if isinstance(key, _CountedKey) else key
+
+
+class _CountedKey:
+    """Key wrapper counting every comparison it takes part in"""
+    __slots__ = ('key', 'stats')
+
+    def __init__(self, key, stats: TreeStats):
+        self.key = key
+        self.stats = stats
+
+    def __lt__(self, other):
+        self.stats.comparisons += 1
+        return self.key < _unwrap(other)
+
+    def __le__(self, other):
+        self.stats.comparisons += 1
+        return self.key <= _unwrap(other)
+
+    def __gt__(self, other):
+        self.stats.comparisons += 1
+        return self.key > _unwrap(other)
+
+    def __ge__(self, other):
+        self.stats.comparisons += 1
+        return self.key >= _unwrap(other)
+
+    def __eq__(self, other):
+        self.stats.comparisons += 1
+        return self.key == _unwrap(other)
+
+    def __ne__(self, other):
+        self.stats.comparisons += 1
+        return self.key != _unwrap(other)
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return repr(self.key)
+
+
+def _counting_methods(owner: Type, events: Dict, stats: TreeStats) -> Dict:
+    """Returns overrides of the event methods of owner that count their calls in stats"""
+    def counting(method, event):
+        @wraps(method)
+        def counted(*args, **kwargs):
+            setattr(stats, event, getattr(stats, event) + 1)
+            return method(*args, **kwargs)
+        return counted
+
+    attributes = {'__slots__': ()}
+    for event, names in events.items():
+        for name in names:
+            attributes[name] = counting(getattr(owner, name), event)
+    return attributes
+
+
+class InstrumentedTree(AbstractTree):
+    """
+    Tree wrapper counting key comparisons, structural events and nodes visited by searches
+    Comparisons are counted by wrapping the stored and probe keys, rotations, splits and merges
+    by a subclass of the wrapped tree built for every instance, so the tree types themselves
+    do not pay anything for instrumentation
+    Nodes visited are not counted inside the operations, every keyed operation is preceded by a separate
+    depth(key) descent, so they are an estimate and an instrumented tree takes about two searches per
+    operation, time the plain tree type instead
+    Use InstrumentedTree.wrap(tree_type, ...) to get a tree type for Database and Table
+    """
+    tree_type: Type = AVLTree
+    tree_args = ()
+    tree_kwargs = {}
+
+    def __init__(self):
+        self.stats = TreeStats()
+        self._tree = self._counting_type()(*self.tree_args, **self.tree_kwargs)
+
+    @classmethod
+    def wrap(cls, tree_type: Type, *args, **kwargs) -> Type:
+        """
+        Returns an instrumented tree type that creates tree_type(*args, **kwargs) inside
+        :param tree_type:
+        :return:
+        """
+        return type(f'Instrumented{tree_type.__name__}', (cls,),
+                    {'tree_type': tree_type, 'tree_args': args, 'tree_kwargs': kwargs})
+
+    def _counting_type(self) -> Type:
+        """Returns a subclass of tree_type counting its structural events in self.stats"""
+        attributes = _counting_methods(self.tree_type, self.tree_type.instrumented_events, self.stats)
+        node_events = getattr(self.tree_type, 'instrumented_node_events', None)
+        if node_events:
+            node_type = self.tree_type.node_type
+            attributes['node_type'] = type(node_type.__name__, (node_type,),
+                                           _counting_methods(node_type, node_events, self.stats))
+        return type(self.tree_type.__name__, (self.tree_type,), attributes)
+
+    @classmethod
+    def bulk_load(cls, items):
+        tree = cls()
+        items = ((tree._wrap(key), value) for key, value in items)
+        tree._tree = type(tree._tree).bulk_load(items, *cls.tree_args, **cls.tree_kwargs)
+        return tree
+
+    def _wrap(self, key):
+        return _CountedKey(key, self.stats) if self.tree_type.compares_keys else key
+
+    def _search(self, key):
+        """
+        Wraps key and records the number of nodes a search for it visits, measured by an extra descent
+        with depth before the operation runs, e.g. an insert records the depth before the key is added
+        """
+        probe = self._wrap(key)
+        depth = self.depth(key)
+        self.stats.operations += 1
+        self.stats.nodes_visited += depth
+        self.stats.depths[depth] += 1
+        return probe
+
+    def report(self) -> Dict:
+        """Returns all counters together with the current height of the tree and its tombstone ratio if it has one"""
+        report = self.stats.as_dict() | {'height': self.height()}
+        if hasattr(self._tree, 'tombstone_ratio'):
+            report['tombstone_ratio'] = self._tree.tombstone_ratio
+        return report
+
+    def insert(self, key, value):
+        self._tree.insert(self._search(key), value)
+
+    def delete(self, key):
+        self._tree.delete(self._search(key))
+
+    def get(self, key):
+        return self._tree.get(self._search(key))
+
+    def contains(self, key) -> bool:
+        return self._tree.contains(self._search(key))
+
+    def get_or_default(self, key, default=None):
+        return self._tree.get_or_default(self._search(key), default)
+
+    def get_many(self, keys, default=None):
+        self.stats.operations += 1
+        return self._tree.get_many(map(self._wrap, keys), default)
+
+    def contains_many(self, keys):
+        self.stats.operations += 1
+        return self._tree.contains_many(map(self._wrap, keys))
+
+    def __iter__(self):
+        self.stats.operations += 1
+        return ((_unwrap(key), value) for key, value in self._tree)
+
+    def __reversed__(self):
+        self.stats.operations += 1
+        return ((_unwrap(key), value) for key, value in reversed(self._tree))
+
+    def __len__(self):
+        return len(self._tree)
+
+    def range(self, lo=None, hi=None, inclusive=(True, True)):
+        self.stats.operations += 1
+        lo = None if lo is None else self._wrap(lo)
+        hi = None if hi is None else self._wrap(hi)
+        return ((_unwrap(key), value) for key, value in self._tree.range(lo, hi, inclusive))
+
+    def floor(self, key):
+        key, value = self._tree.floor(self._search(key))
+        return _unwrap(key), value
+
+    def ceiling(self, key):
+        key, value = self._tree.ceiling(self._search(key))
+        return _unwrap(key), value
+
+    def min(self):
+        self.stats.operations += 1
+        key, value = self._tree.min()
+        return _unwrap(key), value
+
+    def max(self):
+        self.stats.operations += 1
+        key, value = self._tree.max()
+        return _unwrap(key), value
+
+    def rank(self, key) -> int:
+        self.stats.operations += 1
+        return self._tree.rank(self._wrap(key))
+
+    def select(self, index: int):
+        self.stats.operations += 1
+        key, value = self._tree.select(index)
+        return _unwrap(key), value
+
+    def count_range(self, lo=None, hi=None, inclusive=(True, True)) -> int:
+        self.stats.operations += 1
+        lo = None if lo is None else self._wrap(lo)
+        hi = None if hi is None else self._wrap(hi)
+        return self._tree.count_range(lo, hi, inclusive)
+
+    def depth(self, key) -> int:
+        """Measuring depth does not count as comparisons"""
+        comparisons = self.stats.comparisons
+        depth = self._tree.depth(self._wrap(key))
+        self.stats.comparisons = comparisons
+        return depth
+
+    def height(self) -> int:
+        comparisons = self.stats.comparisons
+        height = self._tree.height()
+        self.stats.comparisons = comparisons
+        return height
@@ -0,0 +1,314 @@
+"""
+Join-based operations on balanced binary trees
+"""
+from abc import abstractmethod
+from concurrent.futures import Executor
+from typing import List, Optional
+
+from core.trees.abstract_tree import AbstractTree
+
+# Subtrees are handed to an executor only when both operands have at least this many keys
+PARALLEL_THRESHOLD = 20000
+# Trees whose sizes differ less than this many times are merged pair by pair and rebuilt in O(n + m),
+# which is within O(m log(n/m + 1)) for such sizes and has much smaller constants than joins
+LINEAR_MERGE_RATIO = 16
+
+
+def _apply_in_worker(tree_type, operation: str, ours, theirs):
+    """Runs a set operation on pairs sent to a worker process and returns the resulting pairs"""
+    tree = tree_type.bulk_load(ours)
+    getattr(tree, operation)(tree_type.bulk_load(theirs))
+    return list(tree)
+
+
+def _merge(operation: str, ours: List, theirs: List):
+    """Yields the pairs of the result of a set operation on two lists of pairs sorted by key"""
+    idx = other_idx = 0
+    while idx < len(ours) and other_idx < len(theirs):
+        key, other_key = ours[idx][0], theirs[other_idx][0]
+        if key < other_key:
+            if operation != 'intersection':
+                yield ours[idx]
+            idx += 1
+        elif other_key < key:
+            if operation == 'union':
+                yield theirs[other_idx]
+            other_idx += 1
+        else:
+            if operation == 'union':
+                yield theirs[other_idx]
+            elif operation == 'intersection':
+                yield ours[idx]
+            idx += 1
+            other_idx += 1
+    if operation != 'intersection':
+        yield from ours[idx:]
+    if operation == 'union':
+        yield from theirs[other_idx:]
+
+
+class JoinableTree(AbstractTree):
+    """
+    Binary search tree whose set operations are built on join, following "Just Join for Parallel Ordered Sets"
+    Joining two trees around a middle node costs time proportional to the difference of their heights,
+    so split and delete_range take O(log n), and union, intersection and difference of trees with
+    n and m <= n keys take O(m log(n/m + 1)) instead of O(m log n) for m single key operations
+    Subclasses describe subtrees with handles and implement the primitives below for them
+    """
+    parallel_threshold = PARALLEL_THRESHOLD
+    # Whether nodes never change once linked, so that trees may share them
+    immutable_nodes = False
+
+    @abstractmethod
+    def _root_subtree(self):
+        """Returns the handle of the whole tree"""
+
+    @abstractmethod
+    def _set_root(self, subtree):
+        """Makes the subtree the whole tree"""
+
+    @abstractmethod
+    def _empty(self):
+        """Returns the handle of an empty subtree"""
+
+    @abstractmethod
+    def _size_of(self, subtree) -> int:
+        """Returns the number of keys in the subtree"""
+
+    @abstractmethod
+    def _expose(self, subtree):
+        """Returns (left, node, right) of a non-empty subtree without changing it"""
+
+    @abstractmethod
+    def _join(self, left, node, right):
+        """
+        Returns a balanced subtree of the keys of left, the node and the keys of right,
+        all keys of left are less than the key of node and all keys of right are greater
+        The subtrees and the node may be reused
+        """
+
+    @abstractmethod
+    def _new_node(self, key, value):
+        """Returns a node to be passed to _join"""
+
+    @abstractmethod
+    def _pair(self, node):
+        """Returns the key-value pair of the node"""
+
+    def _joinable(self, other) -> bool:
+        """Whether the nodes of other can be read and copied by the join-based operations of this tree"""
+        return isinstance(other, type(self))
+
+    @staticmethod
+    def _subtree_of(tree: 'JoinableTree'):
+        """Returns the handle of the whole other tree"""
+        return tree._root_subtree()  # pylint: disable=protected-access
+
+    def _adopt(self, tree: 'JoinableTree'):
+        """Takes over the nodes of another tree"""
+        self._set_root(self._subtree_of(tree))
+
+    def clear(self):
+        """Deletes all keys in O(1)"""
+        self._set_root(self._empty())
+
+    def _tree_of(self, subtree) -> 'JoinableTree':
+        tree = type(self)()
+        tree._set_root(subtree)  # pylint: disable=protected-access
+        return tree
+
+    def _split(self, subtree, key):
+        """Returns (left, node, right), the subtrees of keys less and greater than key and the node of key or None"""
+        if not self._size_of(subtree):
+            return subtree, None, subtree
+        left, node, right = self._expose(subtree)
+        node_key = self._pair(node)[0]
+        if key < node_key:
+            left_left, found, left_right = self._split(left, key)
+            return left_left, found, self._join(left_right, node, right)
+        if key > node_key:
+            right_left, found, right_right = self._split(right, key)
+            return self._join(left, node, right_left), found, right_right
+        return left, node, right
+
+    def _split_last(self, subtree):
+        """Returns the non-empty subtree without its greatest node and that node"""
+        left, node, right = self._expose(subtree)
+        if not self._size_of(right):
+            return left, node
+        rest, last = self._split_last(right)
+        return self._join(left, node, rest), last
+
+    def _join2(self, left, right):
+        """Joins two subtrees without a middle node"""
+        if not self._size_of(left):
+            return right
+        rest, last = self._split_last(left)
+        return self._join(rest, last, right)
+
+    def _copy(self, subtree):
+        """Returns a copy of the subtree built from new nodes"""
+        if not self._size_of(subtree):
+            return self._empty()
+        left, node, right = self._expose(subtree)
+        return self._join(self._copy(left), self._new_node(*self._pair(node)), self._copy(right))
+
+    def _pairs(self, subtree):
+        """Returns key-value pairs of the subtree in ascending order"""
+        pairs, stack = [], []
+        while stack or self._size_of(subtree):
+            while self._size_of(subtree):
+                left, node, right = self._expose(subtree)
+                stack.append((node, right))
+                subtree = left
+            node, subtree = stack.pop()
+            pairs.append(self._pair(node))
+        return pairs
+
+    def _halves(self, operation: str, lefts, rights, copy, executor: Optional[Executor]):
+        """
+        Applies the operation to the pair of left subtrees and to the pair of right subtrees
+        The right pair goes to the executor when both of its subtrees are large, its pairs are copied there and back
+        """
+        future = None
+        if executor is not None and min(map(self._size_of, rights)) >= self.parallel_threshold:
+            future = executor.submit(_apply_in_worker, type(self), operation, *map(self._pairs, rights))
+        method = getattr(self, '_' + operation)
+        left = method(*lefts, copy, executor)
+        if future is None:
+            return left, method(*rights, copy, executor)
+        return left, self._subtree_of(type(self).bulk_load(future.result()))
+
+    def _union(self, ours, theirs, copy, executor):
+        if not self._size_of(theirs):
+            return ours
+        if not self._size_of(ours):
+            return copy(theirs)
+        their_left, node, their_right = self._expose(theirs)
+        key, value = self._pair(node)
+        our_left, _, our_right = self._split(ours, key)
+        left, right = self._halves('union', (our_left, their_left), (our_right, their_right), copy, executor)
+        return self._join(left, self._new_node(key, value), right)
+
+    def _intersection(self, ours, theirs, copy, executor):
+        if not self._size_of(ours) or not self._size_of(theirs):
+            return self._empty()
+        their_left, node, their_right = self._expose(theirs)
+        our_left, found, our_right = self._split(ours, self._pair(node)[0])
+        left, right = self._halves('intersection', (our_left, their_left), (our_right, their_right), copy, executor)
+        return self._join2(left, right) if found is None else self._join(left, found, right)
+
+    def _difference(self, ours, theirs, copy, executor):
+        if not self._size_of(ours) or not self._size_of(theirs):
+            return ours
+        their_left, node, their_right = self._expose(theirs)
+        our_left, _, our_right = self._split(ours, self._pair(node)[0])
+        left, right = self._halves('difference', (our_left, their_left), (our_right, their_right), copy, executor)
+        return self._join2(left, right)
+
+    def _set_operation(self, operation: str, other, executor: Optional[Executor]):
+        size, other_size = len(self), len(other)
+        if min(size, other_size) * LINEAR_MERGE_RATIO >= max(size, other_size):
+            self._adopt(type(self).bulk_load(_merge(operation, list(self), list(other))))
+            return
+        # Subtrees of other are linked into this tree as they are only if neither tree ever changes its nodes
+        copy = (lambda subtree: subtree) if self.immutable_nodes and other.immutable_nodes else self._copy
+        method = getattr(self, '_' + operation)
+        self._set_root(method(self._root_subtree(), self._subtree_of(other), copy, executor))
+
+    def union(self, other, executor: Optional[Executor] = None):
+        """
+        Inserts the pairs of other into this tree in O(m log(n/m + 1)), values of other replace existing ones
+        Pairs of other are copied, other does not change
+        :param other: any tree, only trees of the same kind are joined, others are merged pair by pair
+        :param executor: optional process pool, large subtrees are merged in its workers
+        :return: None
+        """
+        if not self._joinable(other):
+            for key, value in other:
+                self.insert(key, value)
+        elif other is not self:
+            self._set_operation('union', other, executor)
+
+    def intersection(self, other, executor: Optional[Executor] = None):
+        """
+        Deletes the keys missing from other in O(m log(n/m + 1)), values of this tree are kept
+        :param other:
+        :param executor:
+        :return: None
+        """
+        if not self._joinable(other):
+            for key in [key for key, _ in self if not other.contains(key)]:
+                self.delete(key)
+        elif other is not self:
+            self._set_operation('intersection', other, executor)
+
+    def difference(self, other, executor: Optional[Executor] = None):
+        """
+        Deletes the keys of other in O(m log(n/m + 1))
+        :param other:
+        :param executor:
+        :return: None
+        """
+        if not self._joinable(other):
+            for key in [key for key, _ in other if self.contains(key)]:
+                self.delete(key)
+        elif other is self:
+            self.clear()
+        else:
+            self._set_operation('difference', other, executor)
+
+    def delete_range(self, lo=None, hi=None, inclusive=(True, True)) -> int:
+        """
+        Deletes the keys between lo and hi with two splits and one join in O(log n)
+        Takes the same arguments as range
+        :return: number of deleted keys
+        """
+        size = len(self)
+        middle, left, right = self._root_subtree(), self._empty(), self._empty()
+        if lo is not None:
+            left, found, middle = self._split(middle, lo)
+            if found is not None:
+                if inclusive[0]:
+                    # Deleted by the second split unless hi is below it
+                    middle = self._join(self._empty(), found, middle)
+                else:
+                    left = self._join(left, found, self._empty())
+        if hi is not None:
+            middle, found, right = self._split(middle, hi)
+            if found is not None and not inclusive[1]:
+                right = self._join(self._empty(), found, right)
+        self._set_root(self._join2(left, right))
+        return size - len(self)
+
+    def split(self, key):
+        """
+        Moves the pairs with keys less than key to one new tree and the pairs with greater keys to another
+        This tree is left empty
+        :param key:
+        :return: (left, pair, right), pair is the pair of key or None if the tree did not contain it
+        """
+        left, node, right = self._split(self._root_subtree(), key)
+        self.clear()
+        return self._tree_of(left), None if node is None else self._pair(node), self._tree_of(right)
+
+    @classmethod
+    def join(cls, left: 'JoinableTree', key, value, right: 'JoinableTree') -> 'JoinableTree':
+        """
+        Returns a tree of the pairs of left, the given pair and the pairs of right in O(|height(left) - height(right)|)
+        Keys of left should be less than key and keys of right greater, left and right are left empty
+        :param left:
+        :param key:
+        :param value:
+        :param right:
+        :return:
+        """
+        tree = cls()
+        if not tree._joinable(left) or not tree._joinable(right):
+            raise TypeError(f'Only trees of type {cls.__name__} can be joined')
+        if (len(left) and not left.max()[0] < key) or (len(right) and not key < right.min()[0]):
+            raise ValueError('Keys of left should be less than key and keys of right greater than it')
+        tree._set_root(tree._join(tree._subtree_of(left), tree._new_node(key, value), tree._subtree_of(right)))
+        left.clear()
+        right.clear()
+        return tree
@@ -0,0 +1,202 @@
+"""
+Order-preserving encoding of keys into bytes
+Comparing encoded keys as bytes gives the same order as comparing the keys themselves,
+so byte-oriented structures like RadixTree can store any key the other trees accept,
+and tables can keep composite keys as single bytes objects, see Columns
+"""
+from math import floor, isinf, isnan, modf
+from struct import Struct, pack, unpack
+from typing import Callable, List, Type
+
+# Ends tuples
+TERMINATOR = 0x00
+# Ends str and bytes, sorts before an escaped zero byte and before any other byte of the data
+STRING_END = b'\x00\x01'
+NEGATIVE_INFINITY = 0x01
+NUMBER = 0x02
+POSITIVE_INFINITY = 0x03
+STRING = 0x04
+BYTES = 0x05
+TUPLE = 0x06
+# Follows the integer part of a float, greater than any byte that can follow a complete key
+FRACTION = 0xFF
+
+# Integers take at least this many bytes, so that the common ones are packed by a single struct call
+MIN_INT_BYTES = 8
+# Integers up to this many bytes store the length in the header byte, longer ones in a byte after it
+SHORT_INT_BYTES = 126
+MAX_INT_BYTES = 255
+
+_INT_LIMIT = 256 ** MIN_INT_BYTES
+_pack_int = Struct('>BBQ').pack
+
+_TERMINATOR = bytes((TERMINATOR,))
+_STRING = bytes((STRING,))
+_BYTES = bytes((BYTES,))
+_TUPLE = bytes((TUPLE,))
+_FRACTION = bytes((FRACTION,))
+_COMPLEMENT = bytes(range(255, -1, -1))
+
+
+def _encode_int(value: int) -> bytes:
+    """Length-prefixed big-endian magnitude, negative numbers are complemented"""
+    if 0 <= value < _INT_LIMIT:
+        return _pack_int(NUMBER, 0x80 + MIN_INT_BYTES, value)
+    if -_INT_LIMIT < value < 0:
+        return _pack_int(NUMBER, 0x7f - MIN_INT_BYTES, _INT_LIMIT - 1 + value)
+    length = ((value if value >= 0 else -value).bit_length() + 7) // 8
+    if length > MAX_INT_BYTES:
+        raise ValueError(f'Integer {value} is too large to encode')
+    if value >= 0:
+        header = bytes((NUMBER, 0x80 + length)) if length <= SHORT_INT_BYTES else bytes((NUMBER, 0xff, length))
+        return header + value.to_bytes(length, 'big')
+    header = bytes((NUMBER, 0x7f - length)) if length <= SHORT_INT_BYTES else bytes((NUMBER, 0x00, 0xff - length))
+    return header + (256 ** length - 1 + value).to_bytes(length, 'big')
+
+
+def _encode_float(key: float) -> bytes:
+    if isnan(key):
+        raise ValueError('NaN can not be used as a key')
+    if isinf(key):
+        return bytes((POSITIVE_INFINITY if key > 0 else NEGATIVE_INFINITY,))
+    # modf splits the float exactly, key - floor(key) would round for small negative keys
+    fraction = modf(key)[0]
+    if not fraction:
+        return _encode_int(int(key))
+    # Big-endian IEEE bytes of positive doubles sort like the numbers, complemented they sort in reverse,
+    # as a larger negative key has a smaller fraction magnitude above the same floor
+    data = pack('>d', abs(fraction))
+    return _encode_int(floor(key)) + _FRACTION + (data if fraction > 0 else data.translate(_COMPLEMENT))
+
+
+def _encode_number(key) -> bytes:
+    # Keys equal in Python get equal encodings: False, 0 and 0.0 are all encoded as the integer 0
+    return _encode_int(key) if isinstance(key, int) else _encode_float(key)
+
+
+def _encode_str(key: str, end: bytes = STRING_END) -> bytes:
+    # Zero bytes are escaped, so that STRING_END can not appear inside the data
+    return _STRING + key.encode('utf-8', 'surrogatepass').replace(b'\x00', b'\x00\xff') + end
+
+
+def _encode_bytes(key: bytes, end: bytes = STRING_END) -> bytes:
+    return _BYTES + bytes(key).replace(b'\x00', b'\x00\xff') + end
+
+
+def _encode_tuple(key: tuple, end: bytes = _TERMINATOR) -> bytes:
+    return _TUPLE + b''.join(map(_encode, key)) + end
+
+
+_ENCODERS = {bool: _encode_number, int: _encode_number, float: _encode_number, str: _encode_str,
+             bytes: _encode_bytes, bytearray: _encode_bytes, tuple: _encode_tuple}
+
+
+def _encoder(key_type: Type) -> Callable:
+    encoder = _ENCODERS.get(key_type)
+    if encoder is None:
+        for base, base_encoder in _ENCODERS.items():
+            if issubclass(key_type, base):
+                return base_encoder
+        raise TypeError(f'Unsupported key type {key_type.__name__}')
+    return encoder
+
+
+def _encode(key) -> bytes:
+    return _encoder(type(key))(key)
+
+
+def encode_key(key) -> bytes:
+    """
+    Encodes bool, int, float, str, bytes or a tuple of them
+    All numbers share one order, other types are ordered by type
+    :param key:
+    :return:
+    """
+    return _encode(key)
+
+
+def encode_prefix(prefix) -> bytes:
+    """
+    Encodes a prefix of keys: the encoding of every str starting with the given str,
+    or of every tuple starting with the items of the given tuple, starts with the result
+    :param prefix:
+    :return:
+    """
+    encoder = _encoder(type(prefix))
+    if encoder in (_encode_str, _encode_bytes, _encode_tuple):
+        return encoder(prefix, b'')
+    return encoder(prefix)
+
+
+def tuple_encoder(item_types: List[Type]) -> Callable[[tuple], bytes]:
+    """
+    Returns a function equivalent to encode_key for tuples whose items have the given types,
+    it looks up the item encoders once instead of for every key
+    :param item_types:
+    :return:
+    """
+    encoders = [_encoder(item_type) for item_type in item_types]
+
+    def encode(key: tuple) -> bytes:
+        try:
+            return _TUPLE + b''.join([encoder(item) for encoder, item in zip(encoders, key)]) + _TERMINATOR
+        except (AttributeError, TypeError):
+            # An item of another type, e.g. an int compared with a str column
+            return _encode(key)
+    return encode
+
+
+def _decode_int(data: bytes, pos: int):
+    header = data[pos]
+    negative = header < 0x80
+    if header in (0x00, 0xff):
+        pos += 1
+        length = 0xff - data[pos] if negative else data[pos]
+    else:
+        length = 0x7f - header if negative else header - 0x80
+    start, pos = pos + 1, pos + 1 + length
+    magnitude = int.from_bytes(data[start:pos], 'big')
+    return (magnitude + 1 - 256 ** length if negative else magnitude), pos
+
+
+def _decode(data: bytes, pos: int):
+    """Returns the key encoded at pos and the position after it"""
+    tag = data[pos]
+    pos += 1
+    if tag == NUMBER:
+        integer, pos = _decode_int(data, pos)
+        if pos == len(data) or data[pos] != FRACTION:
+            return integer, pos
+        encoded = data[pos + 1:pos + 9]
+        if integer >= 0:
+            return integer + unpack('>d', encoded)[0], pos + 9
+        # Subtracting from the ceiling is exact, the result is the float that was encoded
+        return (integer + 1) - unpack('>d', encoded.translate(_COMPLEMENT))[0], pos + 9
+    if tag == NEGATIVE_INFINITY:
+        return float('-inf'), pos
+    if tag == POSITIVE_INFINITY:
+        return float('inf'), pos
+    if tag in (STRING, BYTES):
+        end = data.index(STRING_END, pos)
+        raw = data[pos:end].replace(b'\x00\xff', b'\x00')
+        return (raw.decode('utf-8', 'surrogatepass') if tag == STRING else raw), end + len(STRING_END)
+    if tag == TUPLE:
+        items = []
+        while data[pos] != TERMINATOR:
+            item, pos = _decode(data, pos)
+            items.append(item)
+        return tuple(items), pos + 1
+    raise ValueError(f'Unknown key tag {tag}')
+
+
+def decode_key(data: bytes):
+    """
+    Decodes the result of encode_key
+    Integral floats and bools come back as int, since they share the encoding of the equal int
+    :param data:
+    :return:
+    """
+    key, pos = _decode(data, 0)
+    if pos != len(data):
+        raise ValueError('Trailing bytes after the encoded key')
+    return key
@@ -0,0 +1,98 @@
+"""
+Persistent AVL Tree
+"""
+from core.trees.avl_tree import AVLNode, AVLTree
+
+
+class PersistentAVLTree(AVLTree):
+    """
+    AVL tree with path copying
+    Nodes are never changed after they are linked into the tree, every write
+    builds new nodes along the search path and shares the rest with the previous version
+    """
+    instrumented_events = {'rotations': ('_rotated_left', '_rotated_right')}
+    immutable_nodes = True
+
+    def __init__(self, root: AVLNode = None):
+        """Init, optionally sharing nodes of another version"""
+        super().__init__()
+        self._root = root
+
+    def snapshot(self):
+        """Returns a tree sharing the current version of the nodes in O(1)"""
+        return type(self)(self._root)
+
+    def insert(self, key, val):
+        """Insert"""
+        def insert_helper(root: AVLNode):
+            """Returns a new subtree with the key inserted"""
+            if root is None:
+                return AVLNode(key, val)
+            if key < root.key:
+                return self._rebalance(root.key, root.val, insert_helper(root.left), root.right)
+            if key > root.key:
+                return self._rebalance(root.key, root.val, root.left, insert_helper(root.right))
+            return self._make_node(key, val, root.left, root.right)
+        self._root = insert_helper(self._root)
+
+    def delete(self, key):
+        """Delete"""
+        def delete_helper(root: AVLNode):
+            """Returns a new subtree without the key, or the same subtree if key is missing"""
+            if root is None:
+                return root
+            if key < root.key:
+                left = delete_helper(root.left)
+                if left is root.left:
+                    return root
+                return self._rebalance(root.key, root.val, left, root.right)
+            if key > root.key:
+                right = delete_helper(root.right)
+                if right is root.right:
+                    return root
+                return self._rebalance(root.key, root.val, root.left, right)
+            if root.left is None:
+                return root.right
+            if root.right is None:
+                return root.left
+            successor, right = self._pop_min(root.right)
+            return self._rebalance(successor.key, successor.val, root.left, right)
+        self._root = delete_helper(self._root)
+
+    def _pop_min(self, root: AVLNode):
+        """Returns the minimal node and a new subtree without it"""
+        if root.left is None:
+            return root, root.right
+        minimal, left = self._pop_min(root.left)
+        return minimal, self._rebalance(root.key, root.val, left, root.right)
+
+    def _make_node(self, key, val, left, right):
+        """Creates a node with height and size computed from children"""
+        node = AVLNode(key, val, left, right)
+        node.height = 1 + max(self.n_height(left), self.n_height(right))
+        node.size = 1 + self.n_size(left) + self.n_size(right)
+        return node
+
+    def _node(self, node: AVLNode, left, right) -> AVLNode:
+        """Join-based operations create a new node instead of relinking the given one"""
+        return self._make_node(node.key, node.val, left, right)
+
+    def _rebalance(self, key, val, left, right):
+        """Creates a balanced subtree, rotating new copies instead of existing nodes"""
+        if self.n_height(left) > self.n_height(right) + 1:
+            if self.n_height(left.left) < self.n_height(left.right):
+                left = self._rotated_left(left.key, left.val, left.left, left.right)
+            return self._rotated_right(key, val, left, right)
+        if self.n_height(right) > self.n_height(left) + 1:
+            if self.n_height(right.right) < self.n_height(right.left):
+                right = self._rotated_right(right.key, right.val, right.left, right.right)
+            return self._rotated_left(key, val, left, right)
+        return self._make_node(key, val, left, right)
+
+    def _rotated_left(self, key, val, left, right):
+        """Creates the left rotation of a node with the given contents, right child is copied"""
+        return self._make_node(right.key, right.val, self._make_node(key, val, left, right.left), right.right)
+
+    def _rotated_right(self, key, val, left, right):
+        """Creates the right rotation of a node with the given contents, left child is copied"""
+        return self._make_node(left.key, left.val, left.left, self._make_node(key, val, left.right, right))
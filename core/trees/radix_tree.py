@@ -0,0 +1,359 @@
+"""
+Adaptive Radix Tree
+"""
+from bisect import bisect_left
+
+from core.trees.abstract_tree import AbstractTree
+from core.trees.key_codec import encode_key, encode_prefix
+
+# A node switches to a table of 256 child slots when it has more children than this
+DENSE_CHILDREN = 48
+# and back to sorted labels when it has this many or fewer
+SPARSE_CHILDREN = 32
+
+
+class RadixNode:
+    """
+    Path-compressed node, prefix holds the bytes between the label of the node and its first branch
+    Sparse nodes keep sorted child labels searched with bisect, dense nodes index 256 slots directly
+    """
+    __slots__ = ('prefix', 'labels', 'children', 'child_count', 'has_value', 'key', 'value')
+
+    def __init__(self, prefix: bytes = b''):
+        self.prefix = prefix
+        self.labels = bytearray()
+        self.children = []
+        self.child_count = 0
+        self.has_value = False
+        self.key = None
+        self.value = None
+
+    def set_value(self, key, value):
+        self.has_value = True
+        self.key = key
+        self.value = value
+
+    def clear_value(self):
+        self.has_value = False
+        self.key = None
+        self.value = None
+
+    def child(self, label: int):
+        if self.labels is None:
+            return self.children[label]
+        idx = bisect_left(self.labels, label)
+        if idx < len(self.labels) and self.labels[idx] == label:
+            return self.children[idx]
+        return None
+
+    def add_child(self, label: int, node: 'RadixNode'):
+        self.child_count += 1
+        if self.labels is None:
+            self.children[label] = node
+            return
+        idx = bisect_left(self.labels, label)
+        self.labels.insert(idx, label)
+        self.children.insert(idx, node)
+        if self.child_count > DENSE_CHILDREN:
+            children = [None] * 256
+            for child_label, child in zip(self.labels, self.children):
+                children[child_label] = child
+            self.labels, self.children = None, children
+
+    def remove_child(self, label: int):
+        self.child_count -= 1
+        if self.labels is not None:
+            idx = bisect_left(self.labels, label)
+            del self.labels[idx]
+            del self.children[idx]
+            return
+        self.children[label] = None
+        if self.child_count <= SPARSE_CHILDREN:
+            self.labels = bytearray(idx for idx, child in enumerate(self.children) if child is not None)
+            self.children = [child for child in self.children if child is not None]
+
+    def items(self, lo: int = 0, hi: int = 256):
+        """Returns (label, child) pairs with lo <= label < hi in ascending label order"""
+        if self.labels is None:
+            return [(label, self.children[label]) for label in range(lo, hi) if self.children[label] is not None]
+        start, end = bisect_left(self.labels, lo), bisect_left(self.labels, hi)
+        return list(zip(self.labels[start:end], self.children[start:end]))
+
+    def take_contents(self, other: 'RadixNode'):
+        """Moves children and value of other to this node"""
+        self.labels, self.children, self.child_count = other.labels, other.children, other.child_count
+        self.has_value, self.key, self.value = other.has_value, other.key, other.value
+
+
+class RadixTree(AbstractTree):
+    """
+    Radix tree over order-preserving byte encodings of keys, see key_codec
+    A lookup walks at most one node per byte of the encoded key whatever the number of keys,
+    and compares bytes instead of whole keys, which suits long keys with shared prefixes
+    Keys are stored as given, so iteration does not decode them
+    """
+    compares_keys = False
+    instrumented_events = {'splits': ('_split',), 'merges': ('_merge_child',)}
+
+    def __init__(self):
+        self._root = RadixNode()
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def _find(self, encoded: bytes):
+        """Returns the node whose path is exactly encoded, or None"""
+        node, pos = self._root, 0
+        while node is not None:
+            prefix = node.prefix
+            if prefix:
+                if encoded[pos:pos + len(prefix)] != prefix:
+                    return None
+                pos += len(prefix)
+            if pos == len(encoded):
+                return node
+            node = node.child(encoded[pos])
+            pos += 1
+        return None
+
+    def insert(self, key, value):
+        encoded = encode_key(key)
+        node, pos = self._root, 0
+        while True:
+            prefix = node.prefix
+            common, limit = 0, min(len(prefix), len(encoded) - pos)
+            while common < limit and prefix[common] == encoded[pos + common]:
+                common += 1
+            if common < len(prefix):
+                # The key leaves the compressed path, split it
+                self._split(node, common)
+            pos += common
+            if pos == len(encoded):
+                if not node.has_value:
+                    self._size += 1
+                node.set_value(key, value)
+                return
+            child = node.child(encoded[pos])
+            if child is None:
+                leaf = RadixNode(encoded[pos + 1:])
+                leaf.set_value(key, value)
+                node.add_child(encoded[pos], leaf)
+                self._size += 1
+                return
+            node, pos = child, pos + 1
+
+    def _split(self, node: RadixNode, length: int):
+        """Keeps the first length bytes of the prefix in node and moves the rest of it with the contents below"""
+        lower = RadixNode(node.prefix[length + 1:])
+        lower.take_contents(node)
+        label = node.prefix[length]
+        node.prefix = node.prefix[:length]
+        node.labels, node.children, node.child_count = bytearray(), [], 0
+        node.clear_value()
+        node.add_child(label, lower)
+
+    def delete(self, key):
+        encoded = encode_key(key)
+        parent, label = None, None
+        node, pos = self._root, 0
+        while True:
+            prefix = node.prefix
+            if encoded[pos:pos + len(prefix)] != prefix:
+                raise KeyError(key)
+            pos += len(prefix)
+            if pos == len(encoded):
+                break
+            child = node.child(encoded[pos])
+            if child is None:
+                raise KeyError(key)
+            parent, label, node, pos = node, encoded[pos], child, pos + 1
+        if not node.has_value:
+            raise KeyError(key)
+        node.clear_value()
+        self._size -= 1
+
+        # Keep the tree path-compressed: no empty leaves and no valueless nodes with a single child
+        if parent is None:
+            return
+        if node.child_count == 0:
+            parent.remove_child(label)
+            if parent is not self._root and not parent.has_value and parent.child_count == 1:
+                self._merge_child(parent)
+        elif node.child_count == 1:
+            self._merge_child(node)
+
+    def _merge_child(self, node: RadixNode):
+        """Merges the only child of a valueless node into it"""
+        (label, child), = node.items()
+        node.prefix = node.prefix + bytes((label,)) + child.prefix
+        node.take_contents(child)
+
+    def get(self, key):
+        node = self._find(encode_key(key))
+        if node is None or not node.has_value:
+            raise KeyError(key)
+        return node.value
+
+    def contains(self, key) -> bool:
+        node = self._find(encode_key(key))
+        return node is not None and node.has_value
+
+    def get_or_default(self, key, default=None):
+        node = self._find(encode_key(key))
+        return node.value if node is not None and node.has_value else default
+
+    @staticmethod
+    def _ascending(stack):
+        """Yields nodes holding values in ascending order from the subtrees on the stack, top first"""
+        while stack:
+            node = stack.pop()
+            if node.has_value:
+                yield node
+            stack.extend(child for _, child in reversed(node.items()))
+
+    @staticmethod
+    def _descending(stack):
+        """
+        Yields nodes holding values in descending order from the stack, top first
+        The stack holds pairs (node, expanded), an expanded node only yields its own value
+        """
+        while stack:
+            node, expanded = stack.pop()
+            if expanded:
+                yield node
+                continue
+            if node.has_value:
+                stack.append((node, True))
+            stack.extend((child, False) for _, child in node.items())
+
+    def _from(self, lo: bytes, inclusive: bool):
+        """Yields nodes holding values at or after the encoded key lo in ascending order"""
+        stack, node, pos = [], self._root, 0
+        while True:
+            prefix = node.prefix
+            segment = lo[pos:pos + len(prefix)]
+            if prefix != segment:
+                # The whole subtree is either after lo or before it
+                if prefix > segment:
+                    stack.append(node)
+                break
+            pos += len(prefix)
+            if pos == len(lo):
+                if inclusive and node.has_value:
+                    yield node
+                stack.extend(child for _, child in reversed(node.items()))
+                break
+            label = lo[pos]
+            stack.extend(child for _, child in reversed(node.items(label + 1)))
+            node = node.child(label)
+            if node is None:
+                break
+            pos += 1
+        yield from self._ascending(stack)
+
+    def _to(self, hi: bytes, inclusive: bool):
+        """Yields nodes holding values at or before the encoded key hi in descending order"""
+        stack, node, pos = [], self._root, 0
+        while True:
+            prefix = node.prefix
+            segment = hi[pos:pos + len(prefix)]
+            if prefix != segment:
+                if prefix < segment:
+                    stack.append((node, False))
+                break
+            pos += len(prefix)
+            if pos == len(hi):
+                # Every key below this node extends hi, so it is greater than hi
+                if inclusive and node.has_value:
+                    yield node
+                break
+            # Keys of the nodes on the path are prefixes of hi, so they are less than hi
+            if node.has_value:
+                stack.append((node, True))
+            label = hi[pos]
+            stack.extend((child, False) for _, child in node.items(0, label))
+            node = node.child(label)
+            if node is None:
+                break
+            pos += 1
+        yield from self._descending(stack)
+
+    def __iter__(self):
+        return ((node.key, node.value) for node in self._ascending([self._root]))
+
+    def __reversed__(self):
+        return ((node.key, node.value) for node in self._descending([(self._root, False)]))
+
+    def range(self, lo=None, hi=None, inclusive=(True, True)):
+        nodes = self._ascending([self._root]) if lo is None else self._from(encode_key(lo), inclusive[0])
+        for node in nodes:
+            if not self._below_upper(node.key, hi, inclusive[1]):
+                return
+            yield node.key, node.value
+
+    def scan_prefix(self, prefix):
+        """
+        Returns an iterator over key-value pairs in ascending order whose keys start with prefix:
+        str keys starting with a str prefix, or tuple keys whose leading items equal a tuple prefix
+        :param prefix:
+        :return:
+        """
+        encoded = encode_prefix(prefix)
+        node, pos = self._root, 0
+        while node is not None:
+            segment = encoded[pos:pos + len(node.prefix)]
+            if not node.prefix.startswith(segment):
+                break
+            pos += len(node.prefix)
+            if pos >= len(encoded):
+                return ((node.key, node.value) for node in self._ascending([node]))
+            node = node.child(encoded[pos])
+            pos += 1
+        return iter(())
+
+    def floor(self, key):
+        for node in self._to(encode_key(key), True):
+            return node.key, node.value
+        raise KeyError(key)
+
+    def ceiling(self, key):
+        for node in self._from(encode_key(key), True):
+            return node.key, node.value
+        raise KeyError(key)
+
+    def min(self):
+        for node in self._ascending([self._root]):
+            return node.key, node.value
+        raise KeyError('Tree is empty')
+
+    def max(self):
+        for node in self._descending([(self._root, False)]):
+            return node.key, node.value
+        raise KeyError('Tree is empty')
+
+    def depth(self, key) -> int:
+        """Returns the number of nodes a search for key examines, bounded by the length of its encoding"""
+        encoded = encode_key(key)
+        depth, node, pos = 0, self._root, 0
+        while node is not None:
+            depth += 1
+            prefix = node.prefix
+            if encoded[pos:pos + len(prefix)] != prefix:
+                break
+            pos += len(prefix)
+            if pos == len(encoded):
+                break
+            node = node.child(encoded[pos])
+            pos += 1
+        return depth
+
+    def height(self) -> int:
+        if not self._size:
+            return 0
+        height, stack = 0, [(self._root, 1)]
+        while stack:
+            node, depth = stack.pop()
+            height = max(height, depth)
+            stack.extend((child, depth + 1) for _, child in node.items())
+        return height
@@ -1,33 +1,52 @@
-from core.trees.abstract_tree import AbstractTree
+from bisect import bisect_left
+
+from core.trees.joinable_tree import JoinableTree
+
+RED = True
+BLACK = False
 
 
 class Leaf:
     """
     Leaf class
+    A single instance (NIL) terminates every branch of every tree, so it is only read, never written
     """
+    __slots__ = ('key', 'color', 'parent', 'size')
 
-    def __init__(self, parent):
+    def __init__(self):
         self.key = None
-        self.color = "black"
-        self.parent = parent
+        self.color = BLACK
+        self.parent = None
+        self.size = 0
+
+
+NIL = Leaf()
 
 
 class BSTNode:
     """Represents a node for a linked binary search tree."""
+    __slots__ = ('key', 'data', 'parent', 'color', 'left', 'right', 'size')
 
-    def __init__(self, key, data, parent=None, color='red'):
+    def __init__(self, key, data, parent=None, color=RED):
         self.key = key
         self.data = data
         self.parent = parent
         self.color = color
-        self.left = Leaf(self)
-        self.right = Leaf(self)
+        self.left = NIL
+        self.right = NIL
+        self.size = 1
 
 
-class RedBlackTree(AbstractTree):
+class RedBlackTree(JoinableTree):
+    """
+    Red-black tree with parent pointers and subtree sizes
+    Join-based operations describe a subtree by its root and its black height,
+    the number of black nodes on every path from the root down to NIL
+    """
+    instrumented_events = {'rotations': ('rotate_left', 'rotate_right')}
 
     def __init__(self):
-        self._root = None
+        self._root = NIL
 
     def insert(self, key, value):
         """
@@ -37,20 +56,20 @@ class RedBlackTree(AbstractTree):
         :param value:
         :return: None
         """
-        if self._root is None:
-            self._root = BSTNode(key, value, None, 'black')
+        if self._root is NIL:
+            self._root = BSTNode(key, value, None, BLACK)
         else:
             node = self._root
             while 1:
                 if key < node.key:
-                    if node.left.key is not None:
+                    if node.left is not NIL:
                         node = node.left
                     else:
                         node.left = BSTNode(key, value, node)
                         node = node.left
                         break
                 elif key > node.key:
-                    if node.right.key is not None:
+                    if node.right is not NIL:
                         node = node.right
                     else:
                         node.right = BSTNode(key, value, node)
@@ -58,38 +77,72 @@ class RedBlackTree(AbstractTree):
                         break
                 else:
                     node.data = value
-                    break
+                    return
+            self._update_path_sizes(node.parent, 1)
             self.checker(node)
 
+    def _update_path_sizes(self, node, delta: int):
+        while node is not None:
+            node.size += delta
+            node = node.parent
+
+    @classmethod
+    def bulk_load(cls, items):
+        """
+        Builds a tree from key-value pairs sorted by key in O(n)
+        Nodes on the deepest level are red, all others are black
+        Raises ValueError if the keys are not strictly increasing
+        :param items: iterable of key-value pairs
+        :return: new tree
+        """
+        items = list(cls._check_sorted(items))
+        red_depth = len(items).bit_length() - 1
+
+        def build(low: int, high: int, parent, depth: int):
+            if low == high:
+                return NIL
+            mid = (low + high) // 2
+            node = BSTNode(*items[mid], parent, RED if depth == red_depth and depth else BLACK)
+            node.left = build(low, mid, node, depth + 1)
+            node.right = build(mid + 1, high, node, depth + 1)
+            node.size = high - low
+            return node
+
+        tree = cls()
+        if items:
+            tree._root = build(0, len(items), None, 0)
+        return tree
+
     def checker(self, node):
-        while node != self._root and node.parent.color == "red":
+        while node != self._root and node.parent.color == RED:
             uncle = node.parent.parent.left if node.parent.parent.right == node.parent else node.parent.parent.right
-            if uncle.color == "red":
-                node.parent.color = "black"
-                uncle.color = "black"
-                node.parent.parent.color = "red"
+            if uncle.color == RED:
+                node.parent.color = BLACK
+                uncle.color = BLACK
+                node.parent.parent.color = RED
                 node = node.parent.parent
             else:
                 if node.parent == node.parent.parent.right:
                     if node == node.parent.left:
                         node = node.parent
                         self.rotate_right(node)
-                    node.parent.color = "black"
-                    node.parent.parent.color = "red"
+                    node.parent.color = BLACK
+                    node.parent.parent.color = RED
                     self.rotate_left(node.parent.parent)
                 else:
                     if node == node.parent.right:
                         node = node.parent
                         self.rotate_left(node)
-                    node.parent.color = "black"
-                    node.parent.parent.color = "red"
+                    node.parent.color = BLACK
+                    node.parent.parent.color = RED
                     self.rotate_right(node.parent.parent)
-        self._root.color = "black"
+        self._root.color = BLACK
 
     def rotate_left(self, node):
         temp = node.right
         node.right = temp.left
-        temp.left.parent = node
+        if temp.left is not NIL:
+            temp.left.parent = node
         temp.parent = node.parent
         if node.parent is None:
             self._root = temp
@@ -99,11 +152,14 @@ class RedBlackTree(AbstractTree):
             node.parent.right = temp
         temp.left = node
         node.parent = temp
+        temp.size = node.size
+        node.size = node.left.size + node.right.size + 1
 
     def rotate_right(self, node):
         temp = node.left
         node.left = temp.right
-        temp.right.parent = node
+        if temp.right is not NIL:
+            temp.right.parent = node
         temp.parent = node.parent
         if node.parent is None:
             self._root = temp
@@ -113,6 +169,8 @@ class RedBlackTree(AbstractTree):
             node.parent.left = temp
         temp.right = node
         node.parent = temp
+        temp.size = node.size
+        node.size = node.left.size + node.right.size + 1
 
     def get(self, key):
         """
@@ -123,7 +181,7 @@ class RedBlackTree(AbstractTree):
         """
         node = self._root
         while 1:
-            if node.key is not None:
+            if node is not NIL:
                 if node.key > key:
                     node = node.left
                 elif node.key < key:
@@ -140,10 +198,8 @@ class RedBlackTree(AbstractTree):
         :return:
         """
         node = self._root
-        if node is None:
-            return False
         while 1:
-            if node.key is not None:
+            if node is not NIL:
                 if node.key > key:
                     node = node.left
                 elif node.key < key:
@@ -153,35 +209,319 @@ class RedBlackTree(AbstractTree):
             else:
                 return False
 
+    def depth(self, key) -> int:
+        """
+        Returns the number of nodes a search for the given key visits
+        :param key:
+        :return:
+        """
+        depth = 0
+        node = self._root
+        while node is not NIL:
+            depth += 1
+            if node.key > key:
+                node = node.left
+            elif node.key < key:
+                node = node.right
+            else:
+                break
+        return depth
+
+    def get_or_default(self, key, default=None):
+        """
+        Returns value for the given key or default if the tree does not contain it
+        :param key:
+        :param default:
+        :return:
+        """
+        node = self._root
+        while node is not NIL:
+            if node.key > key:
+                node = node.left
+            elif node.key < key:
+                node = node.right
+            else:
+                return node.data
+        return default
+
+    def _find_many(self, keys):
+        """
+        Looks up sorted keys in one walk
+        Every node splits the keys between its subtrees, so shared path prefixes are visited once
+        """
+        found = {}
+        stack = [(self._root, 0, len(keys))]
+        while stack:
+            node, low, high = stack.pop()
+            if node is NIL or low == high:
+                continue
+            mid = bisect_left(keys, node.key, low, high)
+            after = mid
+            if mid < high and keys[mid] == node.key:
+                found[node.key] = node.data
+                after += 1
+            stack.append((node.left, low, mid))
+            stack.append((node.right, after, high))
+        return found
+
+    def range(self, lo=None, hi=None, inclusive=(True, True)):
+        """
+        Returns an iterator over key-value pairs with keys between lo and hi in ascending order
+        Descends once to the first key in range and then streams the following keys
+        :param lo: lower bound
+        :param hi: upper bound
+        :param inclusive: pair of flags telling whether lo and hi themselves are included
+        :return:
+        """
+        stack = []
+        node = self._root
+        while node is not NIL:
+            if self._above_lower(node.key, lo, inclusive[0]):
+                stack.append(node)
+                node = node.left
+            else:
+                node = node.right
+        while stack:
+            node = stack.pop()
+            if not self._below_upper(node.key, hi, inclusive[1]):
+                return
+            yield node.key, node.data
+            node = node.right
+            while node is not NIL:
+                stack.append(node)
+                node = node.left
+
+    def floor(self, key):
+        """
+        Returns key-value pair with the greatest key less than or equal to the given key
+        Raises KeyError if there is no such key
+        :param key:
+        :return:
+        """
+        node, result = self._root, None
+        while node is not NIL:
+            if node.key > key:
+                node = node.left
+            else:
+                result = node
+                if node.key == key:
+                    break
+                node = node.right
+        if result is None:
+            raise KeyError(key)
+        return result.key, result.data
+
+    def ceiling(self, key):
+        """
+        Returns key-value pair with the smallest key greater than or equal to the given key
+        Raises KeyError if there is no such key
+        :param key:
+        :return:
+        """
+        node, result = self._root, None
+        while node is not NIL:
+            if node.key < key:
+                node = node.right
+            else:
+                result = node
+                if node.key == key:
+                    break
+                node = node.left
+        if result is None:
+            raise KeyError(key)
+        return result.key, result.data
+
+    def min(self):
+        """
+        Returns key-value pair with the smallest key
+        Raises KeyError if the tree is empty
+        :return:
+        """
+        if self._root is NIL:
+            raise KeyError('Tree is empty')
+        node = self._find_subtree_minimal(self._root)
+        return node.key, node.data
+
+    def max(self):
+        """
+        Returns key-value pair with the greatest key
+        Raises KeyError if the tree is empty
+        :return:
+        """
+        if self._root is NIL:
+            raise KeyError('Tree is empty')
+        node = self._find_subtree_maximal(self._root)
+        return node.key, node.data
+
+    def __len__(self):
+        return self._root.size
+
+    def _rank(self, key, inclusive: bool) -> int:
+        count = 0
+        node = self._root
+        while node is not NIL:
+            if node.key < key or (inclusive and node.key == key):
+                count += node.left.size + 1
+                node = node.right
+            else:
+                node = node.left
+        return count
+
+    def select(self, index: int):
+        """
+        Returns key-value pair with the given zero-based position in key order
+        Negative indices count from the end, raises IndexError if index is out of range
+        :param index:
+        :return:
+        """
+        index = self._check_index(index)
+        node = self._root
+        while index != node.left.size:
+            if index < node.left.size:
+                node = node.left
+            else:
+                index -= node.left.size + 1
+                node = node.right
+        return node.key, node.data
+
+    def _joinable(self, other) -> bool:
+        return isinstance(other, RedBlackTree)
+
+    def _root_subtree(self):
+        node, black_height = self._root, 0
+        while node is not NIL:
+            black_height += node.color == BLACK
+            node = node.left
+        return self._root, black_height
+
+    def _set_root(self, subtree):
+        node = subtree[0]
+        if node is not NIL:
+            node.parent = None
+            node.color = BLACK
+        self._root = node
+
+    def _empty(self):
+        return NIL, 0
+
+    def _size_of(self, subtree) -> int:
+        return subtree[0].size
+
+    def _expose(self, subtree):
+        node, black_height = subtree
+        child_height = black_height - (node.color == BLACK)
+        return (node.left, child_height), node, (node.right, child_height)
+
+    def _new_node(self, key, value):
+        return BSTNode(key, value)
+
+    def _pair(self, node):
+        return node.key, node.data
+
+    def _link(self, node, left, right, color):
+        """Makes left and right the children of node and updates its size"""
+        node.left = left
+        node.right = right
+        if left is not NIL:
+            left.parent = node
+        if right is not NIL:
+            right.parent = node
+        node.color = color
+        node.size = left.size + right.size + 1
+        return node
+
+    def _join(self, left, node, right):
+        """
+        Descends the spine of the subtree with the greater black height to a black node
+        of the black height of the other one and links them under the node colored red
+        A red parent of the new node is fixed by a rotation one level higher, see JoinableTree
+        """
+        (left, left_height), (right, right_height) = left, right
+        # Black roots keep the red node linked in the base case from getting a red child
+        if left.color == RED:
+            left.color = BLACK
+            left_height += 1
+        if right.color == RED:
+            right.color = BLACK
+            right_height += 1
+        if left_height > right_height:
+            root = self._join_right(left, left_height, node, right, right_height)
+            if root.color == RED and root.right.color == RED:
+                root.color = BLACK
+                return root, left_height + 1
+            return root, left_height
+        if right_height > left_height:
+            root = self._join_left(left, left_height, node, right, right_height)
+            if root.color == RED and root.left.color == RED:
+                root.color = BLACK
+                return root, right_height + 1
+            return root, right_height
+        return self._link(node, left, right, RED), left_height
+
+    def _join_right(self, left, left_height: int, node, right, right_height: int):
+        if left.color == BLACK and left_height == right_height:
+            return self._link(node, left, right, RED)
+        joined = self._join_right(left.right, left_height - (left.color == BLACK), node, right, right_height)
+        root = self._link(left, left.left, joined, left.color)
+        if root.color == BLACK and joined.color == RED and joined.right.color == RED:
+            joined.right.color = BLACK
+            return self._join_rotate_left(root)
+        return root
+
+    def _join_left(self, left, left_height: int, node, right, right_height: int):
+        if right.color == BLACK and left_height == right_height:
+            return self._link(node, left, right, RED)
+        joined = self._join_left(left, left_height, node, right.left, right_height - (right.color == BLACK))
+        root = self._link(right, joined, right.right, right.color)
+        if root.color == BLACK and joined.color == RED and joined.left.color == RED:
+            joined.left.color = BLACK
+            return self._join_rotate_right(root)
+        return root
+
+    def _join_rotate_left(self, node):
+        """Rotation of a detached subtree, the caller links the returned root"""
+        top = node.right
+        self._link(node, node.left, top.left, node.color)
+        return self._link(top, node, top.right, top.color)
+
+    def _join_rotate_right(self, node):
+        top = node.left
+        self._link(node, top.right, node.right, node.color)
+        return self._link(top, top.left, node, top.color)
+
     def _find_subtree_minimal(self, node):
-        while node.left.key is not None:
+        while node.left is not NIL:
             node = node.left
         return node
 
+    def _find_subtree_maximal(self, node):
+        while node.right is not NIL:
+            node = node.right
+        return node
+
     def _transplant(self, node1, node2):
         node1.key, node1.data, node2.key, node2.data = node2.key, node2.data, node1.key, node1.data
 
     def _replace(self, node, child):
+        # NIL is shared by all trees and never written to
+        if child is not NIL:
+            child.parent = node.parent
         if node.parent is None:
             self._root = child
-            return
-        if node.parent.left == node:
+        elif node.parent.left == node:
             node.parent.left = child
-            child.parent = node.parent
         else:
             node.parent.right = child
-            child.parent = node.parent
 
     def _delete_node_without_children(self, node):
-        if not isinstance(node.left, Leaf):
+        if node.left is not NIL:
             self._replace(node, node.left)
             return node.left
-        if not isinstance(node.right, Leaf):
+        if node.right is not NIL:
             self._replace(node, node.right)
             return node.right
-        child = Leaf(node)
-        self._replace(node, child)
-        return child
+        self._replace(node, NIL)
+        return NIL
 
     def delete(self, key):
         """
@@ -189,12 +529,14 @@ class RedBlackTree(AbstractTree):
         :param key:
         :return:
         """
-        if key == self._root.key and isinstance(self._root.right, Leaf) and isinstance(self._root.left, Leaf):
-            self._root = Leaf(None)
+        if self._root is NIL:
+            return
+        if key == self._root.key and self._root.right is NIL and self._root.left is NIL:
+            self._root = NIL
             return
         node = self._root
         while 1:
-            if node.key is not None:
+            if node is not NIL:
                 if node.key > key:
                     node = node.left
                 elif node.key < key:
@@ -204,63 +546,87 @@ class RedBlackTree(AbstractTree):
             else:
                 return
 
-        if isinstance(node.left, Leaf) or isinstance(node.right, Leaf):
-            child = self._delete_node_without_children(node)
-            deleted_color = node.color
-        else:
-            min_right = self._find_subtree_minimal(node.right)
-            self._transplant(node, min_right)
-            child = self._delete_node_without_children(min_right)
-            deleted_color = min_right.color
-        if deleted_color == "black":
-            self._delete_balance(child)
-
-    def _delete_balance(self, node):
-        if node == self._root:
-            if self._root.color == "red":
-                self._root.color = "black"
+        removed = node if node.left is NIL or node.right is NIL else self._find_subtree_minimal(node.right)
+        if removed is not node:
+            self._transplant(node, removed)
+        child = self._delete_node_without_children(removed)
+        self._update_path_sizes(removed.parent, -1)
+        if removed.color == BLACK:
+            self._delete_balance(child, removed.parent)
+
+    def _delete_balance(self, node, parent):
+        """
+        Restores the black height of the subtree at node, a child of parent that lost a black node
+        The parent is passed explicitly since node may be NIL, whose parent is never set
+        """
+        if parent is None or node.color == RED:
+            if node is not NIL:
+                node.color = BLACK
             return
-        brother = node.parent.left if node == node.parent.right else node.parent.right
-        if brother.color == "red":
-            brother.color = "black"
-            node.parent.color = "red"
-            if node == node.parent.left:
-                self.rotate_left(node.parent)
+        brother = parent.left if node is parent.right else parent.right
+        if brother.color == RED:
+            brother.color = BLACK
+            parent.color = RED
+            if node is parent.left:
+                self.rotate_left(parent)
             else:
-                self.rotate_right(node.parent)
-            brother = node.parent.left if node == node.parent.right else node.parent.right
-        if brother.left.color == brother.right.color == "black":
-            brother.color = "red"
-            if node.parent.color == "red":
-                node.parent.color = "black"
+                self.rotate_right(parent)
+            brother = parent.left if node is parent.right else parent.right
+        if brother.left.color == brother.right.color == BLACK:
+            brother.color = RED
+            if parent.color == RED:
+                parent.color = BLACK
             else:
-                self._delete_balance(node.parent)
+                self._delete_balance(parent, parent.parent)
         else:
-            if node == node.parent.left and brother.right.color == "black":
-                brother.left.color = "black"
-                brother.color = "red"
+            if node is parent.left and brother.right.color == BLACK:
+                brother.left.color = BLACK
+                brother.color = RED
                 self.rotate_right(brother)
-                brother = node.parent.left if node == node.parent.right else node.parent.right
-            elif node == node.parent.right and brother.left.color == "black":
-                brother.right.color = "black"
-                brother.color = "red"
+                brother = parent.right
+            elif node is parent.right and brother.left.color == BLACK:
+                brother.right.color = BLACK
+                brother.color = RED
                 self.rotate_left(brother)
-                brother = node.parent.left if node == node.parent.right else node.parent.right
-            brother.color = node.parent.color
-            node.parent.color = "black"
-            if node == node.parent.left:
-                brother.right.color = "black"
-                self.rotate_left(node.parent)
+                brother = parent.left
+            brother.color = parent.color
+            parent.color = BLACK
+            if node is parent.left:
+                brother.right.color = BLACK
+                self.rotate_left(parent)
             else:
-                brother.left.color = "black"
-                self.rotate_right(node.parent)
+                brother.left.color = BLACK
+                self.rotate_right(parent)
 
     def __iter__(self):
-        """Iter"""
-        def dfs(node: BSTNode):
-            """DFS"""
-            if not isinstance(node, Leaf):
-                yield from dfs(node.left)
-                yield node.key, node.data
-                yield from dfs(node.right)
-        yield from dfs(self._root)
+        """
+        In-order iteration following parent pointers
+        Every step is O(1) amortized and no stack is kept
+        """
+        if self._root is NIL:
+            return
+        node = self._find_subtree_minimal(self._root)
+        while node is not None:
+            yield node.key, node.data
+            if node.right is not NIL:
+                node = self._find_subtree_minimal(node.right)
+            else:
+                while node.parent is not None and node == node.parent.right:
+                    node = node.parent
+                node = node.parent
+
+    def __reversed__(self):
+        """
+        Reverse in-order iteration following parent pointers
+        """
+        if self._root is NIL:
+            return
+        node = self._find_subtree_maximal(self._root)
+        while node is not None:
+            yield node.key, node.data
+            if node.left is not NIL:
+                node = self._find_subtree_maximal(node.left)
+            else:
+                while node.parent is not None and node == node.parent.left:
+                    node = node.parent
+                node = node.parent
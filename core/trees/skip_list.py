@@ -0,0 +1,216 @@
+"""
+Skip List
+"""
+from random import Random
+
+from core.trees.abstract_tree import AbstractTree
+
+MAX_LEVEL = 32
+# Probability that a node also appears on the next level
+PROBABILITY = 0.25
+
+
+class SkipNode:
+    """Skip list node, forward[level] is the next node on that level"""
+    __slots__ = ('key', 'value', 'forward')
+
+    def __init__(self, key, value, forward):
+        self.key = key
+        self.value = value
+        self.forward = forward
+
+
+class SkipList(AbstractTree):
+    """
+    Skip list, balanced by random node levels instead of rotations
+    Readers need no locks while a single writer modifies the list: a new node is linked
+    bottom-up and a deleted one unlinked top-down without touching its own pointers,
+    so every reader keeps walking a consistent sorted chain on the lowest level
+    """
+
+    def __init__(self, seed=None):
+        self._head = SkipNode(None, None, [None] * MAX_LEVEL)
+        self._level = 1
+        self._size = 0
+        self._random = Random(seed)
+
+    def _random_level(self) -> int:
+        level = 1
+        while level < MAX_LEVEL and self._random.random() < PROBABILITY:
+            level += 1
+        return level
+
+    def _find_predecessors(self, key):
+        """Returns the last node before key on every level in use"""
+        update = [self._head] * MAX_LEVEL
+        node = self._head
+        for level in reversed(range(self._level)):
+            following = node.forward[level]
+            while following is not None and following.key < key:
+                node = following
+                following = node.forward[level]
+            update[level] = node
+        return update
+
+    def _find_node(self, key):
+        """Returns the node holding key or None"""
+        node = self._head
+        for level in reversed(range(self._level)):
+            following = node.forward[level]
+            while following is not None and following.key < key:
+                node = following
+                following = node.forward[level]
+        node = node.forward[0]
+        if node is not None and node.key == key:
+            return node
+        return None
+
+    def insert(self, key, value):
+        update = self._find_predecessors(key)
+        following = update[0].forward[0]
+        if following is not None and following.key == key:
+            following.value = value
+            return
+
+        level = self._random_level()
+        node = SkipNode(key, value, [update[lvl].forward[lvl] for lvl in range(level)])
+        # Link from the bottom, a reader that sees the node on a level also finds it on the levels below
+        for lvl in range(level):
+            update[lvl].forward[lvl] = node
+        self._level = max(self._level, level)
+        self._size += 1
+
+    @classmethod
+    def bulk_load(cls, items, *args, **kwargs):
+        """Links sorted pairs level by level in O(n)"""
+        tree = cls(*args, **kwargs)
+        tails = [tree._head] * MAX_LEVEL
+        for key, value in cls._check_sorted(items):
+            level = tree._random_level()
+            node = SkipNode(key, value, [None] * level)
+            for lvl in range(level):
+                tails[lvl].forward[lvl] = node
+                tails[lvl] = node
+            tree._level = max(tree._level, level)
+            tree._size += 1
+        return tree
+
+    def get(self, key):
+        node = self._find_node(key)
+        if node is None:
+            raise KeyError(key)
+        return node.value
+
+    def contains(self, key) -> bool:
+        return self._find_node(key) is not None
+
+    def get_or_default(self, key, default=None):
+        node = self._find_node(key)
+        return default if node is None else node.value
+
+    def _find_many(self, keys):
+        """
+        Looks up sorted keys with a finger search
+        The search for every key continues from the predecessors of the previous one
+        """
+        found = {}
+        update = [self._head] * MAX_LEVEL
+        for key in keys:
+            node = self._head
+            for level in reversed(range(self._level)):
+                if update[level] is not self._head and (node is self._head or node.key < update[level].key):
+                    node = update[level]
+                following = node.forward[level]
+                while following is not None and following.key < key:
+                    node = following
+                    following = node.forward[level]
+                update[level] = node
+            node = node.forward[0]
+            if node is not None and node.key == key:
+                found[key] = node.value
+        return found
+
+    def delete(self, key):
+        update = self._find_predecessors(key)
+        node = update[0].forward[0]
+        if node is None or node.key != key:
+            raise KeyError(key)
+        # Unlink from the top, the node keeps its pointers for readers standing on it
+        for level in reversed(range(len(node.forward))):
+            update[level].forward[level] = node.forward[level]
+        while self._level > 1 and self._head.forward[self._level - 1] is None:
+            self._level -= 1
+        self._size -= 1
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        node = self._head.forward[0]
+        while node is not None:
+            yield node.key, node.value
+            node = node.forward[0]
+
+    def range(self, lo=None, hi=None, inclusive=(True, True)):
+        node = self._head
+        if lo is not None:
+            for level in reversed(range(self._level)):
+                following = node.forward[level]
+                while following is not None and not self._above_lower(following.key, lo, inclusive[0]):
+                    node = following
+                    following = node.forward[level]
+        node = node.forward[0]
+        while node is not None and self._below_upper(node.key, hi, inclusive[1]):
+            yield node.key, node.value
+            node = node.forward[0]
+
+    def floor(self, key):
+        node = self._head
+        for level in reversed(range(self._level)):
+            following = node.forward[level]
+            while following is not None and following.key <= key:
+                node = following
+                following = node.forward[level]
+        if node is self._head:
+            raise KeyError(key)
+        return node.key, node.value
+
+    def ceiling(self, key):
+        update = self._find_predecessors(key)
+        node = update[0].forward[0]
+        if node is None:
+            raise KeyError(key)
+        return node.key, node.value
+
+    def min(self):
+        node = self._head.forward[0]
+        if node is None:
+            raise KeyError('Tree is empty')
+        return node.key, node.value
+
+    def max(self):
+        node = self._head
+        for level in reversed(range(self._level)):
+            while node.forward[level] is not None:
+                node = node.forward[level]
+        if node is self._head:
+            raise KeyError('Tree is empty')
+        return node.key, node.value
+
+    def depth(self, key) -> int:
+        """Returns the number of nodes a search for key examines"""
+        depth = 0
+        node = self._head
+        for level in reversed(range(self._level)):
+            following = node.forward[level]
+            while following is not None:
+                depth += 1
+                if not following.key < key:
+                    break
+                node = following
+                following = node.forward[level]
+        return depth
+
+    def height(self) -> int:
+        """Returns the number of levels in use"""
+        return self._level if self._size else 0
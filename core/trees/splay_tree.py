@@ -1,163 +1,328 @@
 """Module to create a splay tree"""
+from bisect import bisect_left
+from random import random
+
 from core.trees.abstract_tree import AbstractTree
 
 class Node:
+    __slots__ = ('key', 'data', 'left', 'right')
+
     def  __init__(self, key, data=None):
         if data is None:
             data = key
         self.key = key
         self.data = data
-        self.parent = None
         self.left = None
         self.right = None
 
 class SplayTree(AbstractTree):
-    """Class to represent a splay tree, based on Abstract tree"""
-    def __init__(self):
+    """
+    Class to represent a splay tree, based on Abstract tree
+    Splaying is top-down: the search path is split into a left and a right tree on the way down
+    and reassembled under the found node, so nodes need no parent pointers
+    """
+    instrumented_events = {'rotations': ('_left_rotate', '_right_rotate')}
+
+    def __init__(self, splay_on_read: bool = True, splay_probability: float = 1.0, splay_depth: int = 0):
+        """
+        With splay_on_read disabled lookups never restructure the tree and may run concurrently,
+        but they lose the amortized bound: only writes keep moving nodes to the root
+        splay_probability and splay_depth restrict splaying on reads, so that read-mostly workloads
+        without hot keys do not restructure the tree on every lookup: a found node is splayed
+        only when it is deeper than splay_depth, and then with the given probability
+        Writes always splay
+        """
+        if not 0 <= splay_probability <= 1:
+            raise ValueError('Splay probability should be between 0 and 1')
+        if splay_depth < 0:
+            raise ValueError('Splay depth should not be negative')
         self.root = None
+        self._size = 0
+        self.splay_on_read = splay_on_read
+        self.splay_probability = splay_probability
+        self.splay_depth = splay_depth
+        self._always_splay = splay_on_read and splay_probability == 1 and splay_depth == 0
+
+    @property
+    def mutating_reads(self) -> bool:
+        return self.splay_on_read and self.splay_probability > 0
+
+    def __len__(self):
+        return self._size
 
     def __iter__(self):
-        def iter_helper(node: Node):
-            """Additional function to iterate"""
-            if node is not None:
-                yield from iter_helper(node.left)
-                yield node.key, node.data
-                yield from iter_helper(node.right)
-        yield from iter_helper(self.root)
+        """In-order iteration with an explicit stack, no recursion"""
+        stack = []
+        node = self.root
+        while stack or node is not None:
+            while node is not None:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            yield node.key, node.data
+            node = node.right
 
-    def get(self, key):
+    def __reversed__(self):
+        """Reverse in-order iteration with an explicit stack"""
+        stack = []
         node = self.root
+        while stack or node is not None:
+            while node is not None:
+                stack.append(node)
+                node = node.right
+            node = stack.pop()
+            yield node.key, node.data
+            node = node.left
+
+    def _lookup(self, key):
+        """Returns the node of key or None, splaying it when the read policy says so"""
+        if self._always_splay:
+            self.root = self._splay(self.root, key)
+            root = self.root
+            return root if root is not None and root.key == key else None
+        node, depth = self.root, 0
         while node is not None:
+            depth += 1
             if key < node.key:
                 node = node.left
             elif key > node.key:
                 node = node.right
-            elif key == node.key:
-                self._splay(node)
-                return node.data
-        raise KeyError
+            else:
+                self._access(node, depth)
+                return node
+        return None
 
-    def delete(self, key):
-        if self.root is None:
-            return
+    def get(self, key):
+        node = self._lookup(key)
+        if node is None:
+            raise KeyError
+        return node.data
+
+    def range(self, lo=None, hi=None, inclusive=(True, True)):
+        """Iterates over pairs between lo and hi without splaying"""
+        stack = []
         node = self.root
         while node is not None:
-            if node.key == key:
-                position = node
-                break
-            if node.key < key:
+            if self._above_lower(node.key, lo, inclusive[0]):
+                stack.append(node)
+                node = node.left
+            else:
+                node = node.right
+        while stack:
+            node = stack.pop()
+            if not self._below_upper(node.key, hi, inclusive[1]):
+                return
+            yield node.key, node.data
+            node = node.right
+            while node is not None:
+                stack.append(node)
+                node = node.left
+
+    def floor(self, key):
+        """Returns pair with the greatest key <= key, the found node may become a root"""
+        node, result, depth, result_depth = self.root, None, 0, 0
+        while node is not None:
+            depth += 1
+            if key < node.key:
+                node = node.left
+            else:
+                result, result_depth = node, depth
+                if key == node.key:
+                    break
+                node = node.right
+        if result is None:
+            raise KeyError(key)
+        self._access(result, result_depth)
+        return result.key, result.data
+
+    def ceiling(self, key):
+        """Returns pair with the smallest key >= key, the found node may become a root"""
+        node, result, depth, result_depth = self.root, None, 0, 0
+        while node is not None:
+            depth += 1
+            if key > node.key:
                 node = node.right
             else:
+                result, result_depth = node, depth
+                if key == node.key:
+                    break
                 node = node.left
-        if position is None:
+        if result is None:
+            raise KeyError(key)
+        self._access(result, result_depth)
+        return result.key, result.data
+
+    def min(self):
+        """Returns pair with the smallest key, the found node may become a root"""
+        if self.root is None:
+            raise KeyError('Tree is empty')
+        node, depth = self.root, 1
+        while node.left is not None:
+            node, depth = node.left, depth + 1
+        self._access(node, depth)
+        return node.key, node.data
+
+    def max(self):
+        """Returns pair with the greatest key, the found node may become a root"""
+        if self.root is None:
+            raise KeyError('Tree is empty')
+        node, depth = self.root, 1
+        while node.right is not None:
+            node, depth = node.right, depth + 1
+        self._access(node, depth)
+        return node.key, node.data
+
+    def delete(self, key):
+        if self.root is None:
             return
-        self._splay(position)
-        if position.right is not None:
-            t_root = position.right
-            t_root.parent = None
+        root = self._splay(self.root, key)
+        if root.key != key:
+            self.root = root
+            return
+        if root.left is None:
+            self.root = root.right
         else:
-            t_root = None
-        s_root = position
-        s_root.right = None
-        position = None
-        if s_root.left is not None:
-            s_root.left.parent = None
-        self.root = self._join(s_root.left, t_root)
-        s_root = None
+            # key is greater than every key on the left, so splaying it there brings up the maximum
+            self.root = self._splay(root.left, key)
+            self.root.right = root.right
+        self._size -= 1
 
     def insert(self, key, data=None):
         node = Node(key, data)
-        parent = None
-        temp = self.root
-        while temp is not None:
-            parent = temp
-            if node.key < temp.key:
-                temp = temp.left
-            else:
-                temp = temp.right
-        node.parent = parent
-        if parent is None:
+        if self.root is None:
             self.root = node
-        elif node.key < parent.key:
-            parent.left = node
+            self._size += 1
+            return
+        root = self._splay(self.root, key)
+        if key == root.key:
+            root.data = node.data
+            self.root = root
+            return
+        if key < root.key:
+            node.left, node.right = root.left, root
+            root.left = None
         else:
-            parent.right = node
-        self._splay(node)
+            node.left, node.right = root, root.right
+            root.right = None
+        self.root = node
+        self._size += 1
+
+    @classmethod
+    def bulk_load(cls, items, *args, **kwargs):
+        """Builds a balanced tree from sorted pairs in O(n)"""
+        items = list(cls._check_sorted(items))
+
+        def build(low: int, high: int):
+            if low == high:
+                return None
+            mid = (low + high) // 2
+            node = Node(*items[mid])
+            node.left = build(low, mid)
+            node.right = build(mid + 1, high)
+            return node
+
+        tree = cls(*args, **kwargs)
+        tree.root = build(0, len(items))
+        tree._size = len(items)
+        return tree
 
     def contains(self, key) -> bool:
-        try:
-            self.get(key)
-        except KeyError:
-            return False
-        return True
-
-    def __left_rotate(self, node: Node):
-        """Performs a left rotation of the tree"""
+        return self._lookup(key) is not None
+
+    def get_or_default(self, key, default=None):
+        """Returns value for the key or default, a found node may become a root"""
+        node = self._lookup(key)
+        return default if node is None else node.data
+
+    def depth(self, key) -> int:
+        """Returns the number of nodes on the search path of key, without splaying"""
+        depth = 0
+        node = self.root
+        while node is not None:
+            depth += 1
+            if key < node.key:
+                node = node.left
+            elif key > node.key:
+                node = node.right
+            else:
+                break
+        return depth
+
+    def _find_many(self, keys):
+        """Looks up sorted keys in one walk sharing path prefixes, without splaying"""
+        found = {}
+        stack = [(self.root, 0, len(keys))]
+        while stack:
+            node, low, high = stack.pop()
+            if node is None or low == high:
+                continue
+            mid = bisect_left(keys, node.key, low, high)
+            after = mid
+            if mid < high and keys[mid] == node.key:
+                found[node.key] = node.data
+                after += 1
+            stack.append((node.left, low, mid))
+            stack.append((node.right, after, high))
+        return found
+
+    def _left_rotate(self, node: Node) -> Node:
+        """Performs a left rotation of the subtree, returns its new root"""
         temp = node.right
         node.right = temp.left
-        if temp.left is not None:
-            temp.left.parent = node
-        temp.parent = node.parent
-        if node.parent is None:
-            self.root = temp
-        elif node == node.parent.left:
-            node.parent.left = temp
-        else:
-            node.parent.right = temp
         temp.left = node
-        node.parent = temp
+        return temp
 
-    def __right_rotate(self, node: Node):
-        """Performs a right rotation of the tree"""
+    def _right_rotate(self, node: Node) -> Node:
+        """Performs a right rotation of the subtree, returns its new root"""
         temp = node.left
         node.left = temp.right
-        if temp.right is not None:
-            temp.right.parent = node
-        temp.parent = node.parent
-        if node.parent is None:
-            self.root = temp
-        elif node == node.parent.right:
-            node.parent.right = temp
-        else:
-            node.parent.left = temp
         temp.right = node
-        node.parent = temp
-
-    def _splay(self, node: Node):
-        """Splays a tree, node becomes a root"""
-        while node.parent is not None:
-            if node.parent.parent is None:
-                if node == node.parent.left:
-                    self.__right_rotate(node.parent)
-                else:
-                    self.__left_rotate(node.parent)
-            elif node == node.parent.left and node.parent == node.parent.parent.left:
-                self.__right_rotate(node.parent.parent)
-                self.__right_rotate(node.parent)
-            elif node == node.parent.right and node.parent == node.parent.parent.left:
-                self.__left_rotate(node.parent)
-                self.__right_rotate(node.parent)
-            elif node == node.parent.right and node.parent == node.parent.parent.right:
-                self.__left_rotate(node.parent.parent)
-                self.__left_rotate(node.parent)
+        return temp
+
+    def _splay(self, node: Node, key) -> Node:
+        """
+        Splays the subtree of node top-down, returns its new root:
+        the node of key, or the last node on its search path if there is no such key
+        Nodes passed on the way down are linked into a tree of smaller keys and a tree of greater keys,
+        which become the subtrees of the new root
+        """
+        if node is None:
+            return None
+        # left of the header collects the greater keys, right of it the smaller ones
+        header = Node(None)
+        smaller = greater = header
+        while True:
+            if key < node.key:
+                if node.left is None:
+                    break
+                if key < node.left.key:
+                    node = self._right_rotate(node)
+                    if node.left is None:
+                        break
+                greater.left = node
+                greater = node
+                node = node.left
+            elif key > node.key:
+                if node.right is None:
+                    break
+                if key > node.right.key:
+                    node = self._left_rotate(node)
+                    if node.right is None:
+                        break
+                smaller.right = node
+                smaller = node
+                node = node.right
             else:
-                self.__right_rotate(node.parent)
-                self.__left_rotate(node.parent)
-
-    def _join(self, s_root: Node, t_root: Node):
-        """Joins two trees, helper for delete operation"""
-        if s_root is None:
-            return t_root
-        if t_root is None:
-            return s_root
-        node = self._get_maximum(s_root)
-        self._splay(node)
-        node.right = t_root
-        t_root.parent = node
+                break
+        smaller.right = node.left
+        greater.left = node.right
+        node.left = header.right
+        node.right = header.left
         return node
 
-    def _get_maximum(self, node: Node):
-        """Returns the biggest value of the tree"""
-        while node.right is not None:
-            node = node.right
-        return node
+    def _access(self, node: Node, depth: int):
+        """Moves a node found by a lookup at the given depth to the root if the read policy says so"""
+        if not self.splay_on_read or depth <= self.splay_depth:
+            return
+        if self.splay_probability == 1 or random() < self.splay_probability:
+            self.root = self._splay(self.root, node.key)
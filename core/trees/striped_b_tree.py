@@ -0,0 +1,139 @@
+from heapq import merge
+from operator import itemgetter
+
+from core.trees.abstract_tree import AbstractTree
+from core.trees.b_tree import BTree, DEFAULT_ORDER
+from core.trees.concurrent_tree import RWLock
+
+DEFAULT_STRIPES = 16
+
+
+class StripedBTree(AbstractTree):
+    """
+    Thread-safe B-tree split into stripes by key hash, each stripe has its own reader-writer lock
+    Point operations lock a single stripe, so writers to different stripes do not wait for each other
+    Ordered operations merge the stripes, every stripe is read consistently but not all of them at once
+    """
+
+    def __init__(self, stripes: int = DEFAULT_STRIPES, order: int = DEFAULT_ORDER):
+        if stripes < 1:
+            raise ValueError('StripedBTree should have at least one stripe')
+        self._order = order
+        self._stripes = [BTree(order) for _ in range(stripes)]
+        self._locks = [RWLock() for _ in range(stripes)]
+
+    def _index(self, key) -> int:
+        return hash(key) % len(self._stripes)
+
+    def _collect(self, func):
+        """Returns func(stripe) for every stripe, each called under the stripe read lock"""
+        results = []
+        for stripe, lock in zip(self._stripes, self._locks):
+            with lock.read():
+                results.append(func(stripe))
+        return results
+
+    @classmethod
+    def bulk_load(cls, items, *args, **kwargs):
+        tree = cls(*args, **kwargs)
+        parts = [[] for _ in tree._stripes]
+        for key, value in cls._check_sorted(items):
+            parts[tree._index(key)].append((key, value))
+        tree._stripes = [BTree.bulk_load(part, tree._order) for part in parts]
+        return tree
+
+    def insert(self, key, value):
+        idx = self._index(key)
+        with self._locks[idx].write():
+            self._stripes[idx].insert(key, value)
+
+    def delete(self, key):
+        idx = self._index(key)
+        with self._locks[idx].write():
+            self._stripes[idx].delete(key)
+
+    def get(self, key):
+        idx = self._index(key)
+        with self._locks[idx].read():
+            return self._stripes[idx].get(key)
+
+    def contains(self, key) -> bool:
+        idx = self._index(key)
+        with self._locks[idx].read():
+            return self._stripes[idx].contains(key)
+
+    def get_or_default(self, key, default=None):
+        idx = self._index(key)
+        with self._locks[idx].read():
+            return self._stripes[idx].get_or_default(key, default)
+
+    def _find_many(self, keys):
+        """Looks up sorted keys stripe by stripe, each stripe gets its keys in one batch"""
+        parts = [[] for _ in self._stripes]
+        for key in keys:
+            parts[self._index(key)].append(key)
+        missing = object()
+        found = {}
+        for part, stripe, lock in zip(parts, self._stripes, self._locks):
+            if part:
+                with lock.read():
+                    values = stripe.get_many(part, missing)
+                found.update((key, value) for key, value in zip(part, values) if value is not missing)
+        return found
+
+    def __iter__(self):
+        return merge(*self._collect(list), key=itemgetter(0))
+
+    def __reversed__(self):
+        return merge(*self._collect(lambda stripe: list(reversed(stripe))), key=itemgetter(0), reverse=True)
+
+    def range(self, lo=None, hi=None, inclusive=(True, True)):
+        return merge(*self._collect(lambda stripe: list(stripe.range(lo, hi, inclusive))), key=itemgetter(0))
+
+    @staticmethod
+    def _found(func):
+        """Wraps a stripe lookup to return None instead of raising KeyError"""
+        def lookup(stripe):
+            try:
+                return func(stripe)
+            except KeyError:
+                return None
+        return lookup
+
+    def floor(self, key):
+        found = [item for item in self._collect(self._found(lambda stripe: stripe.floor(key))) if item is not None]
+        if not found:
+            raise KeyError(key)
+        return max(found, key=itemgetter(0))
+
+    def ceiling(self, key):
+        found = [item for item in self._collect(self._found(lambda stripe: stripe.ceiling(key))) if item is not None]
+        if not found:
+            raise KeyError(key)
+        return min(found, key=itemgetter(0))
+
+    def min(self):
+        found = [item for item in self._collect(self._found(BTree.min)) if item is not None]
+        if not found:
+            raise KeyError('Tree is empty')
+        return min(found, key=itemgetter(0))
+
+    def max(self):
+        found = [item for item in self._collect(self._found(BTree.max)) if item is not None]
+        if not found:
+            raise KeyError('Tree is empty')
+        return max(found, key=itemgetter(0))
+
+    def __len__(self):
+        return sum(self._collect(len))
+
+    def _rank(self, key, inclusive: bool) -> int:
+        return sum(self._collect(lambda stripe: stripe.count_range(hi=key, inclusive=(True, inclusive))))
+
+    def depth(self, key) -> int:
+        idx = self._index(key)
+        with self._locks[idx].read():
+            return self._stripes[idx].depth(key)
+
+    def height(self) -> int:
+        return max(self._collect(BTree.height))
@@ -0,0 +1,157 @@
+from typing import Type
+
+from core.trees.abstract_tree import AbstractTree
+from core.trees.b_tree import BTree
+
+# Compact once more than this part of the stored entries are tombstones, rebuilding when half of the
+# entries are deleted costs O(1) per delete and keeps scans within twice the live pairs
+MAX_TOMBSTONE_RATIO = 0.5
+# Value stored in place of the value of a deleted key
+TOMBSTONE = object()
+_MISSING = object()
+
+
+class TombstoneTree(AbstractTree):  # pylint: disable=too-many-public-methods
+    """
+    Tree wrapper deleting lazily: a deleted key keeps its entry with a tombstone instead of its value,
+    BTree and TwoThreeTree overwrite it in place in one descent without the borrows and merges of a real delete
+    Lookups and scans skip tombstones, once their part of the entries passes max_tombstone_ratio the
+    live pairs are rebuilt into a new tree with bulk_load in O(n), so a delete costs amortized O(log n)
+    rank, select and count_range, and floor, ceiling, min and max when they land on a tombstone,
+    compact first, so they are answered by the wrapped tree as they are
+    Meant for BTree and TwoThreeTree, whose deletes rebalance, and for batch purges
+    Use TombstoneTree.wrap(tree_type, ...) to get a tree type for Database and Table
+    """
+    tree_type: Type = BTree
+    tree_args = ()
+    tree_kwargs = {}
+    max_tombstone_ratio = MAX_TOMBSTONE_RATIO
+    # Reads that compact rebuild the tree
+    mutating_reads = True
+
+    def __init__(self):
+        self._tree = self.tree_type(*self.tree_args, **self.tree_kwargs)
+        self._tombstones = 0
+
+    @classmethod
+    def wrap(cls, tree_type: Type, *args, max_tombstone_ratio: float = MAX_TOMBSTONE_RATIO, **kwargs) -> Type:
+        """
+        Returns a tree type deleting lazily from tree_type(*args, **kwargs) created inside
+        :param tree_type:
+        :param max_tombstone_ratio: part of the stored entries that may be tombstones before compaction
+        :return:
+        """
+        if not 0 <= max_tombstone_ratio <= 1:
+            raise ValueError('Tombstone ratio should be between 0 and 1')
+        return type(f'Tombstone{tree_type.__name__}', (cls,),
+                    {'tree_type': tree_type, 'tree_args': args, 'tree_kwargs': kwargs,
+                     'max_tombstone_ratio': max_tombstone_ratio, 'compares_keys': tree_type.compares_keys})
+
+    @classmethod
+    def bulk_load(cls, items):
+        tree = cls()
+        tree._tree = cls.tree_type.bulk_load(items, *cls.tree_args, **cls.tree_kwargs)
+        return tree
+
+    @property
+    def tombstone_ratio(self) -> float:
+        """Part of the entries stored in the wrapped tree that are tombstones"""
+        return self._tombstones / len(self._tree) if self._tombstones else 0.0
+
+    def compact(self):
+        """Rebuilds the wrapped tree from the live pairs"""
+        if self._tombstones:
+            self._tree = self.tree_type.bulk_load(list(self), *self.tree_args, **self.tree_kwargs)
+            self._tombstones = 0
+
+    def _compacted(self) -> AbstractTree:
+        self.compact()
+        return self._tree
+
+    def _live(self, pairs):
+        """Filters tombstones out of pairs of the wrapped tree"""
+        if not self._tombstones:
+            return pairs
+        return ((key, value) for key, value in pairs if value is not TOMBSTONE)
+
+    def _nearest(self, name: str, *args):
+        """Calls a method of the wrapped tree that returns a single pair, compacts and repeats if it is deleted"""
+        pair = getattr(self._tree, name)(*args)
+        if pair[1] is TOMBSTONE:
+            pair = getattr(self._compacted(), name)(*args)
+        return pair
+
+    def insert(self, key, value):
+        if self._tombstones:
+            # Reviving a deleted key only overwrites its tombstone
+            previous = self._tree._replace_value(key, value, _MISSING)  # pylint: disable=protected-access
+            if previous is not _MISSING:
+                if previous is TOMBSTONE:
+                    self._tombstones -= 1
+                return
+        self._tree.insert(key, value)
+
+    def delete(self, key):
+        if self._tree._replace_value(key, TOMBSTONE, TOMBSTONE) is TOMBSTONE:  # pylint: disable=protected-access
+            raise KeyError(key)
+        self._tombstones += 1
+        if self._tombstones > self.max_tombstone_ratio * len(self._tree):
+            self.compact()
+
+    def get(self, key):
+        value = self._tree.get_or_default(key, TOMBSTONE)
+        if value is TOMBSTONE:
+            raise KeyError(key)
+        return value
+
+    def contains(self, key) -> bool:
+        return self._tree.get_or_default(key, TOMBSTONE) is not TOMBSTONE
+
+    def get_or_default(self, key, default=None):
+        value = self._tree.get_or_default(key, TOMBSTONE)
+        return default if value is TOMBSTONE else value
+
+    def get_many(self, keys, default=None):
+        return [default if value is TOMBSTONE else value for value in self._tree.get_many(keys, TOMBSTONE)]
+
+    def contains_many(self, keys):
+        return [value is not TOMBSTONE for value in self._tree.get_many(keys, TOMBSTONE)]
+
+    def __iter__(self):
+        return self._live(iter(self._tree))
+
+    def __reversed__(self):
+        return self._live(reversed(self._tree))
+
+    def __len__(self):
+        return len(self._tree) - self._tombstones
+
+    def range(self, lo=None, hi=None, inclusive=(True, True)):
+        return self._live(self._tree.range(lo, hi, inclusive))
+
+    def floor(self, key):
+        return self._nearest('floor', key)
+
+    def ceiling(self, key):
+        return self._nearest('ceiling', key)
+
+    def min(self):
+        return self._nearest('min')
+
+    def max(self):
+        return self._nearest('max')
+
+    def rank(self, key) -> int:
+        return self._compacted().rank(key)
+
+    def select(self, index: int):
+        return self._compacted().select(index)
+
+    def count_range(self, lo=None, hi=None, inclusive=(True, True)) -> int:
+        return self._compacted().count_range(lo, hi, inclusive)
+
+    def depth(self, key) -> int:
+        return self._tree.depth(key)
+
+    def height(self) -> int:
+        return self._tree.height()
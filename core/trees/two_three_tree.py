@@ -1,15 +1,18 @@
 """ Two Three Tree implementation """
+from bisect import bisect_left
 
 from core.trees.abstract_tree import AbstractTree
 
 
 class Node:
     """ Node class of Two Three Tree """
+    __slots__ = ('data', 'children', 'parent', 'size')
 
     def __init__(self, key, value, parent=None):
         self.data = [(key, value)]
         self.children = []
         self.parent = parent
+        self.size = 1
 
     def __str__(self, level=0):
         """ Convert node and all children to string """
@@ -46,10 +49,9 @@ class Node:
         """ Return list of data """
         return [x[0] for x in self.data]
 
-    @property
-    def size(self):
-        """ Return size of tree """
-        return len(self) + sum(child.size for child in self.children)
+    def update_size(self):
+        """ Recalculate number of keys in subtree from children sizes """
+        self.size = len(self) + sum(child.size for child in self.children)
 
     @property
     def is_leaf(self):
@@ -71,23 +73,22 @@ class Node:
             self.children.remove(node)
 
     def split(self):
-        """ Split node if it is full """
-        if len(self) != 3:
-            # If node is not full, do nothing
-            return
-
+        """ Split full node with 3 keys """
         # Create new 2 nodes and middle item
-        left = Node(self.data[0][0], self.data[0][1], self)
+        left = type(self)(self.data[0][0], self.data[0][1], self)
         middle = self.data[1]
-        right = Node(self.data[2][0], self.data[2][1], self)
+        right = type(self)(self.data[2][0], self.data[2][1], self)
 
         if not self.is_leaf:
             # Split own children into left and right nodes if not a leaf
             for child_n in range(4):
                 self.children[child_n].set_parent(left if child_n in (0, 1) else right)
             left.children, right.children = self.children[0:2], self.children[2:4]
+            left.update_size()
+            right.update_size()
         # Assign new children and new data as middle item
         self.children, self.data = [left, right], [middle]
+        self.update_size()
 
         if self.parent:
             # If node has a parent, insert into parent
@@ -106,7 +107,9 @@ class Node:
         self.children.extend(node.children)
         self.data.sort(key=lambda x: x[0])
         self.children.sort(key=lambda x: x.data[0])
-        self.split()
+        if len(self) == 3:
+            self.split()
+        self.update_size()
 
     def insert(self, node):
         """ Insert node into tree """
@@ -130,11 +133,12 @@ class Node:
             else:
                 # If node is between self, insert into middle child
                 self.children[1].insert(node)
+            self.update_size()
 
     def insert_all(self, items):
         """ Insert all items into tree """
         for item in items:
-            self.insert(Node(*item))
+            self.insert(type(self)(*item))
 
     def get(self, key):
         """ Return value of key in tree, or None if key not found """
@@ -155,18 +159,6 @@ class Node:
         # If key is between self, search middle child
         return self.children[1].get(key)
 
-    def get_all_children_data_recursive(self):
-        """ Return all data in tree """
-        if self.is_leaf:
-            return self.data
-
-        children_data = []
-        for child in self.children:
-            children_data.extend(child.get_all_children_data_recursive())
-        children_data.extend(self.data)
-
-        return children_data
-
     def inorder(self):
         """ Return all data in tree """
         if self.is_leaf:
@@ -199,67 +191,80 @@ class Node:
 
         return self.children[0].search_node_with_minimum_key()
 
-    def delete_from_node(self, key):
-        """ Delete key from node """
-        for key_n in range(len(self)):
-            if self.data[key_n][0] == key:
-                if self.is_leaf and self.parent is None:
-                    self.data.pop(key_n)
-                    return
-                if self.is_leaf:
-                    minimum_node = self
-                else:
-                    if key_n == 0:
-                        minimum_node = self.children[1].search_node_with_minimum_key()
-                    else:
-                        minimum_node = self.children[-1].search_node_with_minimum_key()
-                    minimum_node.data[0], self.data[key_n] = self.data[key_n], minimum_node.data[0]
-                    self.data.sort(key=lambda x: x[0])
-
-                children_data = minimum_node.parent.get_all_children_data_recursive()
-                for child in children_data:
-                    if child[0] == key:
-                        children_data.remove(child)
-                        break
-
-                minimum_node.parent.data, minimum_node.parent.children = [], []
-                minimum_node.parent.insert_all(children_data)
-                break
-
-    def delete(self, key):
-        """ Delete key from tree """
-        if key in self.data_list:
-            # If key is in data, delete from data
-
-            # # Slow realization
-            # children_data = self.get_all_children_data_recursive()
-            #
-            # for child in children_data:
-            #     if child[0] == key:
-            #         children_data.remove(child)
-            #
-            # self.data, self.children = [], []
-            # self.insert_all(children_data)
-
-            # Fast realization
-            self.delete_from_node(key)
-        elif self.is_leaf:
-            # If node is leaf, key not found
+    def pop_maximum(self):
+        """ Remove and return item with maximum key from subtree """
+        self.size -= 1
+        if self.is_leaf:
+            return self.data.pop()
+        item = self.children[-1].pop_maximum()
+        self.fix_child(len(self.children) - 1)
+        return item
+
+    def fix_child(self, index):
+        """ Restore child that lost its only key by borrowing from or merging with a sibling """
+        child = self.children[index]
+        if child.data:
             return
+        if index > 0 and len(self.children[index - 1]) == 2:
+            # Borrow from left sibling through the parent
+            sibling = self.children[index - 1]
+            child.data.insert(0, self.data[index - 1])
+            self.data[index - 1] = sibling.data.pop()
+            if not sibling.is_leaf:
+                moved = sibling.children.pop()
+                moved.set_parent(child)
+                child.children.insert(0, moved)
+        elif index < len(self.children) - 1 and len(self.children[index + 1]) == 2:
+            # Borrow from right sibling through the parent
+            sibling = self.children[index + 1]
+            child.data.append(self.data[index])
+            self.data[index] = sibling.data.pop(0)
+            if not sibling.is_leaf:
+                moved = sibling.children.pop(0)
+                moved.set_parent(child)
+                child.children.append(moved)
         else:
-            if key < self.data[0][0]:
-                # If key is less than self, search left child
-                self.children[0].delete(key)
-            elif key > self.data[-1][0]:
-                # If key is greater than self, search right child
-                self.children[-1].delete(key)
+            self.merge_children(index - 1 if index > 0 else index)
+            return
+        sibling.update_size()
+        child.update_size()
+
+    def merge_children(self, index):
+        """ Merge child at index with its right sibling and the key between them """
+        left, right = self.children[index], self.children.pop(index + 1)
+        left.data.append(self.data.pop(index))
+        left.data.extend(right.data)
+        left.set_parent_for_node_children(right)
+        left.children.extend(right.children)
+        left.update_size()
+
+    def delete(self, key):
+        """ Delete key from subtree, return True if key was found """
+        index = 0
+        while index < len(self) and self.data[index][0] < key:
+            index += 1
+
+        if index < len(self) and self.data[index][0] == key:
+            if self.is_leaf:
+                self.data.pop(index)
             else:
-                # If key is between self, search middle child
-                self.children[1].delete(key)
+                # Replace key with its in-order predecessor
+                self.data[index] = self.children[index].pop_maximum()
+                self.fix_child(index)
+        else:
+            if self.is_leaf or not self.children[index].delete(key):
+                # Key not found
+                return False
+            self.fix_child(index)
+        self.size -= 1
+        return True
 
 
 class TwoThreeTree(AbstractTree):
     """ Two-Three Tree """
+    node_type = Node
+    # Structural events happen in nodes, InstrumentedTree counts them on a subclass of node_type
+    instrumented_node_events = {'splits': ('split',), 'merges': ('merge_children',)}
 
     def __init__(self):
         self.root = None
@@ -272,6 +277,8 @@ class TwoThreeTree(AbstractTree):
 
     def __len__(self):
         """ Return number of keys in tree """
+        if not self._has_root:
+            return 0
         return self.root.size
 
     @property
@@ -290,11 +297,45 @@ class TwoThreeTree(AbstractTree):
     def insert(self, key, value):
         """ Insert key, value pair into tree """
         if not self._has_root:
-            self.root = Node(key, value)
+            self.root = self.node_type(key, value)
         else:
-            self.root.insert(Node(key, value))
+            self.root.insert(self.node_type(key, value))
             self._find_root()
 
+    @classmethod
+    def bulk_load(cls, items):
+        """ Build tree bottom-up from items sorted by key """
+        items = list(cls._check_sorted(items))
+        tree = cls()
+        if not items:
+            return tree
+
+        height = 1
+        while 3 ** height - 1 < len(items):
+            height += 1
+
+        def build(low, high, height, parent):
+            """ Build subtree of given height from items[low:high] """
+            node = tree.node_type(*items[low], parent)
+            node.size = high - low
+            if height == 1:
+                node.data = items[low:high]
+                return node
+            children_count = max(2, -(-(high - low + 1) // 3 ** (height - 1)))
+            per_child, extra = divmod(high - low - children_count + 1, children_count)
+            node.data = []
+            for index in range(children_count):
+                size = per_child + (index < extra)
+                node.children.append(build(low, low + size, height - 1, node))
+                low += size
+                if index != children_count - 1:
+                    node.data.append(items[low])
+                    low += 1
+            return node
+
+        tree.root = build(0, len(items), height, None)
+        return tree
+
     def get(self, key):
         """ Return key in tree, or None if not found """
         if not self._has_root:
@@ -310,19 +351,223 @@ class TwoThreeTree(AbstractTree):
             return False
         return self.root.get(key) is not None
 
+    def get_or_default(self, key, default=None):
+        """ Return value of key in tree, or default if key not found """
+        node = self.root
+        while node is not None:
+            index = 0
+            while index < len(node) and node.data[index][0] < key:
+                index += 1
+            if index < len(node) and node.data[index][0] == key:
+                return node.data[index][1]
+            node = None if node.is_leaf else node.children[index]
+        return default
+
+    def _replace_value(self, key, value, default=None):
+        """ Overwrite value of key in place in one descent, return previous value or default if key not found """
+        node = self.root
+        while node is not None:
+            data = node.data
+            index = 0
+            while index < len(data) and data[index][0] < key:
+                index += 1
+            if index < len(data) and data[index][0] == key:
+                previous = data[index][1]
+                data[index] = key, value
+                return previous
+            node = node.children[index] if node.children else None
+        return default
+
+    def depth(self, key):
+        """ Return number of nodes on the search path of key """
+        depth = 0
+        node = self.root
+        while node is not None:
+            depth += 1
+            index = 0
+            while index < len(node) and node.data[index][0] < key:
+                index += 1
+            if index < len(node) and node.data[index][0] == key:
+                break
+            node = None if node.is_leaf else node.children[index]
+        return depth
+
+    def height(self):
+        """ Return number of levels in tree """
+        height = 0
+        node = self.root
+        while node is not None:
+            height += 1
+            node = None if node.is_leaf else node.children[0]
+        return height
+
+    def _find_many(self, keys):
+        """ Look up sorted keys in one walk, every node splits the keys between its children """
+        found = {}
+        stack = [(self.root, 0, len(keys))] if self._has_root else []
+        while stack:
+            node, low, high = stack.pop()
+            while low < high:
+                index = 0
+                while index < len(node) and node.data[index][0] < keys[low]:
+                    index += 1
+                if index < len(node) and node.data[index][0] == keys[low]:
+                    found[keys[low]] = node.data[index][1]
+                    low += 1
+                    continue
+                end = bisect_left(keys, node.data[index][0], low, high) if index < len(node) else high
+                if not node.is_leaf:
+                    stack.append((node.children[index], low, end))
+                low = end
+        return found
+
     def delete(self, key):
         """ Delete key from tree """
         if not self._has_root:
             return False
         if self.root.delete(key):
-            self._find_root()
             if not self.root.data:
-                self.root = None
+                self.root = self.root.children[0] if self.root.children else None
+                if self.root is not None:
+                    self.root.set_parent(None)
             return True
         return False
 
     def __iter__(self):
-        """ Return iterator over keys in tree """
-        if not self._has_root:
-            return iter([])
-        return iter(self.root.inorder())
+        """ Return iterator over items in tree, walks nodes with an explicit stack """
+        stack = []
+        node = self.root
+        while node is not None:
+            stack.append((node, 0))
+            node = None if node.is_leaf else node.children[0]
+
+        while stack:
+            node, index = stack.pop()
+            if index == len(node):
+                continue
+            yield node.data[index]
+            stack.append((node, index + 1))
+            child = None if node.is_leaf else node.children[index + 1]
+            while child is not None:
+                stack.append((child, 0))
+                child = None if child.is_leaf else child.children[0]
+
+    def __reversed__(self):
+        """ Return iterator over items in tree in descending order """
+        stack = []
+        node = self.root
+        while node is not None:
+            stack.append((node, len(node)))
+            node = None if node.is_leaf else node.children[-1]
+
+        while stack:
+            node, index = stack.pop()
+            if index == 0:
+                continue
+            yield node.data[index - 1]
+            stack.append((node, index - 1))
+            child = None if node.is_leaf else node.children[index - 1]
+            while child is not None:
+                stack.append((child, len(child)))
+                child = None if child.is_leaf else child.children[-1]
+
+    def range(self, lo=None, hi=None, inclusive=(True, True)):
+        """ Return iterator over items with keys between lo and hi """
+        stack = []
+        node = self.root
+        while node is not None:
+            index = 0
+            while index < len(node) and not self._above_lower(node.data[index][0], lo, inclusive[0]):
+                index += 1
+            stack.append((node, index))
+            node = None if node.is_leaf else node.children[index]
+
+        while stack:
+            node, index = stack.pop()
+            if index == len(node):
+                continue
+            key, value = node.data[index]
+            if not self._below_upper(key, hi, inclusive[1]):
+                return
+            yield key, value
+            stack.append((node, index + 1))
+            child = None if node.is_leaf else node.children[index + 1]
+            while child is not None:
+                stack.append((child, 0))
+                child = None if child.is_leaf else child.children[0]
+
+    def floor(self, key):
+        """ Return item with the greatest key less than or equal to key """
+        node, result = self.root, None
+        while node is not None:
+            index = 0
+            while index < len(node) and node.data[index][0] <= key:
+                result = node.data[index]
+                index += 1
+            if result is not None and result[0] == key:
+                break
+            node = None if node.is_leaf else node.children[index]
+        if result is None:
+            raise KeyError("Key not found")
+        return result
+
+    def ceiling(self, key):
+        """ Return item with the smallest key greater than or equal to key """
+        node, result = self.root, None
+        while node is not None:
+            index = 0
+            while index < len(node) and node.data[index][0] < key:
+                index += 1
+            if index < len(node):
+                result = node.data[index]
+                if result[0] == key:
+                    break
+            node = None if node.is_leaf else node.children[index]
+        if result is None:
+            raise KeyError("Key not found")
+        return result
+
+    def min(self):
+        """ Return item with the smallest key """
+        if not self._has_root or not self.root.data:
+            raise KeyError("Tree is empty")
+        return self.root.search_node_with_minimum_key().data[0]
+
+    def max(self):
+        """ Return item with the greatest key """
+        if not self._has_root or not self.root.data:
+            raise KeyError("Tree is empty")
+        node = self.root
+        while not node.is_leaf:
+            node = node.children[-1]
+        return node.data[-1]
+
+    def _rank(self, key, inclusive):
+        """ Return number of keys less than (or equal to, if inclusive) key """
+        count = 0
+        node = self.root
+        while node is not None:
+            index = 0
+            while index < len(node) and (node.data[index][0] <= key if inclusive else node.data[index][0] < key):
+                index += 1
+            count += index
+            if node.is_leaf:
+                break
+            count += sum(child.size for child in node.children[:index])
+            node = node.children[index]
+        return count
+
+    def select(self, index):
+        """ Return item with given position in sorted order """
+        index = self._check_index(index)
+        node = self.root
+        while not node.is_leaf:
+            for position, child in enumerate(node.children):
+                if index < child.size:
+                    node = child
+                    break
+                index -= child.size
+                if index == 0:
+                    return node.data[position]
+                index -= 1
+        return node.data[index]
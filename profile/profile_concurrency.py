@@ -0,0 +1,108 @@
+""" Stress and profile trees shared between threads """
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from core.trees.abstract_tree import AbstractTree
+from core.trees.avl_tree import AVLTree
+from core.trees.b_tree import BTree
+from core.trees.concurrent_tree import ConcurrentTree
+from core.trees.splay_tree import SplayTree
+from core.trees.striped_b_tree import StripedBTree
+
+
+class GlobalLockTree(AbstractTree):
+    """ Baseline: every operation takes the same exclusive lock """
+
+    def __init__(self, tree_type=BTree):
+        self.tree = tree_type()
+        self.lock = threading.Lock()
+
+    def insert(self, key, value):
+        with self.lock:
+            self.tree.insert(key, value)
+
+    def get(self, key):
+        with self.lock:
+            return self.tree.get(key)
+
+    def contains(self, key) -> bool:
+        with self.lock:
+            return self.tree.contains(key)
+
+    def delete(self, key):
+        with self.lock:
+            self.tree.delete(key)
+
+    def __iter__(self):
+        with self.lock:
+            return iter(list(self.tree))
+
+
+class ProfileTreesConcurrency:
+    """ Run the multi-threaded stress profiling """
+
+    def __init__(self, trees, thread_counts, operations=20000, read_ratio=0.9):
+        self.trees = trees
+        self.thread_counts = thread_counts
+        self.operations = operations
+        self.read_ratio = read_ratio
+        self.results = []
+
+    def worker(self, tree, worker_id, threads):
+        """ Run a mixed workload, writes go to keys owned by this worker only """
+        rng = random.Random(worker_id)
+        owned = {}
+        for _ in range(self.operations // threads):
+            key = rng.randrange(self.operations) * threads + worker_id
+            if rng.random() < self.read_ratio:
+                if tree.contains(key) and tree.get(key) != key:
+                    raise RuntimeError(f'Wrong value for key {key}')
+            elif key in owned:
+                tree.delete(key)
+                owned.pop(key)
+            else:
+                tree.insert(key, key)
+                owned[key] = key
+        return owned
+
+    def profile_tree_concurrency(self, tree_type, threads):
+        """ Run workers in a thread pool and check that no update was lost """
+        tree = tree_type()
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            futures = [executor.submit(self.worker, tree, worker_id, threads) for worker_id in range(threads)]
+            expected = {}
+            for future in futures:
+                expected.update(future.result())
+        elapsed = time.time() - start_time
+
+        if list(tree) != sorted(expected.items()):
+            raise RuntimeError(f'{tree_type.__name__} lost updates')
+        return elapsed
+
+    def run_concurrency_profile(self):
+        """ Run the profiling for every tree and thread count """
+        for tree_type in self.trees:
+            for threads in self.thread_counts:
+                elapsed = self.profile_tree_concurrency(tree_type, threads)
+                name = tree_type.__name__ + ''.join(f" {key}={value}" for key, value in
+                                                   getattr(tree_type, 'tree_kwargs', {}).items())
+                print(f"{name:>40} {threads:>2} threads: "
+                      f"{elapsed:.3f}s, {self.operations / elapsed:.0f} ops/s")
+                self.results.append([name, threads, elapsed])
+
+
+if __name__ == '__main__':
+    trees_to_profile = [
+        GlobalLockTree,
+        ConcurrentTree.wrap(BTree),
+        ConcurrentTree.wrap(AVLTree),
+        ConcurrentTree.wrap(SplayTree),
+        ConcurrentTree.wrap(SplayTree, splay_on_read=False),
+        StripedBTree,
+    ]
+    profile = ProfileTreesConcurrency(trees_to_profile, [1, 2, 4, 8, 16])
+    profile.run_concurrency_profile()
@@ -2,16 +2,31 @@
 
 import os
 import random
+import tracemalloc
 
 import matplotlib.pyplot as plt
 import pandas as pd
 import seaborn as sns
 from memory_profiler import memory_usage
 
+from core.trees.avl_tree import AVLTree
+from core.trees.b_tree import BTree
 from core.trees.builtin_tree import BuiltinTree
+from core.trees.persistent_avl_tree import PersistentAVLTree
+from core.trees.radix_tree import RadixTree
+from core.trees.red_black_tree import RedBlackTree
+from core.trees.skip_list import SkipList
+from core.trees.splay_tree import SplayTree
 from core.trees.two_three_tree import TwoThreeTree
 
 
+class ListKeysBTree(BTree):
+    """ BTree keeping numeric keys in lists of int objects instead of typed arrays """
+
+    def __init__(self):
+        super().__init__(typed_keys=False)
+
+
 class ProfileTreesMemory:
     """ Run the profiling """
 
@@ -63,6 +78,28 @@ class ProfileTreesMemory:
             except Exception as e:
                 pass
 
+    @classmethod
+    def profile_bytes_per_node(cls, tree_type, data_size, key_type=str):
+        """ Measure the bytes the tree structure allocates per stored key """
+        # string keys are created before tracing so that only the tree itself is measured,
+        # numeric keys are parsed from them while tracing so that the key objects the tree keeps alive are counted
+        keys = [str(element) for element in cls.create_random_elements_list(data_size)]
+        tracemalloc.start()
+        tree = tree_type()
+        for key in keys:
+            tree.insert(key if key_type is str else key_type(key), None)
+        allocated, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del tree
+        return allocated / data_size
+
+    def report_bytes_per_node(self, data_size=10000):
+        """ Print the bytes per stored key for every profiled tree """
+        print(f"Bytes per key on {data_size} elements, str keys and int keys")
+        for tree_type in self.trees:
+            print(f"{tree_type.__name__:>15}: {self.profile_bytes_per_node(tree_type, data_size):8.1f}"
+                  f" {self.profile_bytes_per_node(tree_type, data_size, int):8.1f}")
+
     def visualize(self):
         """ Visualize the results of the profiling """
         # save the results as image using matplotlib
@@ -101,8 +138,9 @@ class ProfileTreesMemory:
 
 
 if __name__ == '__main__':
-    trees_to_profile = [BuiltinTree, TwoThreeTree]  # TODO [AVLTree, RedBlackTree, BTree, TwoThreeTree, SplayTree]
+    trees_to_profile = [AVLTree, PersistentAVLTree, RedBlackTree, BTree, ListKeysBTree, TwoThreeTree, SplayTree, BuiltinTree, SkipList, RadixTree]
     data_sizes_to_test = [100, 150, 1000, 10000, 20000]
     profile = ProfileTreesMemory(trees_to_profile, data_sizes_to_test)
+    profile.report_bytes_per_node()
     profile.run_memory_profile()
     print(profile.results)
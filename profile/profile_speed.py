@@ -1,5 +1,6 @@
 """ Profile speed of the different trees """
 
+import itertools
 import os
 import random
 import time
@@ -11,7 +12,11 @@ import seaborn as sns
 from core.trees.avl_tree import AVLTree
 from core.trees.b_tree import BTree
 from core.trees.builtin_tree import BuiltinTree
+from core.trees.instrumented_tree import InstrumentedTree
+from core.trees.persistent_avl_tree import PersistentAVLTree
+from core.trees.radix_tree import RadixTree
 from core.trees.red_black_tree import RedBlackTree
+from core.trees.skip_list import SkipList
 from core.trees.splay_tree import SplayTree
 from core.trees.two_three_tree import TwoThreeTree
 
@@ -46,8 +51,11 @@ class ProfileTreesSpeed:
     def profile_tree_speed(self, tree_type, data_size):
         """ Profile the speed of the tree """
         # profile a single tree of a given type on a given data size
+        return self.run_workload(tree_type(), data_size)
+
+    def run_workload(self, tree, data_size):
+        """ Time insertion, search and deletion on the given tree """
         result = {}
-        tree = tree_type()
 
         # profile insertion
         random_elements = self.create_random_elements_list(data_size)
@@ -88,6 +96,105 @@ class ProfileTreesSpeed:
 
         return result
 
+    def profile_btree_orders(self, orders, data_size=20000):
+        """ Profile the speed of the B-tree for different node orders """
+        print(f"BTree on {data_size} elements")
+        results = []
+        for order in orders:
+            result = self.profile_tree_speed(lambda: BTree(order), data_size)
+            print(f"order {order:>4}: " + ", ".join(f"{name} {value:.3f}s" for name, value in result.items()))
+            results.append([order] + list(result.values()))
+        return results
+
+    def profile_tree_counters(self, data_size=20000):
+        """ Report operation counts of every tree next to its wall time """
+        print(f"Operation counts on {data_size} elements")
+        results = []
+        for tree_type in self.trees:
+            timing = self.profile_tree_speed(tree_type, data_size)
+            # counting slows the tree down and measures depth with an extra descent per operation,
+            # so the counts come from a separate instrumented run that is not timed
+            tree = InstrumentedTree.wrap(tree_type)()
+            self.run_workload(tree, data_size)
+            counts = tree.report()
+            print(f"{tree_type.__name__:>18}: " + ", ".join(f"{name} {value:.3f}s" for name, value in timing.items()) +
+                  ", " + ", ".join(f"{name} {value:.4g}" for name, value in counts.items()))
+            results.append([tree_type.__name__] + list(timing.values()) + list(counts.values()))
+        return results
+
+    @classmethod
+    def profile_operation_costs(cls, tree_types, data_size=20000, hot_keys=50, scans=200):
+        """ Measure microseconds per operation, in the form of DEFAULT_COSTS of AdaptiveTree """
+        print(f"Operation costs on {data_size} elements")
+        keys = [(key,) for key in cls.create_random_elements_list(data_size)]
+        lookups = [random.choice(keys) for _ in range(data_size)]
+        hot_lookups = [random.choice(keys[:hot_keys]) for _ in range(data_size)]
+        results = {}
+        for tree_type in tree_types:
+            tree = tree_type()
+            result = {}
+
+            start_time = time.perf_counter()
+            for key in keys:
+                tree.insert(key, None)
+            result["insert"] = (time.perf_counter() - start_time) / data_size * 1e6
+
+            for name, probes in (("lookup", lookups), ("hot_lookup", hot_lookups)):
+                start_time = time.perf_counter()
+                for key in probes:
+                    tree.get(key)
+                result[name] = (time.perf_counter() - start_time) / len(probes) * 1e6
+
+            # a seek is the time to the first pair of a range, full scans give the cost per row
+            # BuiltinTree sorts all keys on every seek, its seek divided by data_size is its seek_per_key
+            start_time = time.perf_counter()
+            for _ in range(scans):
+                next(iter(tree.range(random.choice(keys))))
+            result["seek"] = (time.perf_counter() - start_time) / scans * 1e6
+            start_time = time.perf_counter()
+            for _ in tree:
+                pass
+            result["row"] = (time.perf_counter() - start_time) / data_size * 1e6
+
+            start_time = time.perf_counter()
+            for key in keys:
+                tree.delete(key)
+            result["delete"] = (time.perf_counter() - start_time) / data_size * 1e6
+
+            print(f"{tree_type.__name__:>18}: OperationCosts(" +
+                  ", ".join(f"{name}={value:.3g}" for name, value in result.items()) + ")")
+            results[tree_type.__name__] = result
+        return results
+
+    @classmethod
+    def create_zipfian_list(cls, elements, size, skew=1.0):
+        """ Draw size elements, the element of rank r is drawn with probability proportional to 1 / r ** skew """
+        ranked = random.sample(elements, len(elements))
+        weights = list(itertools.accumulate(1 / rank ** skew for rank in range(1, len(ranked) + 1)))
+        return random.choices(ranked, cum_weights=weights, k=size)
+
+    @classmethod
+    def profile_access_distributions(cls, tree_factories, data_size=20000, lookups=100000, skew=1.0):
+        """ Measure microseconds per lookup under uniform and Zipfian key distributions """
+        print(f"Lookups on {data_size} elements, uniform and Zipfian with skew {skew}")
+        keys = cls.create_random_elements_list(data_size)
+        distributions = {"uniform": [random.choice(keys) for _ in range(lookups)],
+                         "zipfian": cls.create_zipfian_list(keys, lookups, skew)}
+        results = {}
+        for name, factory in tree_factories.items():
+            tree = factory()
+            for key in keys:
+                tree.insert(key, key)
+            result = {}
+            for distribution, probes in distributions.items():
+                start_time = time.perf_counter()
+                for key in probes:
+                    tree.get(key)
+                result[distribution] = (time.perf_counter() - start_time) / lookups * 1e6
+            print(f"{name:>24}: " + ", ".join(f"{distribution} {value:.3g}us" for distribution, value in result.items()))
+            results[name] = result
+        return results
+
     def visualize(self, type_to_visualize="search"):
         """ Visualize the results of the profiling """
         # save the results as image using matplotlib
@@ -133,8 +240,18 @@ class ProfileTreesSpeed:
 
 
 if __name__ == '__main__':
-    trees_to_profile = [AVLTree, BTree, RedBlackTree, SplayTree, BuiltinTree, TwoThreeTree]
+    trees_to_profile = [AVLTree, PersistentAVLTree, BTree, RedBlackTree, SplayTree, BuiltinTree, TwoThreeTree, SkipList, RadixTree]
     data_sizes_to_test = [100, 150, 1000, 5000, 10000, 15000, 20000]
     profile = ProfileTreesSpeed(trees_to_profile, data_sizes_to_test)
     profile.run_speed_profile()
     print(profile.results)
+    profile.profile_btree_orders([3, 8, 16, 32, 64, 128, 256, 512])
+    profile.profile_tree_counters()
+    profile.profile_operation_costs([AVLTree, RedBlackTree, SplayTree, BTree, BuiltinTree])
+    profile.profile_access_distributions({
+        "AVLTree": AVLTree,
+        "SplayTree": SplayTree,
+        "SplayTree(p=0.1)": lambda: SplayTree(splay_probability=0.1),
+        "SplayTree(depth=20)": lambda: SplayTree(splay_depth=20),
+        "SplayTree(no read splay)": lambda: SplayTree(splay_on_read=False),
+    })
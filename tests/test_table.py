@@ -0,0 +1,391 @@
+import io
+import os
+import tempfile
+import unittest
+
+from core.databases.in_memory_database.database import Database
+from core.databases.in_memory_database.table import Table
+from core.databases.utils.binary_io import AdvancedBinaryIO
+from core.databases.utils.columns import Column, Columns, UniqueColumn
+from core.databases.utils.plan_cache import PlanCache
+from core.databases.utils.predicate_compiler import MAX_FRAMES, compile_predicate
+from core.trees.adaptive_tree import AdaptiveTree
+from core.trees.avl_tree import AVLTree
+from core.trees.b_tree import BTree
+from core.trees.builtin_tree import BuiltinTree
+from core.trees.persistent_avl_tree import PersistentAVLTree
+from core.trees.radix_tree import RadixTree
+from core.trees.red_black_tree import RedBlackTree
+from core.trees.skip_list import SkipList
+from core.trees.splay_tree import SplayTree
+from core.trees.two_three_tree import TwoThreeTree
+
+trees = [AVLTree, PersistentAVLTree, RedBlackTree, SplayTree, BTree, TwoThreeTree, BuiltinTree, SkipList, RadixTree]
+
+
+class NoScanTree(AVLTree):
+    def __iter__(self):
+        raise AssertionError('Full scan')
+
+
+class BatchLookupTree(NoScanTree):
+    def get(self, key):
+        raise AssertionError('Single key lookup')
+
+    def contains(self, key) -> bool:
+        raise AssertionError('Single key lookup')
+
+
+class RangeDeleteTree(AVLTree):
+    def delete(self, key):
+        raise AssertionError('Single key delete')
+
+
+class ScanCountingTree(AVLTree):
+    scans = 0
+
+    def __iter__(self):
+        ScanCountingTree.scans += 1
+        return super().__iter__()
+
+
+class TableTest(unittest.TestCase):
+    @staticmethod
+    def run_tests(func):
+        def run(self):
+            for tree_type in trees:
+                with self.subTest(f"Checking {tree_type.__name__}"):
+                    func(self, tree_type)
+        return run
+
+    @staticmethod
+    def make_table(tree_type) -> Table:
+        table = Table(tree_type, [UniqueColumn('a', 'int'), UniqueColumn('b', 'int'), Column('name', 'str')])
+        for i in range(10):
+            for j in range(10):
+                table.insert(i, j, f'{i}:{j}')
+        return table
+
+    @run_tests
+    def test_select_where(self, tree_type):
+        table = self.make_table(tree_type)
+
+        self.assertEqual(list(table.select_where('and(equals a 3, equals b 4)', 'name')), [['3:4']])
+        self.assertEqual(list(table.select_where("equals name '3:4'", 'a', 'b')), [[3, 4]])
+        self.assertEqual(len(list(table.select_where('less a 2'))), 20)
+        self.assertEqual(list(table.select_where('and(equals a 2, greater b 7)', 'b')), [[8], [9]])
+        self.assertEqual(list(table.select_where('and(greater a 7, less b 1)', 'name')), [['8:0'], ['9:0']])
+        self.assertEqual(list(table.select_where('or(equals a 0, less a 1)', 'b')), [[i] for i in range(10)])
+
+    @run_tests
+    def test_prepared_statements(self, tree_type):
+        table = self.make_table(tree_type)
+
+        point = table.prepare('and(equals a ?, equals b ?)')
+        self.assertEqual(point.parameter_count, 2)
+        for i in range(10):
+            self.assertEqual(list(point.select_where((i, 9 - i), 'name')), [[f'{i}:{9 - i}']])
+        self.assertEqual(list(point.select_where((3, 10))), [])
+        scan = table.prepare("or(equals name ?, and(greater a ?, less b ?))")
+        self.assertEqual(list(scan.select_where(('1:1', 8, 1), 'name')), [['1:1'], ['9:0']])
+        self.assertEqual(list(table.prepare("equals name '?'").select_where(())), [])
+        # Bound values named like operators stay values
+        self.assertEqual(len(list(table.prepare('less name ?').select_where(['less']))), 100)
+        self.assertEqual(list(table.prepare('greater name ?').select_where(['or'])), [])
+        self.assertEqual(list(table.prepare('equals name ?').select_where(['and'])), [])
+        self.assertRaises(RuntimeError, point.select_where, (1,))
+        self.assertRaises(RuntimeError, table.select_where, 'equals a ?')
+        table.prepare('less a ?').delete([5])
+        self.assertEqual(len(table), 50)
+
+    @run_tests
+    def test_plan_cache(self, tree_type):
+        table = self.make_table(tree_type)
+        table._plans = PlanCache(table._columns, 2)
+
+        for _ in range(3):
+            self.assertEqual(list(table.select_where('equals a 1', 'b')), [[i] for i in range(10)])
+        self.assertEqual(table.stats()['plan_cache'], {'hits': 2, 'misses': 1, 'size': 1})
+        table.select_where('equals a 2')
+        table.select_where('equals a 1')
+        table.select_where('equals a 3')
+        # 'equals a 2' was the least recently used
+        table.select_where('equals a 1')
+        table.select_where('equals a 2')
+        self.assertEqual(table.stats()['plan_cache'], {'hits': 4, 'misses': 4, 'size': 2})
+        table.delete('equals a 1')
+        self.assertEqual(list(table.select_where('equals a 1')), [])
+
+    @run_tests
+    def test_delete(self, tree_type):
+        table = self.make_table(tree_type)
+
+        table.delete('greater a 4')
+        table.delete('and(equals a 0, less b 5)')
+        table.delete("equals name '1:1'")
+        rows = list(table.select('a', 'b'))
+
+        self.assertEqual(len(rows), 44)
+        self.assertNotIn([0, 4], rows)
+        self.assertNotIn([1, 1], rows)
+        self.assertIn([0, 5], rows)
+
+    @run_tests
+    def test_column_comparisons(self, tree_type):
+        table = Table(tree_type, [UniqueColumn('a', 'int'), UniqueColumn('b', 'int'), Column('c', 'int')], True)
+        for i in range(10):
+            for j in range(10):
+                table.insert(i, j, (i * j) % 7)
+
+        self.assertEqual(list(table.select_where('and(equals a b, less a 5)', 'a')), [[i] for i in range(5)])
+        self.assertEqual(len(list(table.select_where('less a b'))), 45)
+        self.assertEqual(list(table.select_where('and(greater c b, equals a 3)', 'b')), [[1], [2], [4]])
+        self.assertEqual(list(table.select_where('equals c a', 'a', 'b')),
+                         [[i, j] for i in range(10) for j in range(10) if (i * j) % 7 == i])
+        self.assertRaises(ValueError, list, table.select_where('less d 1'))
+
+    def test_predicate_normalization(self):
+        columns = Columns([UniqueColumn('a', 'int'), UniqueColumn('b', 'int'), Column('name', 'str')])
+
+        self.assertEqual(compile_predicate('and(greater a 3, less a 4)', columns), [])
+        self.assertEqual(compile_predicate("and(equals a 5, or(greater a 7, and(equals name 'x', less a 2)))", columns), [])
+        frames = compile_predicate('or(and(greater a 1, less a 5), or(and(greater a 3, less a 9), greater a 20))', columns)
+        self.assertEqual([frame.bounds for frame in frames], [{'a': (1, 9)}, {'a': (20, None)}])
+        self.assertEqual(len(compile_predicate("or(equals name 'x', equals name 'x')", columns)), 1)
+        self.assertEqual(len(compile_predicate('or(and(less b 3, equals a 1), less b 3)', columns)), 1)
+        self.assertEqual(len(compile_predicate('and(less b 3, and(greater b 1, less b 5))', columns)[0].additional), 2)
+
+        # Every level doubles the frames of a full expansion
+        predicate = 'equals a 0'
+        for level in range(12):
+            predicate = f"and(or(greater b {level % 5}, equals name '0:0'), {predicate})"
+        self.assertLessEqual(len(compile_predicate(predicate, columns)), MAX_FRAMES)
+        table = self.make_table(AVLTree)
+        self.assertEqual(list(table.select_where(predicate, 'b')), [[0], [5], [6], [7], [8], [9]])
+        self.assertEqual(len(list(table.select_where('or(and(greater a 1, less a 5), and(greater a 3, less a 9))'))), 70)
+
+    def test_batched_point_lookups(self):
+        table = self.make_table(BatchLookupTree)
+        predicate = 'equals a 99'
+        for i in range(12):
+            predicate = f'or(and(equals a {i}, equals b {i}), {predicate})'
+
+        self.assertEqual(sorted(table.select_where(predicate, 'name')), [[f'{i}:{i}'] for i in range(10)])
+        self.assertEqual(list(table.select_where("and(equals a 1, and(equals b 1, equals name '1:2'))")), [])
+        table.delete(predicate)
+        self.assertEqual(len(table), 90)
+
+    def test_range_pushdown(self):
+        table = self.make_table(NoScanTree)
+
+        self.assertEqual(len(list(table.select_where('less a 3'))), 30)
+        self.assertEqual(len(list(table.select_where('and(equals a 3, less b 3)'))), 3)
+        self.assertEqual(len(list(table.select_where('and(greater a 3, less a 5)'))), 10)
+        table.delete('greater a 6')
+        self.assertEqual(len(list(table.select_where('greater a 0'))), 60)
+
+    def test_single_scan_or(self):
+        table = self.make_table(ScanCountingTree)
+        predicate = "or(equals name '1:1', or(less b 2, or(equals a 3, and(equals a 4, equals b 4))))"
+        ScanCountingTree.scans = 0
+
+        self.assertEqual(len(list(table.select_where(predicate))), 29)
+        self.assertEqual(ScanCountingTree.scans, 1)
+        table.delete(predicate)
+        self.assertEqual(ScanCountingTree.scans, 2)
+        self.assertEqual(len(table), 71)
+        self.assertEqual(list(table.select_where('equals a 3')), [])
+
+    def test_range_delete(self):
+        table = self.make_table(RangeDeleteTree)
+
+        table.delete('greater a 6')
+        table.delete('and(equals a 2, greater b 3)')
+        table.delete('or(less a 1, and(greater a 3, less a 5))')
+        self.assertEqual(len(table), 44)
+        self.assertEqual(list(table.select_where('equals a 2', 'b')), [[i] for i in range(4)])
+        self.assertEqual(list(table.select_where('less a 4', 'a'))[0], [1])
+        self.assertRaises(AssertionError, table.delete, 'and(equals a 1, equals b 1)')
+
+    @run_tests
+    def test_pagination(self, tree_type):
+        table = self.make_table(tree_type)
+        rows = list(table.select('a', 'b'))
+
+        self.assertEqual(len(table), 100)
+        self.assertEqual(list(table.select('a', 'b', limit=5)), rows[:5])
+        self.assertEqual(list(table.select('a', 'b', offset=37, limit=10)), rows[37:47])
+        self.assertEqual(list(table.select('a', 'b', offset=95)), rows[95:])
+        self.assertEqual(list(table.select('a', 'b', offset=100)), [])
+        table.delete('less a 5')
+        self.assertEqual(len(table), 50)
+        self.assertEqual(list(table.select('a', offset=10, limit=1)), [[6]])
+
+    def test_snapshot(self):
+        table = self.make_table(PersistentAVLTree)
+        snapshot = table.snapshot()
+        table.delete('less a 5')
+        table.insert(10, 0, '10:0')
+
+        self.assertEqual(len(snapshot), 100)
+        self.assertEqual(len(table), 51)
+        self.assertEqual(list(snapshot.select_where('and(equals a 3, equals b 4)', 'name')), [['3:4']])
+        self.assertEqual(list(snapshot.select_where('equals a 10')), [])
+        self.assertRaises(RuntimeError, self.make_table(AVLTree).snapshot)
+
+    def test_freeze(self):
+        table = self.make_table(AVLTree)
+        table.create_index('name')
+        frozen = table.freeze()
+        table.delete('less a 5')
+        self.assertEqual(list(frozen.select_where("equals name '3:4'", 'a', 'b')), [[3, 4]])
+
+        self.assertEqual(len(frozen), 100)
+        for predicate in ['equals a 3', 'and(equals a 3, greater b 6)', 'or(less a 2, greater a 8)']:
+            self.assertEqual(list(frozen.select_where(predicate)), list(self.make_table(AVLTree).select_where(predicate)))
+        self.assertRaises(NotImplementedError, frozen.insert, 10, 0, '10:0')
+        self.assertRaises(NotImplementedError, frozen.delete, 'equals a 1')
+
+    @run_tests
+    def test_write_load(self, tree_type):
+        table = self.make_table(tree_type)
+        buffer = AdvancedBinaryIO(io.BytesIO())
+        table.write(buffer)
+        buffer.seek(0)
+
+        loaded = Table.load(buffer, tree_type)
+        self.assertEqual(list(loaded.select()), list(table.select()))
+        self.assertEqual(list(loaded.select_where('and(equals a 4, equals b 2)', 'name')), [['4:2']])
+
+    @run_tests
+    def test_encoded_keys(self, tree_type):
+        columns = [UniqueColumn('a', 'int'), UniqueColumn('b', 'str'), UniqueColumn('c', 'float'), Column('d', 'bool')]
+        plain, encoded = Table(tree_type, columns), Table(tree_type, columns, encode_keys=True)
+        for i in range(-5, 5):
+            for name in ['', 'x', 'x\x00', 'xy', 'y']:
+                for table in (plain, encoded):
+                    table.insert(i, name, i / 4, i % 2 == 0)
+                    table.insert(i, name, float(i), False)
+
+        self.assertTrue(all(isinstance(key, bytes) for key, _ in encoded._tree))
+        self.assertEqual(list(encoded.select()), list(plain.select()))
+        self.assertEqual(type(list(encoded.select('c'))[0][0]), float)
+        for predicate in ["and(equals a 1, and(equals b 'x', equals c 1))", 'less a -3', "and(equals a 2, less b 'xy')",
+                          "and(greater a 0, less c 0.5)", "or(equals a 4, equals b 'x')"]:
+            self.assertEqual(list(encoded.select_where(predicate)), list(plain.select_where(predicate)))
+
+        encoded.delete('less a 0')
+        plain.delete('less a 0')
+        self.assertEqual(list(encoded.select()), list(plain.select()))
+
+        buffer = AdvancedBinaryIO(io.BytesIO())
+        encoded.write(buffer)
+        buffer.seek(0)
+        loaded = Table.load(buffer, tree_type, encode_keys=True)
+        self.assertEqual(list(loaded.select()), list(plain.select()))
+
+    @run_tests
+    def test_secondary_index(self, tree_type):
+        table = Table(NoScanTree, [UniqueColumn('id', 'int'), Column('group', 'int'), Column('name', 'str')])
+        table.create_index('group', tree_type)
+        for i in range(100):
+            table.insert(i, i % 10, str(i))
+        table.insert(5, 7, 'moved')
+
+        self.assertEqual(list(table.select_where('equals group 3', 'id')), [[i] for i in range(3, 100, 10)])
+        self.assertEqual(list(table.select_where('equals group 7', 'name'))[:2], [['moved'], ['7']])
+        self.assertEqual(len(list(table.select_where('equals group 5'))), 9)
+        self.assertEqual(len(list(table.select_where('and(greater group 2, less group 5)'))), 20)
+        self.assertEqual(len(list(table.select_where('or(greater group 8, equals id 0)'))), 11)
+        self.assertEqual(list(table.select_where('and(equals group 1, less id 30)', 'id')), [[1], [11], [21]])
+        table.delete('or(equals group 2, less group 1)')
+        self.assertEqual(list(table.select_where('equals group 2')), [])
+        self.assertEqual(len(table), 80)
+        self.assertRaises(RuntimeError, table.create_index, 'group')
+        self.assertRaises(RuntimeError, table.create_index, 'missing')
+
+    def test_write_load_index(self):
+        table = Table(AVLTree, [UniqueColumn('id', 'int'), Column('group', 'int'), Column('name', 'str')])
+        for i in range(100):
+            table.insert(i, i % 10, str(i))
+        table.create_index('group')
+        buffer = AdvancedBinaryIO(io.BytesIO())
+        table.write(buffer)
+        buffer.seek(0)
+
+        loaded = Table.load(buffer, NoScanTree)
+        self.assertEqual(list(loaded.select_where('equals group 4', 'id')), [[i] for i in range(4, 100, 10)])
+        self.assertIsInstance(loaded._indexes['group'][1], NoScanTree)
+
+        # Tree types of the fixed list given to create_index are saved, other types fall back to the tree type of the table
+        table.create_index('name', SkipList)
+        table.create_index('id', AdaptiveTree.wrap(AVLTree))
+        buffer = AdvancedBinaryIO(io.BytesIO())
+        table.write(buffer)
+        buffer.seek(0)
+
+        loaded = Table.load(buffer, RedBlackTree)
+        self.assertEqual({name: type(index).__name__ for name, (_, index) in loaded._indexes.items()},
+                         {'group': 'RedBlackTree', 'name': 'SkipList', 'id': 'RedBlackTree'})
+        self.assertEqual(list(loaded.select_where("equals name '42'", 'group')), [[2]])
+
+        # Names in the file are only looked up in INDEX_TREE_TYPES, never imported
+        buffer = AdvancedBinaryIO(io.BytesIO())
+        Table(AVLTree, [UniqueColumn('id', 'int'), Column('group', 'int')]).write(buffer)
+        buffer.file.seek(-4, io.SEEK_END)
+        buffer.write_int(1)
+        buffer.write_string('group')
+        buffer.write_string('tests.test_table.NoScanTree')
+        buffer.seek(0)
+        self.assertIsInstance(Table.load(buffer, BTree)._indexes['group'][1], BTree)
+
+    def test_load_old_format(self):
+        # A file written before index sections and the format marker existed: two tables, rows only
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'old.db')
+            with open(path, 'wb') as file:
+                binary_io = AdvancedBinaryIO(file)
+                binary_io.write_int(2)
+                for name, rows in (('first', 3), ('second', 2)):
+                    binary_io.write_string(name)
+                    binary_io.write_int(2)
+                    for column, value_type, is_unique in (('id', 'int', True), ('name', 'str', False)):
+                        binary_io.write_string(column)
+                        binary_io.write_string(value_type)
+                        binary_io.write_bool(is_unique)
+                    binary_io.write_int(rows)
+                    for i in range(rows):
+                        binary_io.write_int(i)
+                        binary_io.write_string(f'{name}{i}')
+
+            database = Database(AVLTree, path)
+            self.assertEqual(list(database.get_table('first').select('name')), [['first0'], ['first1'], ['first2']])
+            self.assertEqual(list(database.get_table('second').select('id', 'name')), [[0, 'second0'], [1, 'second1']])
+            database.get_table('second').create_index('name')
+            database.sync()
+            del database
+
+            database = Database(AVLTree, path)
+            self.assertEqual(list(database.get_table('second').select_where("equals name 'second1'", 'id')), [[1]])
+            self.assertEqual(list(database.get_table('second')._indexes), ['name'])
+            del database
+
+    def test_adaptive_storage(self):
+        for background in (False, True):
+            table = Table(AdaptiveTree.wrap(AVLTree, window=256, background=background),
+                          [UniqueColumn('a', 'int'), Column('name', 'str')])
+            for i in range(2000):
+                table.insert(i, str(i))
+            table._tree.wait_for_migration()
+            self.assertEqual(table.stats()['tree_type'], 'BuiltinTree')
+
+            for i in range(300):
+                self.assertEqual(len(list(table.select_where(f'and(greater a {i}, less a {i + 5})'))), 4)
+            table.insert(-1, '-1')
+            table._tree.wait_for_migration()
+            stats = table.stats()
+            self.assertEqual(stats['tree_type'], 'BTree')
+            self.assertEqual([(item['from'], item['to']) for item in stats['migrations']],
+                             [('AVLTree', 'BuiltinTree'), ('BuiltinTree', 'BTree')])
+            self.assertTrue(all(item['finished'] for item in stats['migrations']))
+            self.assertEqual(list(table.select('a')), [[i] for i in range(-1, 2000)])
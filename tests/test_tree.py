@@ -1,15 +1,57 @@
 import itertools
+import random
+import sys
+import threading
 import unittest
+from concurrent.futures import ProcessPoolExecutor
 
 from core.trees.abstract_tree import AbstractTree
+from core.trees.adaptive_tree import AdaptiveTree
 from core.trees.avl_tree import AVLTree
 from core.trees.b_tree import BTree
 from core.trees.builtin_tree import BuiltinTree
+from core.trees.concurrent_tree import ConcurrentTree
+from core.trees.instrumented_tree import InstrumentedTree
+from core.trees.key_codec import encode_key
+from core.trees.persistent_avl_tree import PersistentAVLTree
+from core.trees.radix_tree import RadixTree
 from core.trees.red_black_tree import RedBlackTree
+from core.trees.skip_list import SkipList
 from core.trees.splay_tree import SplayTree
+from core.trees.striped_b_tree import StripedBTree
+from core.trees.tombstone_tree import TombstoneTree
 from core.trees.two_three_tree import TwoThreeTree
 
-trees = [AVLTree, RedBlackTree, SplayTree, BTree, TwoThreeTree, BuiltinTree]
+
+class SmallBTree(BTree):
+    def __init__(self, order: int = 3):
+        super().__init__(order)
+
+
+class MediumBTree(BTree):
+    def __init__(self, order: int = 8):
+        super().__init__(order)
+
+
+class SemiSplayTree(SplayTree):
+    def __init__(self):
+        super().__init__(splay_probability=0.5, splay_depth=2)
+
+
+class ParallelRedBlackTree(RedBlackTree):
+    parallel_threshold = 20
+
+
+ConcurrentAVLTree = ConcurrentTree.wrap(AVLTree)
+InstrumentedBTree = InstrumentedTree.wrap(BTree)
+# Small window, so that the generic tests run across migrations
+AdaptiveAVLTree = AdaptiveTree.wrap(AVLTree, window=64)
+TombstoneBTree = TombstoneTree.wrap(BTree, 3, max_tombstone_ratio=0.25)
+TombstoneTwoThreeTree = TombstoneTree.wrap(TwoThreeTree)
+
+trees = [AVLTree, PersistentAVLTree, RedBlackTree, SplayTree, SemiSplayTree, BTree, SmallBTree, MediumBTree, TwoThreeTree,
+         BuiltinTree, SkipList, RadixTree, ConcurrentAVLTree, StripedBTree, InstrumentedBTree,
+         AdaptiveAVLTree, TombstoneBTree, TombstoneTwoThreeTree]
 
 
 class TreeTest(unittest.TestCase):
@@ -100,6 +142,23 @@ class TreeTest(unittest.TestCase):
         tree.insert("B", "A")
         self.assertEqual(tree.get("B"), "A")
 
+    @run_tests
+    def test_get_many(self, test_type):
+        tree = test_type()
+        self.assertEqual(tree.get_many([1, 2]), [None, None])
+
+        for i in range(0, 1000, 2):
+            tree.insert(i, -i)
+        keys = [998, 5, 0, 500, 500, 1001, -1, 2, 3]
+
+        self.assertEqual(tree.get_many(keys), [-998, None, 0, -500, -500, None, None, -2, None])
+        self.assertEqual(tree.get_many(keys, 'missing')[1], 'missing')
+        self.assertEqual(tree.contains_many(keys), [True, False, True, True, True, False, False, True, False])
+        self.assertEqual(tree.get_many(range(1000)), [None if i % 2 else -i for i in range(1000)])
+        self.assertEqual(tree.get_many([]), [])
+        self.assertEqual(tree.get_or_default(4), -4)
+        self.assertEqual(tree.get_or_default(5, 'missing'), 'missing')
+
     @run_tests
     def test_iter(self, test_type):
         tree = test_type()
@@ -112,3 +171,470 @@ class TreeTest(unittest.TestCase):
         tree.insert(0, 1)
 
         self.assertEqual(list(iter(tree)), [(0, 1), (1, 3), (2, 1), (4, 2), (10, 1), (11, 2)])
+        self.assertEqual(list(reversed(tree)), [(11, 2), (10, 1), (4, 2), (2, 1), (1, 3), (0, 1)])
+
+    @run_tests
+    def test_iter_deep(self, test_type):
+        tree = test_type()
+
+        for i in range(20000):
+            tree.insert(i, i)
+
+        self.assertEqual(list(tree), [(i, i) for i in range(20000)])
+        self.assertEqual(list(reversed(tree)), [(i, i) for i in reversed(range(20000))])
+
+    @run_tests
+    def test_range(self, test_type):
+        tree = test_type()
+
+        for i in range(0, 100, 3):
+            tree.insert(i, str(i))
+
+        self.assertEqual(list(tree.range(10, 20)), [(i, str(i)) for i in range(12, 19, 3)])
+        self.assertEqual(list(tree.range(9, 21)), [(i, str(i)) for i in range(9, 22, 3)])
+        self.assertEqual(list(tree.range(9, 21, inclusive=(False, False))), [(i, str(i)) for i in range(12, 19, 3)])
+        self.assertEqual(list(tree.range(hi=6)), [(0, '0'), (3, '3'), (6, '6')])
+        self.assertEqual(list(tree.range(lo=95)), [(96, '96'), (99, '99')])
+        self.assertEqual(list(tree.range(40, 41)), [])
+        self.assertEqual(list(tree.range()), list(tree))
+
+    @run_tests
+    def test_floor_ceiling(self, test_type):
+        tree = test_type()
+
+        self.assertRaises(KeyError, tree.min)
+        self.assertRaises(KeyError, tree.max)
+        self.assertRaises(KeyError, lambda: tree.floor(5))
+
+        for i in range(10, 50, 10):
+            tree.insert(i, -i)
+
+        self.assertEqual(tree.floor(25), (20, -20))
+        self.assertEqual(tree.floor(30), (30, -30))
+        self.assertEqual(tree.ceiling(25), (30, -30))
+        self.assertEqual(tree.ceiling(10), (10, -10))
+        self.assertRaises(KeyError, lambda: tree.floor(5))
+        self.assertRaises(KeyError, lambda: tree.ceiling(45))
+        self.assertEqual(tree.min(), (10, -10))
+        self.assertEqual(tree.max(), (40, -40))
+
+    @run_tests
+    def test_bulk_load(self, test_type):
+        for size in [0, 1, 2, 5, 17, 1000]:
+            items = [(i * 2, str(i)) for i in range(size)]
+            tree = test_type.bulk_load(items)
+
+            self.assertEqual(list(tree), items)
+            tree.insert(1, 'inserted')
+            if items:
+                tree.delete(0)
+            self.assertEqual(list(tree), [(1, 'inserted')] + items[1:])
+
+        self.assertRaises(ValueError, lambda: test_type.bulk_load([(2, 1), (1, 2)]))
+        self.assertRaises(ValueError, lambda: test_type.bulk_load([(1, 1), (1, 2)]))
+
+    @run_tests
+    def test_order_statistics(self, test_type):
+        tree = test_type()
+        self.assertEqual(len(tree), 0)
+        self.assertRaises(IndexError, lambda: tree.select(0))
+
+        keys = list(range(0, 300, 3))
+        for key in keys[::2] + keys[1::2]:
+            tree.insert(key, str(key))
+        for key in keys[10:20]:
+            tree.delete(key)
+        keys = keys[:10] + keys[20:]
+
+        self.assertEqual(len(tree), len(keys))
+        for index, key in enumerate(keys):
+            self.assertEqual(tree.select(index), (key, str(key)))
+            self.assertEqual(tree.rank(key), index)
+            self.assertEqual(tree.rank(key + 1), index + 1)
+        self.assertEqual(tree.select(-1), (keys[-1], str(keys[-1])))
+        self.assertRaises(IndexError, lambda: tree.select(len(keys)))
+        self.assertEqual(tree.count_range(), len(keys))
+        self.assertEqual(tree.count_range(0, 30), 10)
+        self.assertEqual(tree.count_range(0, 90, inclusive=(False, False)), 19)
+        self.assertEqual(tree.count_range(31, 59), 0)
+        self.assertEqual(tree.count_range(100, 10), 0)
+        self.assertEqual(tree.count_range(lo=270), 10)
+
+    def test_set_operations(self):
+        pairs = [(AVLTree, AVLTree), (PersistentAVLTree, PersistentAVLTree), (AVLTree, PersistentAVLTree),
+                 (RedBlackTree, RedBlackTree), (RedBlackTree, BuiltinTree)]
+        for tree_type, other_type in pairs:
+            with self.subTest(f"Checking {tree_type.__name__} with {other_type.__name__}"):
+                # Much smaller trees are joined, trees of similar sizes are merged
+                for other_keys in (range(0, 600, 37), range(0, 600, 2)):
+                    union = {**dict.fromkeys(range(600), 'a'), **dict.fromkeys(other_keys, 'b')}
+                    for operation, expected in (('union', union),
+                                                ('intersection', dict.fromkeys(set(other_keys), 'a')),
+                                                ('difference', dict.fromkeys(set(range(600)) - set(other_keys), 'a'))):
+                        tree = tree_type.bulk_load((key, 'a') for key in range(600))
+                        other = other_type.bulk_load((key, 'b') for key in other_keys)
+                        getattr(tree, operation)(other)
+                        self.assertEqual(list(tree), sorted(expected.items()))
+                        self.assertEqual(len(tree), len(expected))
+                        self.assertEqual(list(other), [(key, 'b') for key in other_keys])
+
+    @run_tests
+    def test_delete_range(self, test_type):
+        tree = test_type()
+        for key in range(100):
+            tree.insert(key, None)
+        self.assertEqual(tree.delete_range(10, 20), 11)
+        self.assertEqual(tree.delete_range(30, 40, inclusive=(False, False)), 9)
+        self.assertEqual(tree.delete_range(50, 45), 0)
+        self.assertEqual(tree.delete_range(hi=5, inclusive=(True, False)), 5)
+        self.assertEqual(tree.delete_range(lo=90), 10)
+        self.assertEqual([key for key, _ in tree],
+                         [5, 6, 7, 8, 9] + list(range(21, 31)) + list(range(40, 90)))
+
+    def test_split_join(self):
+        for tree_type in [AVLTree, PersistentAVLTree, RedBlackTree]:
+            with self.subTest(f"Checking {tree_type.__name__}"):
+                tree = tree_type.bulk_load([(i, str(i)) for i in range(0, 1000, 2)])
+                left, pair, right = tree.split(500)
+                self.assertEqual(len(tree), 0)
+                self.assertEqual(pair, (500, '500'))
+                self.assertEqual(list(left), [(i, str(i)) for i in range(0, 500, 2)])
+                self.assertEqual(list(right), [(i, str(i)) for i in range(502, 1000, 2)])
+                self.assertIsNone(right.split(501)[1])
+
+                left = tree_type.bulk_load([(i, str(i)) for i in range(10)])
+                right = tree_type.bulk_load([(i, str(i)) for i in range(11, 1000)])
+                joined = tree_type.join(left, 10, '10', right)
+                self.assertEqual(list(joined), [(i, str(i)) for i in range(1000)])
+                self.assertEqual((len(left), len(right)), (0, 0))
+                self.assertLessEqual(joined.height(), 2 * 10)
+                self.assertEqual(joined.select(500), (500, '500'))
+                self.assertRaises(ValueError, tree_type.join, joined, 5, '5', tree_type())
+
+    def test_parallel_set_operations(self):
+        tree = ParallelRedBlackTree.bulk_load([(i, 'a') for i in range(2000)])
+        other = ParallelRedBlackTree.bulk_load([(i, 'b') for i in range(0, 2000, 20)])
+        with ProcessPoolExecutor(2) as executor:
+            tree.union(other, executor)
+            self.assertEqual(list(tree), [(i, 'a' if i % 20 else 'b') for i in range(2000)])
+            tree.difference(other, executor)
+        self.assertEqual(list(tree), [(i, 'a') for i in range(2000) if i % 20])
+        self.assertEqual(tree.select(100), (106, 'a'))
+
+    def test_b_tree_typed_keys(self):
+        tree = SmallBTree.bulk_load([(i, str(i)) for i in range(0, 200, 2)])
+        for i in range(1, 200, 2):
+            tree.insert(i, str(i))
+        for i in range(0, 200, 3):
+            tree.delete(i)
+        self.assertEqual(tree.min()[0], 1)
+        self.assertEqual(list(tree), [(i, str(i)) for i in range(200) if i % 3])
+        self.assertEqual(tree.get_many([-1, 1, 2.0, 2.5]), [None, '1', '2', None])
+
+        # Keys that do not fit into the typed arrays move all keys back to lists
+        for key in [2 ** 64, 0.5, True, 'a']:
+            tree = SmallBTree()
+            for i in range(50):
+                tree.insert(i, i)
+            if isinstance(key, str):
+                self.assertRaises(TypeError, tree.insert, key, None)
+                continue
+            tree.insert(key, None)
+            self.assertEqual([pair[0] for pair in tree], sorted(set(range(50)) | {key}))
+        tree = BTree.bulk_load([(i / 2, i) for i in range(1000)])
+        tree.insert(-1, -1)
+        self.assertEqual(tree.select(1), (0.0, 0))
+
+    def test_tombstones(self):
+        tree = TombstoneBTree.bulk_load([(i, str(i)) for i in range(100)])
+        for i in range(0, 40, 2):
+            tree.delete(i)
+        self.assertEqual(tree.tombstone_ratio, 0.2)
+        self.assertEqual(len(tree), 80)
+        self.assertEqual(tree.get_many([0, 1, 2]), [None, '1', None])
+        self.assertEqual(list(tree.range(hi=5)), [(1, '1'), (3, '3'), (5, '5')])
+        self.assertEqual((tree.floor(5), tree.ceiling(40)), ((5, '5'), (40, '40')))
+        self.assertRaises(KeyError, tree.delete, 0)
+        tree.insert(0, 'again')
+        self.assertEqual((tree.min(), tree.tombstone_ratio), ((0, 'again'), 19 / 100))
+
+        # Landing on a tombstone and order statistics compact the tree first
+        self.assertEqual(tree.ceiling(2), (3, '3'))
+        self.assertEqual(tree.tombstone_ratio, 0)
+        self.assertEqual(len(tree), 81)
+        for i in range(40, 50):
+            tree.delete(i)
+        self.assertEqual(tree.select(21), (50, '50'))
+        self.assertEqual(tree.tombstone_ratio, 0)
+
+        # Passing the ratio compacts the tree
+        for i in range(50, 75):
+            tree.delete(i)
+            self.assertLessEqual(tree.tombstone_ratio, 0.25)
+        self.assertEqual(list(tree), [(0, 'again')] + [(i, str(i)) for i in range(100) if i >= 75 or (i < 40 and i % 2)])
+        self.assertRaises(ValueError, TombstoneTree.wrap, BTree, max_tombstone_ratio=2)
+        report = InstrumentedTree.wrap(TombstoneBTree)().report()
+        self.assertEqual(report['tombstone_ratio'], 0)
+
+    def test_snapshot(self):
+        tree = PersistentAVLTree.bulk_load([(i, str(i)) for i in range(100)])
+        snapshot = tree.snapshot()
+        for i in range(0, 100, 2):
+            tree.delete(i)
+        for i in range(100, 150):
+            tree.insert(i, str(i))
+        tree.insert(1, 'updated')
+        other = snapshot.snapshot()
+        other.insert(-1, '-1')
+
+        self.assertEqual(list(snapshot), [(i, str(i)) for i in range(100)])
+        self.assertEqual(len(snapshot), 100)
+        self.assertEqual(len(tree), 100)
+        self.assertEqual(tree.get(1), 'updated')
+        self.assertEqual(tree.min(), (1, 'updated'))
+        self.assertEqual(other.min(), (-1, '-1'))
+        self.assertRaises(NotImplementedError, AVLTree().snapshot)
+
+    @run_tests
+    def test_freeze(self, test_type):
+        for keys, missing in [(range(-500, 500, 3), [-501, 1, 500]), ([i / 4 for i in range(300)], [-1.0, 0.1, 75.0]),
+                              ([str(i) for i in range(300)], ['', '0a', 'a']), ([(i % 7, i) for i in range(300)], [(0, 1), (7, 0)])]:
+            tree = test_type()
+            for key in keys:
+                tree.insert(key, key)
+            frozen = tree.freeze()
+            keys = sorted(keys)
+            probes = keys[::5] + missing
+
+            self.assertEqual(list(frozen), list(tree))
+            self.assertEqual(list(reversed(frozen)), list(reversed(tree)))
+            self.assertEqual(frozen.get_many(probes, 'missing'), tree.get_many(probes, 'missing'))
+            self.assertEqual(frozen.contains_many(probes), tree.contains_many(probes))
+            self.assertEqual(list(frozen.range(keys[10], keys[50], (False, True))), list(tree.range(keys[10], keys[50], (False, True))))
+            self.assertEqual(frozen.count_range(hi=keys[20], inclusive=(True, False)), 20)
+            self.assertEqual((frozen.rank(keys[30]), frozen.select(-1), frozen.min()), (30, tree.max(), tree.min()))
+            self.assertEqual((frozen.floor(keys[7]), frozen.ceiling(keys[7])), ((keys[7], keys[7]), (keys[7], keys[7])))
+            self.assertEqual(frozen.get(keys[42]), keys[42])
+            self.assertRaises(KeyError, frozen.get, probes[-1])
+            self.assertRaises(NotImplementedError, frozen.insert, keys[0], None)
+            self.assertRaises(NotImplementedError, frozen.delete, keys[0])
+            tree.delete(keys[0])
+            self.assertTrue(frozen.contains(keys[0]))
+        self.assertEqual(list(test_type().freeze()), [])
+        # Ints beyond the float precision stay distinct from mixed int and float probes
+        frozen = test_type.bulk_load((key, key) for key in range(2 ** 53, 2 ** 53 + 3)).freeze()
+        self.assertEqual(frozen.get_many([2 ** 53 + 1, 2.0 ** 53, 0.5], 'missing'), [2 ** 53 + 1, 2 ** 53, 'missing'])
+
+    def test_splay_without_restructuring(self):
+        tree = SplayTree(splay_on_read=False)
+        for i in range(100):
+            tree.insert(i, str(i))
+        root = tree.root
+
+        self.assertEqual(tree.get(10), '10')
+        self.assertEqual(tree.floor(10.5), (10, '10'))
+        self.assertEqual(tree.min(), (0, '0'))
+        self.assertIs(tree.root, root)
+        self.assertTrue(SplayTree().mutating_reads)
+        self.assertFalse(tree.mutating_reads)
+
+    def test_splay_read_policy(self):
+        tree = SplayTree(splay_depth=3)
+        for i in range(100):
+            tree.insert(i, str(i))
+        tree.get(50)
+        root = tree.root
+
+        self.assertEqual(tree.depth(root.left.key), 2)
+        self.assertEqual(tree.get(root.left.key), str(root.left.key))
+        self.assertIs(tree.root, root)
+        self.assertEqual(tree.get(0), '0')
+        self.assertEqual(tree.root.key, 0)
+
+        tree = SplayTree(splay_probability=0)
+        for i in range(100):
+            tree.insert(i, str(i))
+        root = tree.root
+        self.assertEqual(tree.get(3), '3')
+        self.assertIs(tree.root, root)
+        self.assertFalse(tree.mutating_reads)
+        self.assertRaises(ValueError, SplayTree, splay_probability=2)
+
+    def test_concurrent_access(self):
+        for tree_type in [ConcurrentAVLTree, ConcurrentTree.wrap(SplayTree),
+                          ConcurrentTree.wrap(SplayTree, splay_on_read=False), StripedBTree]:
+            with self.subTest(f"Checking {tree_type.__name__}"):
+                tree = tree_type()
+                errors = []
+
+                def write(offset):
+                    try:
+                        for i in range(offset, 2000, 4):
+                            tree.insert(i, i)
+                        for i in range(offset, 2000, 8):
+                            tree.delete(i)
+                    except Exception as error:  # pylint: disable=broad-except
+                        errors.append(error)
+
+                def read():
+                    try:
+                        for i in range(2000):
+                            if tree.contains(i):
+                                self.assertEqual(tree.get(i), i)
+                            keys = [key for key, _ in tree.range(i, i + 10)]
+                            self.assertEqual(keys, sorted(keys))
+                    except Exception as error:  # pylint: disable=broad-except
+                        errors.append(error)
+
+                threads = [threading.Thread(target=write, args=(offset,)) for offset in range(4)]
+                threads += [threading.Thread(target=read) for _ in range(4)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+
+                self.assertEqual(errors, [])
+                expected = [(i, i) for i in range(2000) if i % 8 >= 4]
+                self.assertEqual(list(tree), expected)
+                self.assertEqual(len(tree), len(expected))
+
+    def test_independent_trees_in_parallel(self):
+        # Trees sharing module-level state must not interfere, even when each has its own lock
+        errors = []
+
+        def run(seed):
+            try:
+                tree = ConcurrentTree.wrap(RedBlackTree)()
+                keys = list(range(3000))
+                random.Random(seed).shuffle(keys)
+                for key in keys:
+                    tree.insert(key, key)
+                for key in keys[::2]:
+                    tree.delete(key)
+                self.assertEqual(list(tree), sorted((key, key) for key in keys[1::2]))
+            except Exception as error:  # pylint: disable=broad-except
+                errors.append(error)
+
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            threads = [threading.Thread(target=run, args=(seed,)) for seed in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(interval)
+        self.assertEqual(errors, [])
+
+    def test_adaptive_migration_log(self):
+        tree = AdaptiveTree.wrap(AVLTree, background=True)()
+        for i in range(1000):
+            tree.insert(i, i)
+        self.assertRaises(KeyError, tree.delete, 5000)
+        tree._start_migration(BuiltinTree)
+        # AVLTree ignores a missing key and BuiltinTree raises KeyError, the wrapper always raises
+        self.assertRaises(KeyError, tree.delete, 5000)
+        tree.insert(5000, 5000)
+        tree.delete(5000)
+        tree.delete(0)
+        tree.wait_for_migration()
+
+        self.assertEqual(tree.report()['tree_type'], 'BuiltinTree')
+        self.assertIsNone(tree.report()['migrating_to'])
+        self.assertEqual(list(tree), [(i, i) for i in range(1, 1000)])
+        self.assertRaises(KeyError, tree.delete, 5000)
+        tree.insert(0, 0)
+        self.assertEqual(tree.get(0), 0)
+        self.assertEqual(tree.height(), BuiltinTree.bulk_load(list(tree)).height())
+
+    def test_instrumentation(self):
+        events = {AVLTree: 'rotations', PersistentAVLTree: 'rotations', RedBlackTree: 'rotations',
+                  SplayTree: 'rotations', SmallBTree: 'splits', TwoThreeTree: 'splits'}
+        for tree_type, event in events.items():
+            with self.subTest(f"Checking {tree_type.__name__}"):
+                tree = InstrumentedTree.wrap(tree_type)()
+                for i in range(100):
+                    tree.insert(i, str(i))
+                for i in range(0, 100, 2):
+                    tree.delete(i)
+                self.assertEqual(tree.get(51), '51')
+
+                stats = tree.stats
+                self.assertGreater(getattr(stats, event), 0)
+                self.assertGreater(stats.comparisons, 0)
+                self.assertEqual(stats.operations, 151)
+                self.assertEqual(sum(stats.depths.values()), 151)
+                self.assertEqual(stats.nodes_visited, sum(depth * count for depth, count in stats.depths.items()))
+                self.assertEqual(list(tree), [(i, str(i)) for i in range(1, 100, 2)])
+                self.assertEqual(tree.report()['height'], tree.height())
+                self.assertEqual(tree.height(), max(tree.depth(key) for key, _ in tree))
+
+        tree = InstrumentedTree.wrap(SmallBTree)()
+        for i in range(100):
+            tree.insert(i, i)
+        tree.stats.reset()
+        for i in range(100):
+            tree.delete(i)
+        self.assertGreater(tree.stats.merges, 0)
+        self.assertEqual(tree.stats.splits, 0)
+        self.assertEqual(BTree().height(), 0)
+
+    def test_skip_list_single_writer(self):
+        tree = SkipList.bulk_load([(i, i) for i in range(0, 4000, 2)], seed=1)
+        errors = []
+        writing = threading.Event()
+        writing.set()
+
+        def write():
+            for i in range(1, 4000, 2):
+                tree.insert(i, i)
+            for i in range(1, 4000, 4):
+                tree.delete(i)
+            writing.clear()
+
+        def read():
+            try:
+                while writing.is_set():
+                    keys = [key for key, _ in tree]
+                    self.assertEqual(keys, sorted(set(keys)))
+                    self.assertTrue(set(range(0, 4000, 2)) <= set(keys))
+                    self.assertEqual(tree.get(1000), 1000)
+                    self.assertEqual([key for key, _ in tree.range(100, 104) if key % 2 == 0], [100, 102, 104])
+            except Exception as error:  # pylint: disable=broad-except
+                errors.append(error)
+
+        threads = [threading.Thread(target=read) for _ in range(3)] + [threading.Thread(target=write)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(list(tree), [(i, i) for i in range(4000) if i % 4 != 1])
+
+    def test_key_encoding_order(self):
+        keys = [-2 ** 70, -1000, -256, -255, -1.5, -1, -0.25, 0, 0.5, 1, 1.25, 255, 256, 2 ** 70, float('inf')]
+        self.assertEqual(sorted(keys, key=encode_key), keys)
+        self.assertEqual(encode_key(1), encode_key(1.0))
+        words = ['', '\x00', '\x00\x00', 'a', 'a\x00', 'aa', 'ab', 'b', 'é']
+        self.assertEqual(sorted(words, key=encode_key), words)
+        pairs = [(-1, 'b'), (0, ''), (0, 'a'), (0, 'a', 1), (0, 'ab'), (1, '')]
+        self.assertEqual(sorted(pairs, key=encode_key), pairs)
+
+    def test_radix_prefix_scan(self):
+        tree = RadixTree()
+        words = ['car', 'card', 'care', 'cared', 'cars', 'cat', 'do', 'dog', 'c\x00', 'c']
+        for word in words:
+            tree.insert(word, len(word))
+        self.assertEqual([key for key, _ in tree.scan_prefix('car')], ['car', 'card', 'care', 'cared', 'cars'])
+        self.assertEqual([key for key, _ in tree.scan_prefix('c')], sorted(word for word in words if word.startswith('c')))
+        self.assertEqual(list(tree.scan_prefix('x')), [])
+        self.assertEqual(len(list(tree.scan_prefix(''))), len(words))
+
+        tree = RadixTree()
+        for key in itertools.product(range(3), ['a', 'ab', 'b'], range(2)):
+            tree.insert(key, None)
+        self.assertEqual([key for key, _ in tree.scan_prefix((1, 'a'))], [(1, 'a', 0), (1, 'a', 1)])
+        self.assertEqual(len(list(tree.scan_prefix((2,)))), 6)
+